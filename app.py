@@ -26,7 +26,7 @@ def check_api_health():
         response = requests.get(f"{API_BASE_URL}/health", timeout=5)
         if response.status_code == 200:
             data = response.json()
-            return data["status"] == "healthy", data
+            return data["status"] in ("healthy", "warming"), data
         return False, {"message": "API not responding correctly"}
     except requests.exceptions.RequestException as e:
         return False, {"message": f"Cannot connect to API: {str(e)}"}
@@ -83,7 +83,10 @@ def main():
             is_healthy, health_data = check_api_health()
         
         if is_healthy:
-            st.success("✅ API Healthy")
+            if health_data.get("status") == "warming":
+                st.warning("⏳ API Warming Up")
+            else:
+                st.success("✅ API Healthy")
             system = health_data.get("system", {})
             st.info(f"""
             📚 Documents: {system.get('documents_loaded', 0)}
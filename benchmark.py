@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from index_backends import INDEX_TYPES, index_config_from_env
+from retriever import SEARCH_MODES, RegulatoryRetriever
+
+# Hand-labelled queries against reg_docs/: each lists the sources that answer it
+LABELLED_QUERIES = [
+    {"query": "What is reported in row 010 of template C 01.00?", "relevant": ["COREP_C01_Instructions.txt"]},
+    {"query": "How is total own funds calculated in COREP row 380?", "relevant": ["COREP_C01_Instructions.txt"]},
+    {"query": "COREP validation rule that AT1 cannot exceed 50% of CET1",
+     "relevant": ["COREP_C01_Instructions.txt", "PRA_Own_Funds.txt"]},
+    {"query": "Which instruments qualify as Common Equity Tier 1 capital?",
+     "relevant": ["CRR_Article_26.txt", "PRA_Own_Funds.txt"]},
+    {"query": "Conditions for including retained earnings in CET1",
+     "relevant": ["CRR_Article_26.txt", "PRA_Own_Funds.txt"]},
+    {"query": "Deduction of goodwill and intangible assets from CET1",
+     "relevant": ["CRR_Article_36.txt", "PRA_Own_Funds.txt"]},
+    {"query": "Treatment of deferred tax assets that rely on future profitability",
+     "relevant": ["CRR_Article_36.txt", "PRA_Own_Funds.txt"]},
+    {"query": "Row 350 intangible assets deduction", "relevant": ["CRR_Article_36.txt", "COREP_C01_Instructions.txt"]},
+    {"query": "Investments in own CET1 instruments held by the bank",
+     "relevant": ["CRR_Article_36.txt", "PRA_Own_Funds.txt"]},
+    {"query": "PRA reporting currency and frequency for UK banks", "relevant": ["PRA_Own_Funds.txt"]},
+    {"query": "Contingent convertible bonds as Additional Tier 1 capital", "relevant": ["PRA_Own_Funds.txt"]},
+    {"query": "Subordinated debt and general provisions in Tier 2", "relevant": ["PRA_Own_Funds.txt"]},
+]
+
+# Vocabulary the synthetic corpus is composed from; every document covers one
+# (regulator, instrument, treatment, entity) topic and queries ask for a topic
+SYNTHETIC_REGULATORS = ("CRR", "PRA", "EBA")
+SYNTHETIC_INSTRUMENTS = (
+    "ordinary shares", "share premium", "retained earnings", "minority interests", "contingent convertible bonds",
+    "subordinated debt", "general credit risk adjustments", "goodwill", "deferred tax assets", "defined benefit pension assets",
+    "own CET1 holdings", "reciprocal cross holdings", "securitisation positions", "mortgage servicing rights",
+    "cash flow hedge reserves", "prudent valuation adjustments"
+)
+SYNTHETIC_TREATMENTS = (
+    "full deduction", "partial recognition", "risk weighting at 250%", "grandfathering", "amortisation over five years",
+    "threshold exemption", "prior supervisory permission", "quarterly reporting", "look-through approach",
+    "transitional phase-in"
+)
+SYNTHETIC_ENTITIES = (
+    "credit institutions", "investment firms", "building societies", "insurance subsidiaries", "holding companies",
+    "branches of third-country banks", "small and non-complex institutions", "ring-fenced bodies"
+)
+
+# Query latency percentiles reported per configuration
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def synthetic_corpus(n_passages=10000, n_queries=200, seed=0):
+    """
+    Generate a labelled synthetic regulatory corpus of any size.
+
+    Each document is a single passage (shorter than the default chunk size)
+    about one randomly drawn topic, so the number of indexed chunks equals
+    n_passages. Queries paraphrase a topic and are labelled with every
+    document written about it.
+
+    Args:
+        n_passages (int): Number of passages (documents) to generate
+        n_queries (int): Number of labelled queries to draw
+        seed (int): Random seed, so runs are reproducible
+
+    Returns:
+        tuple: (documents, labelled queries)
+    """
+    rng = np.random.default_rng(seed)
+    topics = {}
+    documents = []
+    for i in range(n_passages):
+        regulator = SYNTHETIC_REGULATORS[rng.integers(len(SYNTHETIC_REGULATORS))]
+        instrument = SYNTHETIC_INSTRUMENTS[rng.integers(len(SYNTHETIC_INSTRUMENTS))]
+        treatment = SYNTHETIC_TREATMENTS[rng.integers(len(SYNTHETIC_TREATMENTS))]
+        entity = SYNTHETIC_ENTITIES[rng.integers(len(SYNTHETIC_ENTITIES))]
+        source = f"{regulator}_Synthetic_{i:06d}.txt"
+        text = (
+            f"{regulator} provision {i}: {instrument} held by {entity}.\n"
+            f"The applicable treatment for {instrument} is {treatment}. "
+            f"{entity.capitalize()} shall apply {treatment} to {instrument} when calculating own funds "
+            f"and shall document the basis for this treatment for supervisory review.\n"
+            f"Reporting: amounts arising from {instrument} are reported in template C 01.00 "
+            f"in accordance with {regulator} requirements for {entity}."
+        )
+        documents.append({"source": source, "text": text})
+        topics.setdefault((regulator, instrument, treatment, entity), []).append(source)
+
+    keys = list(topics)
+    picks = rng.choice(len(keys), size=min(n_queries, len(keys)), replace=False)
+    queries = []
+    for pick in picks:
+        regulator, instrument, treatment, entity = keys[pick]
+        queries.append({
+            "query": f"{treatment} of {instrument} for {entity} under {regulator} rules",
+            "relevant": topics[keys[pick]]
+        })
+    return documents, queries
+
+
+def _percentiles(latencies):
+    return {f"latency_ms_p{p}": round(float(np.percentile(latencies, p)), 3) for p in LATENCY_PERCENTILES}
+
+
+def evaluate_retriever(retriever, queries, k=5, mode="dense"):
+    """
+    Measure retrieval quality and per-query latency of a retriever.
+
+    Relevance is judged per source document: recall@k is the share of a
+    query's relevant sources found in the top k, MRR the mean reciprocal
+    rank of the first relevant one. The query embedding cache is cleared
+    before every query so latencies include encoding.
+
+    Args:
+        retriever (RegulatoryRetriever): Retriever under test
+        queries (list): Dictionaries with 'query' and 'relevant' source lists
+        k (int): Number of results retrieved per query
+        mode (str): Search mode: 'dense', 'bm25' or 'hybrid'
+
+    Returns:
+        dict: recall@k, MRR, hit rate and latency percentiles
+    """
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for labelled in queries:
+        retriever.query_cache.clear()
+        started = time.perf_counter()
+        results = retriever.search(labelled["query"], k=k, mode=mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        relevant = set(labelled["relevant"])
+        found = []
+        for result in results:
+            if result["source"] not in found:
+                found.append(result["source"])
+        hits = [rank for rank, source in enumerate(found, 1) if source in relevant]
+        recalls.append(len(hits) / len(relevant))
+        reciprocal_ranks.append(1.0 / hits[0] if hits else 0.0)
+
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "k": k,
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "mrr": round(float(np.mean(reciprocal_ranks)), 4),
+        "hit_rate": round(float(np.mean([r > 0 for r in reciprocal_ranks])), 4),
+        **_percentiles(latencies)
+    }
+
+
+def run_benchmark(documents, queries, index_configs, k=5, modes=("dense",), model_name="all-MiniLM-L6-v2",
+                  cache_dir=None):
+    """
+    Build a retriever per index configuration and evaluate each search mode.
+
+    Consecutive configurations sharing a vector dtype reuse one embedding
+    store, so the corpus is encoded once per dtype; later build times
+    therefore measure index construction only.
+
+    Args:
+        documents (list): List of dictionaries with 'source' and 'text' keys
+        queries (list): Labelled queries, see evaluate_retriever
+        index_configs (list): index_config dictionaries to compare
+        k (int): Number of results retrieved per query
+        modes (tuple): Search modes evaluated for every configuration
+        model_name (str): Sentence transformer model name
+        cache_dir (str): Embedding store directory; a temporary one is used and removed by default
+
+    Returns:
+        list: One dictionary per configuration with build time, memory and per-mode results
+    """
+    owns_cache = cache_dir is None
+    cache_dir = cache_dir or tempfile.mkdtemp(prefix="benchmark_")
+    model = None
+    report = []
+    try:
+        for config in index_configs:
+            started = time.perf_counter()
+            try:
+                retriever = RegulatoryRetriever(documents, model_name=model_name, cache_dir=cache_dir,
+                                                index_config=config, model=model)
+            except Exception as e:
+                # e.g. too few vectors to train IVF/PQ quantizers
+                report.append({"index_config": config, "error": str(e)})
+                continue
+            build_seconds = time.perf_counter() - started
+            retriever.warm_up()
+            model = getattr(retriever, "model", model)
+
+            report.append({
+                "index_config": config,
+                "index_type": retriever.index_type,
+                "chunks": len(retriever.chunks),
+                "build_seconds": round(build_seconds, 3),
+                "memory": retriever.memory_footprint(),
+                "results": [evaluate_retriever(retriever, queries, k=k, mode=mode) for mode in modes]
+            })
+    finally:
+        if owns_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    # Benchmark index configurations on the labelled or synthetic corpus and write a JSON report
+    from dotenv import load_dotenv
+    from data_loader import load_regulatory_docs
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency per index configuration")
+    parser.add_argument("--corpus", choices=("reg_docs", "synthetic"), default="reg_docs")
+    parser.add_argument("--docs", default=os.getenv("DOCS_FOLDER", "reg_docs"))
+    parser.add_argument("--passages", type=int, default=10000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Synthetic labelled queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-types", default="flat,hnsw,ivf_flat",
+                        help=f"Comma-separated subset of {', '.join(INDEX_TYPES)}")
+    parser.add_argument("--vector-dtypes", default="float32", help="Comma-separated storage precisions")
+    parser.add_argument("--modes", default="dense", help=f"Comma-separated subset of {', '.join(SEARCH_MODES)}")
+    parser.add_argument("--output", default="benchmark_report.json")
+    args = parser.parse_args()
+
+    if args.corpus == "synthetic":
+        documents, queries = synthetic_corpus(args.passages, args.queries, args.seed)
+    else:
+        documents, queries = load_regulatory_docs(args.docs), LABELLED_QUERIES
+
+    base_config = index_config_from_env()
+    index_configs = [{**base_config, "index_type": index_type, "vector_dtype": vector_dtype}
+                     for vector_dtype in args.vector_dtypes.split(",")
+                     for index_type in args.index_types.split(",")]
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "corpus": {"name": args.corpus, "documents": len(documents), "queries": len(queries)},
+        "model": os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        "configurations": run_benchmark(documents, queries, index_configs, k=args.k, modes=args.modes.split(","),
+                                        model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Benchmark report written to {args.output}")
@@ -0,0 +1,234 @@
+from collections import Counter, defaultdict
+import heapq
+import math
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Lowercase alphanumeric tokenization that keeps regulatory identifiers
+    such as 'cet1', 'at1', '36' and '350' intact.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+
+    Passages can be added and removed one at a time; IDF and average
+    length are derived from the live passages at query time. Copies share
+    posting lists, and whichever index first changes a term copies its list.
+    """
+
+    def __init__(self, texts=(), k1=1.5, b=0.75):
+        """
+        Args:
+            texts (list): Initial passage texts; positions are used as passage ids
+            k1 (float): Term frequency saturation
+            b (float): Length normalization strength
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+        # Terms whose posting lists this index may change in place; None if it owns them all
+        self._owned = None
+        for doc_id, text in enumerate(texts):
+            self.add(doc_id, text)
+
+    @property
+    def n_docs(self):
+        return len(self.doc_lengths)
+
+    def add(self, doc_id, text):
+        """Index one passage under the given id, replacing any previous entry."""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        self.doc_lengths[doc_id] = length
+        self.doc_terms[doc_id] = tuple(counts)
+        self.total_length += length
+        for term, tf in counts.items():
+            self._writable_postings(term)[doc_id] = tf
+
+    def remove(self, doc_id):
+        """Drop one passage from the index; unknown ids are ignored."""
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.doc_terms.pop(doc_id):
+            postings = self._writable_postings(term)
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+
+    def _writable_postings(self, term):
+        """Posting list of a term that this index may change, copying it first if it is shared."""
+        postings = self.postings.get(term)
+        if postings is not None and (self._owned is None or term in self._owned):
+            return postings
+        postings = self.postings[term] = dict(postings or {})
+        if self._owned is not None:
+            self._owned.add(term)
+        return postings
+
+    def copy(self):
+        """
+        Copy that can be updated without affecting this index.
+
+        Posting lists are shared rather than copied, so the cost follows the
+        vocabulary and passage count, not the total number of postings.
+        """
+        clone = BM25Index(k1=self.k1, b=self.b)
+        clone.postings = defaultdict(dict, self.postings)
+        clone.doc_lengths = dict(self.doc_lengths)
+        clone.doc_terms = dict(self.doc_terms)
+        clone.total_length = self.total_length
+        # From now on both indexes copy a shared posting list before changing it
+        self._owned = set()
+        clone._owned = set()
+        return clone
+
+    def save(self, path):
+        """
+        Write the index to an .npz file of flat arrays, so loading needs no re-tokenization.
+
+        Postings are stored term by term and each passage's distinct terms as
+        vocabulary ids, so load() rebuilds both lookups with slicing alone.
+        """
+        vocabulary = {term: i for i, term in enumerate(self.postings)}
+        posting_docs, posting_tfs, posting_offsets = [], [], [0]
+        for postings in self.postings.values():
+            posting_docs.extend(postings)
+            posting_tfs.extend(postings.values())
+            posting_offsets.append(len(posting_docs))
+        doc_ids = list(self.doc_terms)
+        term_ids, term_offsets = [], [0]
+        for doc_id in doc_ids:
+            term_ids.extend(vocabulary[term] for term in self.doc_terms[doc_id])
+            term_offsets.append(len(term_ids))
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                params=np.array([self.k1, self.b], dtype="float64"),
+                vocabulary=np.array(list(vocabulary), dtype=str),
+                posting_docs=np.array(posting_docs, dtype="int64"),
+                posting_tfs=np.array(posting_tfs, dtype="int32"),
+                posting_offsets=np.array(posting_offsets, dtype="int64"),
+                doc_ids=np.array(doc_ids, dtype="int64"),
+                doc_lengths=np.array([self.doc_lengths[doc_id] for doc_id in doc_ids], dtype="int64"),
+                term_ids=np.array(term_ids, dtype="int32"),
+                term_offsets=np.array(term_offsets, dtype="int64")
+            )
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save()."""
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            vocabulary = data["vocabulary"].tolist()
+            posting_docs = data["posting_docs"].tolist()
+            posting_tfs = data["posting_tfs"].tolist()
+            posting_offsets = data["posting_offsets"].tolist()
+            doc_ids = data["doc_ids"].tolist()
+            doc_lengths = data["doc_lengths"].tolist()
+            term_ids = data["term_ids"].tolist()
+            term_offsets = data["term_offsets"].tolist()
+
+        index = cls(k1=k1, b=b)
+        index.postings = defaultdict(dict, {
+            term: dict(zip(posting_docs[posting_offsets[i]:posting_offsets[i + 1]],
+                           posting_tfs[posting_offsets[i]:posting_offsets[i + 1]]))
+            for i, term in enumerate(vocabulary)
+        })
+        terms = [vocabulary[i] for i in term_ids]
+        index.doc_terms = {doc_id: tuple(terms[term_offsets[i]:term_offsets[i + 1]])
+                           for i, doc_id in enumerate(doc_ids)}
+        index.doc_lengths = dict(zip(doc_ids, doc_lengths))
+        index.total_length = sum(doc_lengths)
+        return index
+
+    def term_stats(self, query):
+        """
+        Corpus statistics a query's scores depend on, to be summed across indexes.
+
+        Returns:
+            dict: Passage count, total passage length and the document frequency of each query term
+        """
+        return {
+            "n_docs": self.n_docs,
+            "total_length": self.total_length,
+            "df": {term: len(self.postings.get(term, ())) for term in set(tokenize(query))}
+        }
+
+    def search(self, query, k=10, allowed=None, stats=None):
+        """
+        Score passages against a query.
+
+        Args:
+            query (str): Search query
+            k (int): Number of top passages to return
+            allowed (np.ndarray): Optional boolean mask over passage ids; others are skipped
+            stats (dict): Corpus statistics to score with, from merge_term_stats over several
+                indexes (e.g. shards) so their scores are comparable; defaults to this index's own
+
+        Returns:
+            list: (passage id, score) tuples, best first
+        """
+        if not self.n_docs:
+            return []
+        stats = stats or self.term_stats(query)
+        n_docs = stats["n_docs"]
+        avg_length = stats["total_length"] / n_docs
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = stats["df"][term]
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                if allowed is not None and not (doc_id < len(allowed) and allowed[doc_id]):
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def merge_term_stats(stats):
+    """Sum term_stats() of several indexes into statistics of their combined corpus."""
+    df = Counter()
+    for part in stats:
+        df.update(part["df"])
+    return {
+        "n_docs": sum(part["n_docs"] for part in stats),
+        "total_length": sum(part["total_length"] for part in stats),
+        "df": dict(df)
+    }
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merge ranked id lists with reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of ids, each ordered best first
+        k (int): RRF damping constant
+
+    Returns:
+        list: (id, fused score) tuples, best first
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,130 @@
+import re
+
+# Short lines that open a new regulatory section. Chunks never span one of these.
+SECTION_HEADING = re.compile(
+    r"^[ \t]*(?:(?:CRR|CRD|PRA|EBA)\s+)?(?:Article|Section|Chapter|Part|Title|Annex)\s+[0-9IVXLC]+[A-Za-z]?\b[^\n]{0,80}$",
+    re.MULTILINE,
+)
+
+DEFAULT_CHUNK_SIZE = 800
+DEFAULT_CHUNK_OVERLAP = 150
+
+
+def find_section_spans(text):
+    """
+    Split a document into section spans at article/section headings.
+
+    Args:
+        text (str): Full document text
+
+    Returns:
+        list: List of (start, end) character offsets covering the text
+    """
+    starts = [m.start() for m in SECTION_HEADING.finditer(text) if m.start() > 0]
+    bounds = [0] + starts + [len(text)]
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1) if bounds[i] < bounds[i + 1]]
+
+
+def _strip_span(text, start, end):
+    """Shrink a span so it does not begin or end on whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _cut_point(text, start, limit):
+    """
+    Pick where a window starting at `start` should end, at most at `limit`.
+
+    Prefers a paragraph break, then a line break, then a space, as long as
+    the resulting window is at least half of the requested size.
+    """
+    floor = start + (limit - start) // 2
+    for sep in ("\n\n", "\n", " "):
+        pos = text.rfind(sep, floor, limit)
+        if pos != -1:
+            return pos + len(sep)
+    return limit
+
+
+def _window_spans(text, start, end, chunk_size, overlap):
+    """Split one section into overlapping windows that end on natural breaks."""
+    spans = []
+    pos = start
+    while pos < end:
+        if end - pos <= chunk_size:
+            cut = end
+        else:
+            cut = _cut_point(text, pos, pos + chunk_size)
+        span = _strip_span(text, pos, cut)
+        if span[0] < span[1]:
+            spans.append(span)
+        if cut >= end:
+            break
+
+        # Step back by the overlap, then move forward to the next word start
+        next_pos = max(cut - overlap, pos + 1)
+        while next_pos < cut and not text[next_pos - 1].isspace():
+            next_pos += 1
+        pos = next_pos
+    return spans
+
+
+def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Split a document into overlapping passages that respect section boundaries.
+
+    Args:
+        text (str): Full document text
+        chunk_size (int): Maximum passage length in characters
+        overlap (int): Characters shared between consecutive passages of a section
+
+    Returns:
+        list: List of (start, end) character offsets into the text
+    """
+    if overlap >= chunk_size:
+        raise ValueError("Chunk overlap must be smaller than chunk size")
+
+    spans = []
+    for start, end in find_section_spans(text):
+        spans.extend(_window_spans(text, start, end, chunk_size, overlap))
+    return spans
+
+
+def chunk_documents(documents, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    """
+    Chunk loaded documents into passages.
+
+    Args:
+        documents (iterable): Dictionaries with 'source' and 'text' keys, e.g.
+            streamed from data_loader.iter_regulatory_docs
+        chunk_size (int): Maximum passage length in characters
+        overlap (int): Characters shared between consecutive passages of a section
+
+    Returns:
+        list: List of dictionaries with 'source', 'start', 'end' and 'text' keys
+    """
+    chunks = []
+    for doc in documents:
+        text = doc["text"]
+        for start, end in chunk_text(text, chunk_size, overlap):
+            chunks.append({
+                "source": doc["source"],
+                "start": start,
+                "end": end,
+                "text": text[start:end]
+            })
+    return chunks
+
+
+if __name__ == "__main__":
+    # Test the chunker
+    from data_loader import load_regulatory_docs
+
+    documents = load_regulatory_docs()
+    chunks = chunk_documents(documents)
+    print(f"\nSplit {len(documents)} documents into {len(chunks)} chunks")
+    for chunk in chunks:
+        print(f"- {chunk['source']} [{chunk['start']}:{chunk['end']}]: {chunk['text'][:60]!r}")
@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import time
+
+from data_loader import iter_document_paths, read_document
+from retriever import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Kept inside the corpus folder; the leading dot keeps the loader from indexing it
+MANIFEST_FILE = ".corpus_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class CorpusDiff:
+    """Documents added, changed and removed since a manifest was recorded."""
+
+    def __init__(self, added, changed, removed, unchanged):
+        """
+        Args:
+            added (list): Document records for new files
+            changed (list): Document records for files whose content changed
+            removed (list): Source names no longer on disk
+            unchanged (list): Source names whose content is as recorded
+        """
+        self.added = added
+        self.changed = changed
+        self.removed = removed
+        self.unchanged = unchanged
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    @property
+    def documents(self):
+        """Documents that need chunking and embedding."""
+        return self.added + self.changed
+
+    def summary(self):
+        return {
+            "added": [doc["source"] for doc in self.added],
+            "changed": [doc["source"] for doc in self.changed],
+            "removed": list(self.removed),
+            "unchanged": len(self.unchanged)
+        }
+
+
+class CorpusManifest:
+    """
+    Persisted record of the indexed corpus for cheap change detection.
+
+    Each document is recorded with its size, modification time, content
+    hash and chunk ids. A diff first compares sizes and mtimes from a
+    directory walk, so an unchanged corpus is checked without opening a
+    single file; only files whose stat differs are read and hashed, and a
+    file that was merely touched is reported as unchanged.
+    """
+
+    def __init__(self, folder_path="reg_docs", manifest_path=None):
+        """
+        Args:
+            folder_path (str): Corpus root folder
+            manifest_path (str): Where the manifest is stored; defaults to
+                MANIFEST_FILE inside the corpus folder
+        """
+        self.folder_path = folder_path
+        self.path = manifest_path or os.path.join(folder_path, MANIFEST_FILE)
+        self.entries = {}
+        self.saved_at_ns = 0
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Read the manifest from disk; a missing or unreadable one counts as empty."""
+        self.entries = {}
+        self.saved_at_ns = 0
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except Exception as e:
+            logger.warning("Ignoring unreadable corpus manifest %s: %s", self.path, e)
+            return False
+        if saved.get("version") != MANIFEST_VERSION or saved.get("folder") != os.path.abspath(self.folder_path):
+            return False
+        self.entries = saved["documents"]
+        self.saved_at_ns = saved["saved_at_ns"]
+        return True
+
+    def save(self):
+        """Write the manifest atomically."""
+        self.saved_at_ns = time.time_ns()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "folder": os.path.abspath(self.folder_path),
+            "saved_at_ns": self.saved_at_ns,
+            "documents": self.entries
+        }
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _stat_matches(self, entry, stat):
+        # A file modified within the mtime granularity of the last save may
+        # have changed again without its mtime moving, so it is re-hashed
+        return (entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+                and stat.st_mtime_ns < self.saved_at_ns)
+
+    def diff(self, max_workers=None, sources=None):
+        """
+        Compare the corpus on disk with the manifest.
+
+        Args:
+            max_workers (int): Threads reading files whose stat changed
+            sources (iterable): Only check these source names, e.g. the files a
+                watcher saw change; None walks the whole folder
+
+        Returns:
+            CorpusDiff: Added and changed documents are fully loaded, so
+                they can go straight to the retriever without a second read
+        """
+        if sources is None:
+            listing = iter_document_paths(self.folder_path)
+        else:
+            root = os.path.abspath(self.folder_path)
+            sources = {source for source in sources
+                       if not any(part.startswith(".") for part in source.split("/"))}
+            listing = [(source, os.path.join(root, *source.split("/"))) for source in sorted(sources)
+                       if os.path.isfile(os.path.join(root, *source.split("/")))]
+
+        suspects = []
+        unchanged = []
+        on_disk = set()
+        for source, path in listing:
+            on_disk.add(source)
+            entry = self.entries.get(source)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if entry is not None and self._stat_matches(entry, stat):
+                unchanged.append(source)
+            else:
+                suspects.append((source, path))
+
+        added, changed = [], []
+        if suspects:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="manifest-reader") as executor:
+                futures = [(source, executor.submit(read_document, source, path)) for source, path in suspects]
+                for source, future in futures:
+                    try:
+                        doc = future.result()
+                    except Exception as e:
+                        logger.error("Error loading %s: %s", source, e, extra={"source": source, "error": str(e)})
+                        continue
+                    entry = self.entries.get(source)
+                    if entry is None:
+                        added.append(doc)
+                    elif entry["hash"] != content_hash(doc["text"]):
+                        changed.append(doc)
+                    else:
+                        # Touched but not modified: remember the new stat
+                        entry.update(size=doc["size"], mtime_ns=doc["mtime_ns"])
+                        self._dirty = True
+                        unchanged.append(source)
+
+        removed = sorted((set(self.entries) if sources is None else sources & set(self.entries)) - on_disk)
+        diff = CorpusDiff(added, changed, removed, unchanged)
+        logger.info("Corpus diff: %d added, %d changed, %d removed, %d unchanged",
+                    len(added), len(changed), len(removed), len(unchanged), extra=diff.summary())
+        return diff
+
+    def record(self, documents, chunk_ids=None):
+        """
+        Record documents as indexed.
+
+        Args:
+            documents (list): Document records, ideally carrying the size and
+                mtime captured when they were read; a record with a 'hash'
+                needs no 'text'
+            chunk_ids (callable): chunk_ids(source) returning the document's chunk ids
+        """
+        for doc in documents:
+            if "size" in doc and "mtime_ns" in doc:
+                size, mtime_ns = doc["size"], doc["mtime_ns"]
+            else:
+                stat = os.stat(doc.get("path") or os.path.join(self.folder_path, doc["source"]))
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            self.entries[doc["source"]] = {
+                "size": size,
+                "mtime_ns": mtime_ns,
+                "hash": doc["hash"] if "hash" in doc else content_hash(doc["text"]),
+                "chunk_ids": list(chunk_ids(doc["source"])) if chunk_ids else []
+            }
+
+    def forget(self, sources):
+        """Drop removed documents from the manifest."""
+        for source in sources:
+            self.entries.pop(source, None)
+
+    def rebuild(self, documents, chunk_ids=None):
+        """Replace the manifest with exactly these documents and save it."""
+        self.entries = {}
+        self.record(documents, chunk_ids)
+        self.save()
+
+    def apply(self, diff, chunk_ids=None):
+        """Record a diff once its documents have been indexed, and save if anything changed."""
+        self.record(diff.documents, chunk_ids)
+        self.forget(diff.removed)
+        if diff or self._dirty:
+            self.save()
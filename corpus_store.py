@@ -0,0 +1,175 @@
+import mmap
+import os
+import tempfile
+import threading
+
+
+class TextView:
+    """
+    A (offset, length) reference into a CorpusStore, decoded only when read.
+
+    Offsets and lengths are in UTF-8 bytes. str(view) decodes the text;
+    nothing is cached, so holding views costs no memory per character.
+    """
+
+    __slots__ = ("store", "offset", "length")
+
+    def __init__(self, store, offset, length):
+        self.store = store
+        self.offset = offset
+        self.length = length
+
+    @property
+    def nbytes(self):
+        return self.length
+
+    def encode(self, encoding="utf-8"):
+        """The raw UTF-8 bytes, without decoding."""
+        data = self.store.read(self.offset, self.length)
+        return data if encoding.lower().replace("-", "") == "utf8" else data.decode("utf-8").encode(encoding)
+
+    def slice_bytes(self, start, end):
+        """Decode only bytes [start, end) of the view; split characters are replaced."""
+        start = max(0, min(start, self.length))
+        end = max(start, min(end, self.length))
+        return self.store.read(self.offset + start, end - start).decode("utf-8", errors="replace")
+
+    def __str__(self):
+        return self.store.text(self.offset, self.length)
+
+    def __repr__(self):
+        return f"TextView(offset={self.offset}, length={self.length})"
+
+
+class CorpusStore:
+    """
+    Append-only UTF-8 blob of document texts, memory-mapped for reads.
+
+    Every text is stored once and addressed by its byte (offset, length).
+    A store can start from a blob written by save(), optionally followed by
+    a tail blob of texts appended to it since, both mapped read-only; texts
+    appended afterwards go to an anonymous temporary file in the given
+    directory and are addressed past the end of the saved blobs. Either way
+    the pages sit in the OS page cache rather than process memory. Texts of
+    removed documents are not reclaimed until the blob is saved again.
+    """
+
+    def __init__(self, directory=None, path=None, tail_path=None):
+        """
+        Args:
+            directory (str): Where to create the file for appended texts; should be
+                on disk rather than a RAM-backed filesystem
+            path (str): Saved blob to start from
+            tail_path (str): Saved texts that follow the blob at `path`
+        """
+        self._directory = directory
+        # (first offset, map) of each saved blob, in offset order
+        self._saved = []
+        self._base_size = 0
+        for saved in (path, tail_path):
+            if saved is None:
+                continue
+            with open(saved, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size:
+                    self._saved.append((self._base_size, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)))
+            self._base_size += size
+        self._file = None
+        self._size = self._base_size
+        self._map = None
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        return self._size
+
+    def append(self, text):
+        """
+        Add a text to the end of the blob.
+
+        Returns:
+            tuple: (offset, length) of its UTF-8 bytes
+        """
+        data = text.encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(dir=self._directory, prefix="corpus_", suffix=".blob")
+            offset = self._size
+            self._file.seek(offset - self._base_size)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        return offset, len(data)
+
+    def view(self, offset, length):
+        return TextView(self, offset, length)
+
+    def _mapped(self, end):
+        """Map of the appended texts covering at least `end` bytes of them."""
+        current = self._map
+        if current is None or len(current) < end:
+            with self._lock:
+                if self._map is None or len(self._map) < end:
+                    # Older maps stay valid for readers still holding them
+                    self._map = mmap.mmap(self._file.fileno(), self._size - self._base_size,
+                                          access=mmap.ACCESS_READ)
+                current = self._map
+        return current
+
+    def read(self, offset, length):
+        """Copy out the raw bytes of a range."""
+        if length <= 0:
+            return b""
+        if offset < self._base_size:
+            # Saved texts never span two blobs
+            start, mapped = next(saved for saved in reversed(self._saved) if saved[0] <= offset)
+            return mapped[offset - start:offset - start + length]
+        offset -= self._base_size
+        return self._mapped(offset + length)[offset:offset + length]
+
+    def save(self, path, ranges):
+        """
+        Write texts back to back into a new blob file, e.g. leaving out removed documents.
+
+        Args:
+            path (str): File to write
+            ranges (list): (offset, length) of each text to keep, in the order to write them
+
+        Returns:
+            list: Offset of each text in the new blob
+        """
+        offsets = []
+        written = 0
+        with open(path, "wb") as f:
+            for offset, length in ranges:
+                f.write(self.read(offset, length))
+                offsets.append(written)
+                written += length
+        return offsets
+
+    def text(self, offset, length):
+        """Decode a stored text, or part of one on character boundaries."""
+        return self.read(offset, length).decode("utf-8")
+
+
+def utf8_offsets(text, positions):
+    """
+    Convert character offsets in a text to UTF-8 byte offsets.
+
+    Args:
+        text (str): Document text
+        positions (iterable): Character offsets
+
+    Returns:
+        dict: Character offset -> byte offset
+    """
+    positions = sorted(set(positions))
+    if text.isascii():
+        return {p: p for p in positions}
+    offsets = {}
+    previous = byte = 0
+    for p in positions:
+        byte += len(text[previous:p].encode("utf-8"))
+        offsets[p] = byte
+        previous = p
+    return offsets
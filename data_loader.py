@@ -1,40 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import logging
 import os
+from typing import Dict, Iterator, List, TypedDict
 
-def load_regulatory_docs(folder_path="reg_docs"):
+from metadata import extract_metadata
+
+logger = logging.getLogger(__name__)
+
+# Files read ahead of the consumer per worker thread; bounds texts held in memory
+READ_AHEAD_PER_WORKER = 4
+
+
+class Document(TypedDict):
+    """A loaded regulatory document; a plain dict, so existing consumers keep working."""
+    source: str      # Path relative to the corpus folder, '/'-separated
+    text: str
+    metadata: Dict
+    path: str        # Absolute path on disk
+    size: int        # File size and modification time when it was read,
+    mtime_ns: int    # used by corpus_manifest to detect later changes
+
+
+def iter_document_paths(folder_path="reg_docs"):
+    """
+    Walk a corpus folder recursively in a stable order.
+
+    Hidden files and directories (names starting with '.') are skipped.
+
+    Yields:
+        tuple: (source name relative to folder_path, absolute file path)
+    """
+    root = os.path.abspath(folder_path)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            if name.startswith("."):
+                continue
+            path = os.path.join(dirpath, name)
+            if os.path.isfile(path):
+                yield os.path.relpath(path, root).replace(os.sep, "/"), path
+
+
+def read_document(source, path):
+    """Read one file into a Document record."""
+    with open(path, "r", encoding="utf-8") as f:
+        # Stat before reading, so a write racing the read shows up as a newer mtime
+        stat = os.fstat(f.fileno())
+        text = f.read()
+    return Document(source=source, text=text, metadata=extract_metadata(os.path.basename(path), text),
+                    path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+
+def iter_regulatory_docs(folder_path="reg_docs", max_workers=None) -> Iterator[Document]:
     """
-    Load regulatory documents from the specified folder.
-    
+    Stream documents from a folder tree, reading files concurrently.
+
+    Files are read on a thread pool and yielded as soon as each one is
+    ready, so chunking or embedding can start before the whole corpus has
+    been read. At most READ_AHEAD_PER_WORKER files per thread are in
+    flight, which bounds memory on large corpora. Yield order follows
+    completion, not the directory listing.
+
+    Args:
+        folder_path (str): Root folder of the regulatory documents
+        max_workers (int): Reader threads; defaults to min(32, CPU count + 4)
+
+    Yields:
+        Document: One record per readable file
+    """
+    if not os.path.isdir(folder_path):
+        logger.warning("Folder '%s' does not exist", folder_path, extra={"folder": folder_path})
+        return
+
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+    paths = iter_document_paths(folder_path)
+    loaded = failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="doc-reader") as executor:
+        in_flight = {}
+        while True:
+            for source, path in paths:
+                in_flight[executor.submit(read_document, source, path)] = source
+                if len(in_flight) >= max_workers * READ_AHEAD_PER_WORKER:
+                    break
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = in_flight.pop(future)
+                try:
+                    doc = future.result()
+                except Exception as e:
+                    failed += 1
+                    logger.error("Error loading %s: %s", source, e, extra={"source": source, "error": str(e)})
+                    continue
+                loaded += 1
+                logger.debug("Loaded %s", source, extra={"source": source, "characters": len(doc["text"])})
+                yield doc
+    logger.info("Loaded %d documents from %s (%d failed)", loaded, folder_path, failed,
+                extra={"folder": folder_path, "loaded": loaded, "failed": failed})
+
+
+def load_regulatory_docs(folder_path="reg_docs", max_workers=None) -> List[Document]:
+    """
+    Load regulatory documents from the specified folder and its subfolders.
+
     Args:
         folder_path (str): Path to the folder containing regulatory documents
-        
+        max_workers (int): Reader threads, see iter_regulatory_docs
+
     Returns:
-        list: List of dictionaries containing document source and text
+        list: Document records sorted by source, so the corpus order (and
+            the embedding store built from it) is stable across loads
     """
-    docs = []
-    
-    if not os.path.exists(folder_path):
-        print(f"Warning: Folder '{folder_path}' does not exist.")
-        return docs
-    
-    for file in os.listdir(folder_path):
-        file_path = os.path.join(folder_path, file)
-        if os.path.isfile(file_path):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    text = f.read()
-                    docs.append({
-                        "source": file,
-                        "text": text
-                    })
-                    print(f"Loaded: {file}")
-            except Exception as e:
-                print(f"Error loading {file}: {e}")
-    
-    return docs
+    return sorted(iter_regulatory_docs(folder_path, max_workers), key=lambda doc: doc["source"])
+
 
 if __name__ == "__main__":
     # Test the loader
+    logging.basicConfig(level=logging.DEBUG)
     documents = load_regulatory_docs()
     print(f"\nLoaded {len(documents)} documents")
     for doc in documents:
-        print(f"- {doc['source']}: {len(doc['text'])} characters")
+        print(f"- {doc['source']}: {len(doc['text'])} characters, {doc['metadata']}")
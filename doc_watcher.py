@@ -0,0 +1,238 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+from data_loader import iter_document_paths
+
+logger = logging.getLogger(__name__)
+
+WATCH_BACKENDS = ("auto", "inotify", "poll")
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_hidden(relative_path):
+    return any(part.startswith(".") for part in relative_path.split("/"))
+
+
+class _InotifyBackend:
+    """Linux inotify through libc; one watch per directory of the tree."""
+
+    def __init__(self, folder_path):
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self._libc = libc
+        self.root = os.path.abspath(folder_path)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}
+        try:
+            self._watch_tree(self.root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def _watch_tree(self, top):
+        for dirpath, dirnames, _ in os.walk(top):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Cannot watch {dirpath}")
+            self._dirs[wd] = dirpath
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for changes.
+
+        Returns:
+            tuple: (whether anything changed, set of changed source names, or
+                None when the whole tree must be rescanned)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False, set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False, set()
+
+        sources = set()
+        rescan = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            directory = self._dirs.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+            relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+            if relative != "." and _is_hidden(relative):
+                continue
+            if mask & IN_ISDIR or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # A directory appeared, vanished or moved: its files are not
+                # reported one by one, so watch new subtrees and rescan
+                if mask & (IN_CREATE | IN_MOVED_TO) and os.path.isdir(path):
+                    try:
+                        self._watch_tree(path)
+                    except OSError as e:
+                        logger.warning("Cannot watch new folder %s: %s", path, e)
+                rescan = True
+            elif name:
+                sources.add(relative)
+        return True, None if rescan else sources
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    """Portable fallback: compare file sizes and mtimes between directory walks."""
+
+    def __init__(self, folder_path, interval, stop_event):
+        self.folder_path = folder_path
+        self.interval = interval
+        self._stop = stop_event
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for source, path in iter_document_paths(self.folder_path):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            snapshot[source] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        if self._stop.wait(min(timeout, self.interval)):
+            return False, set()
+        snapshot = self._scan()
+        previous, self._snapshot = self._snapshot, snapshot
+        sources = {source for source in previous.keys() | snapshot.keys()
+                   if previous.get(source) != snapshot.get(source)}
+        return bool(sources), sources
+
+    def close(self):
+        pass
+
+
+class DocumentWatcher:
+    """
+    Watch a document folder and report debounced batches of changed files.
+
+    Uses inotify on Linux and falls back to polling file stats elsewhere.
+    Changes are collected until the folder has been quiet for debounce
+    seconds (or max_delay has passed since the first change), then
+    on_change is called once from the watcher thread with the sorted
+    changed source names, or None if the whole folder should be rescanned.
+    """
+
+    def __init__(self, folder_path, on_change, backend="auto", debounce=1.0, poll_interval=2.0, max_delay=10.0):
+        """
+        Args:
+            folder_path (str): Folder to watch, recursively
+            on_change (callable): on_change(sources) handling one batch of changes
+            backend (str): 'auto', 'inotify' or 'poll'
+            debounce (float): Quiet period in seconds that ends a burst of changes
+            poll_interval (float): Seconds between directory walks when polling
+            max_delay (float): Longest a change waits while a burst continues
+        """
+        if backend not in WATCH_BACKENDS:
+            raise ValueError(f"Unknown watch backend '{backend}', expected one of {', '.join(WATCH_BACKENDS)}")
+        self.folder_path = folder_path
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_delay = max_delay
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._backend = None
+        if backend in ("auto", "inotify"):
+            try:
+                self._backend = _InotifyBackend(folder_path)
+                self.backend = "inotify"
+            except (OSError, AttributeError) as e:
+                if backend == "inotify":
+                    raise
+                logger.info("inotify unavailable (%s), polling %s every %ss", e, folder_path, poll_interval)
+        if self._backend is None:
+            self._backend = _PollingBackend(folder_path, poll_interval, self._stop)
+            self.backend = "poll"
+
+    def start(self):
+        """Start watching in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="doc-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Watching %s for document changes (%s)", self.folder_path, self.backend,
+                    extra={"folder": self.folder_path, "backend": self.backend})
+        return self
+
+    def stop(self, timeout=5.0):
+        """Stop the watcher thread and release the backend."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._backend.close()
+
+    def _run(self):
+        pending = set()
+        rescan = False
+        first = last = None
+        while not self._stop.is_set():
+            changed, sources = self._backend.wait(self.debounce if first is not None else self.poll_interval)
+            now = time.monotonic()
+            if changed:
+                if sources is None:
+                    rescan = True
+                else:
+                    pending |= sources
+                first = first if first is not None else now
+                last = now
+            if first is None or (now - last < self.debounce and now - first < self.max_delay):
+                continue
+
+            batch = None if rescan else sorted(pending)
+            pending = set()
+            rescan = False
+            first = last = None
+            if batch == []:
+                continue
+            try:
+                self.on_change(batch)
+            except Exception as e:
+                logger.error("Applying document changes failed: %s", e, extra={"sources": batch})
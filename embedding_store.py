@@ -0,0 +1,503 @@
+import faiss
+import numpy as np
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from index_backends import AppendOnlyMatrix
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+SPANS_FILE = "spans.npy"
+INDEX_FILE = "index.faiss"
+STAGING_FILE = "embeddings.partial.npy"
+# Corpus text and the lookup tables derived from it, saved next to the vectors
+CORPUS_FILE = "corpus.blob"
+CHUNK_BYTES_FILE = "chunk_bytes.npy"
+BM25_FILE = "bm25.npz"
+DOCUMENTS_FILE = "documents.json"
+# Written last, so its presence marks a complete set
+CORPUS_FILES = (CORPUS_FILE, CHUNK_BYTES_FILE, BM25_FILE, DOCUMENTS_FILE)
+# Rows, texts and documents added on top of a base generation by write_delta()
+EMBEDDINGS_TAIL_FILE = "embeddings.tail.npy"
+SPANS_TAIL_FILE = "spans.tail.npy"
+CORPUS_TAIL_FILE = "corpus.tail.blob"
+CHUNK_BYTES_TAIL_FILE = "chunk_bytes.tail.npy"
+DOCUMENTS_TAIL_FILE = "documents.tail.json"
+CORPUS_TAIL_FILES = (CORPUS_TAIL_FILE, CHUNK_BYTES_TAIL_FILE, DOCUMENTS_TAIL_FILE)
+# Files a delta generation shares with the generation it was written on top of
+BASE_FILES = (EMBEDDINGS_FILE, SPANS_FILE, INDEX_FILE) + CORPUS_FILES
+
+# Each complete snapshot is written to its own directory, named with this prefix
+GENERATION_PREFIX = "gen-"
+BUILDING_PREFIX = ".building-"
+# Build directories left behind by a crashed writer are removed after this long
+STALE_BUILD_SECONDS = 3600
+
+
+def store_key(model_name, chunk_size, chunk_overlap, vector_dtype):
+    """Settings that invalidate every cached vector when they change."""
+    return {
+        "model_name": model_name,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "vector_dtype": vector_dtype
+    }
+
+
+def _index_read_flags():
+    """FAISS read flags that map the index file instead of copying it into RAM."""
+    flags = getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+    # Newer FAISS builds can also map flat index codes, older ones only IVF lists
+    flags |= getattr(faiss, "IO_FLAG_MMAP_IFC", getattr(faiss, "IO_FLAG_MMAP", 0))
+    return flags
+
+
+class EmbeddingStore:
+    """
+    On-disk store for chunk embeddings and the FAISS index built from them.
+
+    Vectors are kept as a raw .npy matrix (float32, float16 or int8) opened with mmap_mode, so
+    worker processes share the same pages through the OS page cache. A small
+    JSON manifest records the cache key and, for each document in corpus
+    order, its content hash and row range in the matrix. Alongside the
+    vectors, a generation can hold the corpus text as one UTF-8 blob with
+    its chunk byte offsets, BM25 postings and parsed documents, so a
+    restart maps them instead of re-parsing every document.
+
+    Every complete write goes to a fresh generation directory, which is
+    published by atomically replacing the manifest that names it. The
+    vectors and offsets of a published generation never change, so a
+    retriever can keep mapping the generation it loaded or wrote while
+    other writers sharing the cache directory publish newer ones. Stores written before
+    generations were introduced keep their files in the cache directory
+    itself and are still read.
+
+    A delta generation hard-links the base files of the one it updates and
+    adds tail files holding only the rows, texts and documents added since,
+    so saving a small update does not rewrite the corpus. Readers see the
+    base and tail rows as one matrix.
+    """
+
+    def __init__(self, cache_dir, key):
+        """
+        Args:
+            cache_dir (str): Directory holding the store files
+            key (dict): Settings that must match for the store to be reused
+        """
+        self.cache_dir = cache_dir
+        self.key = key
+        # Generation directory this store reads from; "" is the legacy flat layout
+        self.generation = ""
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _data_path(self, name):
+        return os.path.join(self.cache_dir, self.generation, name)
+
+    def load_manifest(self):
+        """
+        Load the manifest if it exists and was written with the same key.
+
+        Returns:
+            dict or None: Manifest with 'key', 'dimension' and 'documents'
+        """
+        path = self._path(MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable embeddings manifest {path}: {e}")
+            return None
+
+        if manifest.get("key") != self.key:
+            print(f"Ignoring stale embeddings cache in {self.cache_dir}")
+            return None
+        generation = manifest.get("generation", "")
+        if not os.path.isdir(self._path(generation)):
+            print(f"Ignoring embeddings manifest naming a missing generation {generation}")
+            return None
+        self.generation = generation
+        return manifest
+
+    def read_embeddings(self):
+        """
+        Open the embedding matrix read-only without loading it into RAM.
+
+        Returns:
+            AppendOnlyMatrix: The base rows followed by any tail rows of a delta generation
+        """
+        tail = None
+        if os.path.exists(self._data_path(EMBEDDINGS_TAIL_FILE)):
+            tail = np.load(self._data_path(EMBEDDINGS_TAIL_FILE), mmap_mode="r")
+        return AppendOnlyMatrix(np.load(self._data_path(EMBEDDINGS_FILE), mmap_mode="r"), tail)
+
+    def read_spans(self):
+        """Open the (start, end) chunk offsets matrix read-only, with the offsets of any tail rows after it."""
+        spans = np.load(self._data_path(SPANS_FILE), mmap_mode="r")
+        if os.path.exists(self._data_path(SPANS_TAIL_FILE)):
+            spans = np.concatenate([spans, np.load(self._data_path(SPANS_TAIL_FILE))])
+        return spans
+
+    def read_index(self, mmap=True):
+        """
+        Read the serialized FAISS index, memory-mapped where supported.
+
+        Args:
+            mmap (bool): Map the file read-only; pass False for an index that will be modified
+
+        Returns:
+            faiss.Index or None: The index, or None if it is missing or unreadable
+        """
+        path = self._data_path(INDEX_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            return faiss.read_index(path, _index_read_flags() if mmap else 0)
+        except Exception:
+            try:
+                return faiss.read_index(path)
+            except Exception as e:
+                print(f"Ignoring unreadable FAISS index {path}: {e}")
+                return None
+
+    def read_corpus(self):
+        """
+        Locate the saved corpus of the loaded generation.
+
+        Returns:
+            dict or None: 'blob' and 'bm25' file paths, the (n_rows, 2)
+                'chunk_bytes' offsets and the 'documents' table in source order,
+                or None if the generation was written without a corpus (e.g.
+                by ingest.py). For a delta generation, 'tail_blob' continues
+                the blob, and the BM25 postings cover only the first
+                'base_rows' rows, less the 'removed_rows' listed; 'base_sources'
+                names the documents whose record is still the base one.
+        """
+        documents = _read_json(self._data_path(DOCUMENTS_FILE))
+        if documents is None:
+            return None
+        chunk_bytes = np.load(self._data_path(CHUNK_BYTES_FILE), mmap_mode="r")
+        saved = {
+            "blob": self._data_path(CORPUS_FILE),
+            "tail_blob": None,
+            "bm25": self._data_path(BM25_FILE),
+            "chunk_bytes": chunk_bytes,
+            "documents": documents,
+            "base_rows": len(chunk_bytes),
+            "base_sources": [doc["source"] for doc in documents],
+            "removed_rows": []
+        }
+        delta = _read_json(self._data_path(DOCUMENTS_TAIL_FILE))
+        if delta is None:
+            return saved
+        removed = set(delta["removed_sources"])
+        base = [doc for doc in documents if doc["source"] not in removed]
+        saved.update({
+            "tail_blob": self._data_path(CORPUS_TAIL_FILE),
+            "chunk_bytes": np.concatenate([chunk_bytes, np.load(self._data_path(CHUNK_BYTES_TAIL_FILE))]),
+            "documents": sorted(base + delta["documents"], key=lambda doc: doc["source"]),
+            "base_sources": [doc["source"] for doc in base],
+            "removed_rows": delta["removed_rows"]
+        })
+        return saved
+
+    def write_corpus(self, write_files):
+        """
+        Add the corpus files to the loaded generation, e.g. one written by ingest.py.
+
+        Args:
+            write_files (callable): write_files(directory) creating CORPUS_FILES there
+        """
+        directory = self._data_path("")
+        if not os.path.isdir(directory):
+            # The generation was superseded and removed by another writer
+            return
+        try:
+            building = tempfile.mkdtemp(prefix=BUILDING_PREFIX, dir=directory)
+            try:
+                write_files(building)
+                # Readers must not pair a replaced blob with the previous documents table,
+                # and the new files cover every row, so any corpus tail goes too
+                for name in (DOCUMENTS_TAIL_FILE, DOCUMENTS_FILE):
+                    if os.path.exists(os.path.join(directory, name)):
+                        os.remove(os.path.join(directory, name))
+                for name in CORPUS_FILES:
+                    os.replace(os.path.join(building, name), os.path.join(directory, name))
+            finally:
+                shutil.rmtree(building, ignore_errors=True)
+        except OSError as e:
+            print(f"Could not save the corpus to {directory}: {e}")
+
+    def _replace(self, name, write):
+        """Write a file next to its final path and rename it into place."""
+        path = self._path(name)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+
+    def _publish(self, write_files, manifest):
+        """
+        Write a new generation and make it the current one.
+
+        Args:
+            write_files (callable): write_files(directory) creating the data files
+            manifest (dict): Manifest to publish; its 'generation' is filled in
+
+        Returns:
+            The return value of write_files
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        building = tempfile.mkdtemp(prefix=BUILDING_PREFIX, dir=self.cache_dir)
+        try:
+            written = write_files(building)
+            generation = f"{GENERATION_PREFIX}{time.time_ns()}-{os.path.basename(building)[len(BUILDING_PREFIX):]}"
+            os.rename(building, self._path(generation))
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        manifest = {**manifest, "generation": generation}
+        self._replace(MANIFEST_FILE, lambda p: _write_json(p, manifest))
+        self.generation = generation
+        self._remove_old_generations()
+        return written
+
+    def _remove_old_generations(self):
+        """
+        Delete generations superseded by this store's, and abandoned build directories.
+
+        Generations published after this one, and the one the manifest
+        names, are kept even if another writer got there first. Readers that
+        still map a deleted generation keep their open files (POSIX keeps
+        unlinked files alive); where the OS refuses to delete files in use,
+        the directory is left for a later write to remove.
+        """
+        current = (_read_json(self._path(MANIFEST_FILE)) or {}).get("generation", "")
+        own = _generation_time(self.generation)
+        for name in os.listdir(self.cache_dir):
+            path = self._path(name)
+            if name.startswith(GENERATION_PREFIX):
+                if name not in (self.generation, current) and _generation_time(name) < own:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif name.startswith(BUILDING_PREFIX):
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                except OSError:
+                    pass
+        for name in (EMBEDDINGS_FILE, SPANS_FILE, INDEX_FILE) + CORPUS_FILES:
+            # Files of the legacy flat layout
+            if os.path.exists(self._path(name)):
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def write_index(self, index, index_type=None):
+        """
+        Serialize the FAISS index into this store's generation.
+
+        Args:
+            index (faiss.Index): Index to write
+            index_type (str): If given, also record it in the manifest so the
+                index is reused on the next start
+        """
+        path = self._data_path(INDEX_FILE)
+        if not os.path.isdir(os.path.dirname(path)):
+            # The generation was superseded and removed by another writer
+            return
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+        manifest = _read_json(self._path(MANIFEST_FILE)) if index_type is not None else None
+        # Only stamp the manifest if no other writer has published a newer generation
+        if manifest is not None and manifest.get("generation", "") == self.generation \
+                and manifest.get("index_type") != index_type:
+            manifest["index_type"] = index_type
+            self._replace(MANIFEST_FILE, lambda p: _write_json(p, manifest))
+
+    def open_staging(self, n_rows, dimension, dtype, resume=False):
+        """
+        Open a preallocated on-disk matrix that an ingestion job fills in batches.
+
+        Args:
+            n_rows (int): Total number of chunk vectors
+            dimension (int): Embedding dimension
+            dtype (str): Storage precision of the vectors
+            resume (bool): Reopen an existing staging matrix of the same shape
+
+        Returns:
+            tuple: (writable (n_rows, dimension) np.memmap backed by the staging
+                file, True if an existing staging matrix was reopened)
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(STAGING_FILE)
+        if resume and os.path.exists(path):
+            staged = np.lib.format.open_memmap(path, mode="r+")
+            if staged.shape == (n_rows, dimension) and staged.dtype == np.dtype(dtype):
+                return staged, True
+            del staged
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=(n_rows, dimension)), False
+
+    def commit_staging(self, documents, spans):
+        """
+        Promote a completed staging matrix to a new generation of the store.
+
+        The index is left to be rebuilt by the retriever on its next start.
+
+        Args:
+            documents (list): Per-document {'hash', 'offset', 'count'} in corpus order
+            spans (np.ndarray): (n_chunks, 2) int64 character offsets
+        """
+        staged = np.load(self._path(STAGING_FILE), mmap_mode="r")
+        dimension = int(staged.shape[1])
+        del staged
+
+        def write_files(directory):
+            os.replace(self._path(STAGING_FILE), os.path.join(directory, EMBEDDINGS_FILE))
+            _save_array(os.path.join(directory, SPANS_FILE), np.ascontiguousarray(spans, dtype="int64"))
+
+        self._publish(write_files, {
+            "key": self.key,
+            "dimension": dimension,
+            "index_type": None,
+            "documents": documents
+        })
+        print(f"Embeddings cached to {self.cache_dir}")
+
+    def write_delta(self, documents, spans, embeddings, index_type, write_corpus):
+        """
+        Persist an update as a new generation on top of the loaded one's base.
+
+        The base files of the loaded generation are hard-linked into the new
+        one (copied where the file system cannot link), and only the rows
+        from the base's row count on are written, to tail files, so the cost
+        of a save follows the size of the update rather than the corpus.
+        Tails hold everything added since the base, so they grow with each
+        delta until write() folds them into a new base.
+
+        Args:
+            documents (list): Per-document {'hash', 'offset', 'count'} in corpus order
+            spans (np.ndarray): (n_tail, 2) int64 character offsets of the rows after the base
+            embeddings (np.ndarray): (n_tail, dim) vectors of those rows
+            index_type (str): Index strategy of the base's FAISS index, if it has one
+            write_corpus (callable): write_corpus(directory) saving CORPUS_TAIL_FILES
+
+        Returns:
+            bool: False if the loaded generation has no complete base (e.g. it
+                was removed by another writer) and write() is needed instead
+        """
+        base = self._data_path("")
+        if not self.generation or not all(os.path.exists(os.path.join(base, name))
+                                          for name in (EMBEDDINGS_FILE, SPANS_FILE) + CORPUS_FILES):
+            return False
+        has_index = os.path.exists(os.path.join(base, INDEX_FILE))
+
+        def write_files(directory):
+            for name in BASE_FILES:
+                if os.path.exists(os.path.join(base, name)):
+                    _link(os.path.join(base, name), os.path.join(directory, name))
+            _save_array(os.path.join(directory, EMBEDDINGS_TAIL_FILE), np.ascontiguousarray(embeddings))
+            _save_array(os.path.join(directory, SPANS_TAIL_FILE), np.ascontiguousarray(spans, dtype="int64"))
+            write_corpus(directory)
+
+        try:
+            self._publish(write_files, {
+                "key": self.key,
+                "dimension": int(embeddings.shape[1]),
+                "index_type": index_type if has_index else None,
+                "documents": documents
+            })
+        except FileNotFoundError:
+            # The base was removed by another writer while it was being linked
+            return False
+        print(f"Embeddings update cached to {self.cache_dir}")
+        return True
+
+    def write(self, documents, spans, embeddings, index, index_type, write_corpus=None):
+        """
+        Persist a complete corpus snapshot as a new generation.
+
+        The files are written to a directory of their own and the manifest
+        naming it is replaced last, so readers never see a manifest pointing
+        at missing or partly written data, and two writers sharing the cache
+        directory never overwrite each other's files.
+
+        Args:
+            documents (list): Per-document {'hash', 'offset', 'count'} in corpus order
+            spans (np.ndarray): (n_chunks, 2) int64 character offsets
+            embeddings (np.ndarray): (n_chunks, dim) vectors in the configured storage precision
+            index: Index built over the embeddings
+            index_type (str): Index strategy; only FAISS indexes are serialized
+            write_corpus (callable): write_corpus(directory) saving CORPUS_FILES with the snapshot
+
+        Returns:
+            np.memmap: The written embeddings, mapped read-only. The map is
+                opened before the generation is published, so it stays valid
+                even if another writer supersedes and removes the generation.
+        """
+        def write_files(directory):
+            _save_array(os.path.join(directory, EMBEDDINGS_FILE), np.ascontiguousarray(embeddings))
+            _save_array(os.path.join(directory, SPANS_FILE), np.ascontiguousarray(spans, dtype="int64"))
+            if isinstance(index, faiss.Index):
+                faiss.write_index(index, os.path.join(directory, INDEX_FILE))
+            if write_corpus is not None:
+                write_corpus(directory)
+            return np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode="r")
+
+        mapped = self._publish(write_files, {
+            "key": self.key,
+            "dimension": int(embeddings.shape[1]),
+            "index_type": index_type,
+            "documents": documents
+        })
+        print(f"Embeddings cached to {self.cache_dir}")
+        return mapped
+
+
+def current_file(cache_dir, name):
+    """Path of a data file in the generation the store's manifest currently names."""
+    generation = (_read_json(os.path.join(cache_dir, MANIFEST_FILE)) or {}).get("generation", "")
+    return os.path.join(cache_dir, generation, name)
+
+
+def _generation_time(name):
+    """Publication time encoded in a generation name; the legacy layout sorts first."""
+    try:
+        return int(name[len(GENERATION_PREFIX):].split("-", 1)[0])
+    except ValueError:
+        return 0
+
+
+def _link(source, target):
+    """Share a file of a published generation with a new one, copying it where links are unsupported."""
+    try:
+        os.link(source, target)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _save_array(path, array):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
@@ -61,6 +61,10 @@ class CorepAssistant {
             statusDot?.classList.add('online');
             statusDot?.classList.remove('offline');
             if (statusText) statusText.textContent = 'Online';
+        } else if (data.status === 'warming') {
+            statusDot?.classList.add('online');
+            statusDot?.classList.remove('offline');
+            if (statusText) statusText.textContent = 'Warming up';
         } else {
             statusDot?.classList.add('offline');
             statusDot?.classList.remove('online');
@@ -0,0 +1,646 @@
+import faiss
+import numpy as np
+import json
+import os
+import time
+
+INDEX_TYPES = ("numpy", "flat", "ivf_flat", "ivf_pq", "hnsw")
+VECTOR_DTYPES = ("float32", "float16", "int8")
+
+# Sentence embeddings are unit-normalized, so every component lies in [-1, 1]
+# and int8 storage can use one fixed scale that never needs retraining.
+INT8_SCALE = 127.0
+
+# Rows decoded to float32 at a time while training and filling FAISS indexes
+TRAIN_SAMPLE_SIZE = 100000
+ADD_BATCH_SIZE = 65536
+
+# Corpus sizes (in vectors) at which automatic selection moves to the next strategy
+NUMPY_MAX_VECTORS = 2000
+FLAT_MAX_VECTORS = 50000
+HNSW_MAX_VECTORS = 1000000
+
+DEFAULT_INDEX_CONFIG = {
+    "index_type": "auto",
+    "nlist": None,          # IVF cells; None picks ~4 * sqrt(n)
+    "nprobe": 16,           # IVF cells visited per query
+    "pq_m": 48,             # PQ sub-quantizers (rounded down to a divisor of the dimension)
+    "pq_bits": 8,
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "vector_dtype": "float32"  # storage precision: float32, float16 or int8
+}
+
+
+def index_config_from_env():
+    """
+    Read index settings from environment variables.
+
+    Returns:
+        dict: Index configuration with the keys of DEFAULT_INDEX_CONFIG
+    """
+    config = dict(DEFAULT_INDEX_CONFIG)
+    config["index_type"] = os.getenv("INDEX_TYPE", config["index_type"]).lower()
+    config["vector_dtype"] = os.getenv("INDEX_VECTOR_DTYPE", config["vector_dtype"]).lower()
+    for key in ("nlist", "nprobe", "pq_m", "pq_bits", "hnsw_m", "ef_construction", "ef_search"):
+        value = os.getenv(f"INDEX_{key.upper()}")
+        if value:
+            config[key] = int(value)
+    return config
+
+
+def encode_vectors(vectors, vector_dtype):
+    """
+    Convert float32 embeddings to the storage precision.
+
+    Arrays already in the target precision are returned unchanged.
+    """
+    if vector_dtype not in VECTOR_DTYPES:
+        raise ValueError(f"Unknown vector dtype '{vector_dtype}', expected one of {', '.join(VECTOR_DTYPES)}")
+    if getattr(vectors, "dtype", None) == np.dtype(vector_dtype):
+        return vectors
+    vectors = np.asarray(vectors, dtype="float32")
+    if vector_dtype == "int8":
+        return np.round(np.clip(vectors, -1.0, 1.0) * INT8_SCALE).astype("int8")
+    return vectors.astype(vector_dtype)
+
+
+def decode_vectors(vectors):
+    """Convert stored embeddings of any supported precision back to float32."""
+    if vectors.dtype == np.int8:
+        return vectors.astype("float32") / INT8_SCALE
+    return np.asarray(vectors, dtype="float32")
+
+
+def choose_index_type(n_vectors):
+    """Pick an index strategy from the corpus size."""
+    if n_vectors <= NUMPY_MAX_VECTORS:
+        return "numpy"
+    if n_vectors <= FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors <= HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def resolve_index_type(index_type, n_vectors):
+    """Turn a configured index type (possibly 'auto') into a concrete one."""
+    if index_type in (None, "", "auto"):
+        return choose_index_type(n_vectors)
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)} or auto")
+    return index_type
+
+
+def _grown(buffer, rows, needed):
+    """
+    A buffer with room for `needed` rows whose first `rows` match `buffer`.
+
+    Full or read-only buffers are reallocated at double the size, so
+    repeated appends cost time proportional to their own size.
+    """
+    if needed <= len(buffer) and buffer.flags.writeable:
+        return buffer
+    grown = np.empty((max(needed, 2 * len(buffer)),) + buffer.shape[1:], dtype=buffer.dtype)
+    grown[:rows] = buffer[:rows]
+    return grown
+
+
+class NumpyIndex:
+    """
+    Exact L2 search with NumPy argpartition, for corpora too small to
+    benefit from FAISS. Mirrors the parts of the FAISS index API the
+    retriever uses and searches the embedding matrix in place.
+
+    Ids are row numbers of the matrix; removed rows are masked out. The
+    matrix may be stored as float16 or int8 and is decoded per search.
+    Added rows go to buffers grown geometrically, like the retriever's
+    embedding buffer.
+    """
+
+    def __init__(self, embeddings):
+        self._vectors = embeddings
+        self._rows = embeddings.shape[0]
+        self.d = embeddings.shape[1]
+        decoded = decode_vectors(embeddings)
+        self._norms = np.einsum("ij,ij->i", decoded, decoded)
+        self._removed = np.zeros(embeddings.shape[0], dtype=bool)
+
+    @property
+    def vectors(self):
+        return self._vectors[:self._rows]
+
+    @property
+    def norms(self):
+        return self._norms[:self._rows]
+
+    @property
+    def removed(self):
+        return self._removed[:self._rows]
+
+    @property
+    def ntotal(self):
+        return int(self._rows - self.removed.sum())
+
+    def add_with_ids(self, vectors, ids):
+        """Append vectors whose ids continue the row numbering."""
+        vectors = np.asarray(vectors, dtype="float32")
+        ids = np.asarray(ids, dtype="int64")
+        rows = self._rows
+        needed = rows + len(vectors)
+        if not np.array_equal(ids, np.arange(rows, needed)):
+            raise ValueError("NumpyIndex ids must continue the existing row numbering")
+        self._vectors = _grown(self._vectors, rows, needed)
+        self._vectors[rows:needed] = encode_vectors(vectors, self._vectors.dtype.name)
+        self._norms = _grown(self._norms, rows, needed)
+        self._norms[rows:needed] = np.einsum("ij,ij->i", vectors, vectors)
+        self._removed = _grown(self._removed, rows, needed)
+        self._removed[rows:needed] = False
+        self._rows = needed
+
+    def copy(self):
+        """Copy that can be updated independently; vectors and norms are shared until either grows."""
+        clone = NumpyIndex.__new__(NumpyIndex)
+        # Views of exactly the live rows are full, so the clone's first add reallocates
+        clone._vectors = self.vectors
+        clone._norms = self.norms
+        clone._removed = self.removed.copy()
+        clone._rows = self._rows
+        clone.d = self.d
+        return clone
+
+    def remove_ids(self, ids):
+        """Mask rows out of future searches."""
+        ids = np.asarray(ids, dtype="int64")
+        ids = ids[(ids >= 0) & (ids < self._rows)]
+        self._removed[ids] = True
+        return len(ids)
+
+    def search(self, queries, k, allowed=None):
+        """
+        Return squared L2 distances and row ids of the k nearest vectors.
+
+        Rows beyond the corpus size are padded with -1 ids, as in FAISS.
+        If given, `allowed` is a boolean mask over rows restricting the search.
+        """
+        queries = np.asarray(queries, dtype="float32")
+        n = queries.shape[0]
+        rows = self._rows
+        D = np.full((n, k), np.inf, dtype="float32")
+        I = np.full((n, k), -1, dtype="int64")
+        if rows == 0:
+            return D, I
+
+        dist = (np.einsum("ij,ij->i", queries, queries)[:, None]
+                - 2.0 * queries @ decode_vectors(self.vectors).T
+                + self.norms[None, :])
+        dist[:, self.removed] = np.inf
+        if allowed is not None:
+            mask = np.zeros(rows, dtype=bool)
+            mask[:min(rows, len(allowed))] = allowed[:rows]
+            dist[:, ~mask] = np.inf
+        top = min(k, rows)
+        if top < rows:
+            part = np.argpartition(dist, top - 1, axis=1)[:, :top]
+        else:
+            part = np.tile(np.arange(rows), (n, 1))
+        part_dist = np.take_along_axis(dist, part, axis=1)
+        order = np.argsort(part_dist, axis=1)
+        I[:, :top] = np.take_along_axis(part, order, axis=1)
+        D[:, :top] = np.take_along_axis(part_dist, order, axis=1)
+        I[np.isinf(D)] = -1
+        return D, I
+
+
+class AppendOnlyMatrix:
+    """
+    Rows of a read-only base matrix (e.g. a memory-mapped store file)
+    followed by rows appended in memory.
+
+    The base is never copied or written: appended rows go to a tail buffer
+    grown geometrically, and copy() shares both, so an update costs time
+    and memory proportional to the rows it adds. Indexing with a slice
+    inside one part returns a view of it; other slices and lists of rows
+    return a new array, as NumPy fancy indexing does.
+    """
+
+    def __init__(self, base, tail=None):
+        self.base = base
+        self._tail = np.empty((0,) + base.shape[1:], dtype=base.dtype) if tail is None else tail
+        self._tail_rows = len(self._tail)
+
+    @property
+    def tail(self):
+        return self._tail[:self._tail_rows]
+
+    @property
+    def shape(self):
+        return (len(self),) + self.base.shape[1:]
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    @property
+    def nbytes(self):
+        return self.base.nbytes + self.tail.nbytes
+
+    def __len__(self):
+        return len(self.base) + self._tail_rows
+
+    def __array__(self, dtype=None, copy=None):
+        matrix = np.concatenate([self.base, self.tail]) if self._tail_rows else np.asarray(self.base)
+        return matrix if dtype is None else matrix.astype(dtype, copy=False)
+
+    def __getitem__(self, rows):
+        n_base = len(self.base)
+        if isinstance(rows, slice):
+            start, stop, step = rows.indices(len(self))
+            if step == 1 and stop <= n_base:
+                return self.base[start:stop]
+            if step == 1 and start >= n_base:
+                return self.tail[start - n_base:stop - n_base]
+            rows = np.arange(start, stop, step)
+        rows = np.asarray(rows, dtype="int64")
+        if rows.ndim == 0:
+            return self.base[rows] if rows < n_base else self.tail[rows - n_base]
+        in_base = rows < n_base
+        if in_base.all():
+            return self.base[rows]
+        selected = np.empty((len(rows),) + self.base.shape[1:], dtype=self.base.dtype)
+        selected[in_base] = self.base[rows[in_base]]
+        selected[~in_base] = self.tail[rows[~in_base] - n_base]
+        return selected
+
+    def append(self, rows):
+        """
+        Append rows after the existing ones.
+
+        Returns:
+            np.ndarray: int64 row numbers of the appended rows
+        """
+        start, needed = len(self), self._tail_rows + len(rows)
+        self._tail = _grown(self._tail, self._tail_rows, needed)
+        self._tail[self._tail_rows:needed] = rows
+        self._tail_rows = needed
+        return np.arange(start, len(self), dtype="int64")
+
+    def copy(self):
+        """Copy that can be appended to independently; the base and the rows so far are shared."""
+        # A view of exactly the appended rows is full, so the copy's first append reallocates
+        return AppendOnlyMatrix(self.base, self.tail)
+
+
+class LayeredIndex:
+    """
+    A base index that is never modified, plus an exact NumpyIndex over
+    vectors added since and a mask of base ids removed since.
+
+    Copies share the base, so updating a copy costs time and memory in
+    proportion to the vectors it adds or removes rather than to the corpus,
+    and a memory-mapped base stays mapped. Ids from base_rows on belong to
+    the added vectors and continue the row numbering. Searches merge the
+    nearest neighbours of both layers by distance.
+    """
+
+    def __init__(self, base, base_rows):
+        """
+        Args:
+            base: Index from build_index or read_index holding ids below base_rows
+            base_rows (int): Rows of the matrix the base index was built over
+        """
+        self.base = base
+        self.base_rows = base_rows
+        self.d = base.d
+        self.added = NumpyIndex(np.empty((0, base.d), dtype="float32"))
+        self.removed = np.zeros(base_rows, dtype=bool)
+        self._removed_count = 0
+
+    @property
+    def ntotal(self):
+        return int(self.base.ntotal - self._removed_count + self.added.ntotal)
+
+    def add_with_ids(self, vectors, ids):
+        """Add vectors whose ids continue the row numbering after the base rows."""
+        self.added.add_with_ids(vectors, np.asarray(ids, dtype="int64") - self.base_rows)
+
+    def remove_ids(self, ids):
+        """Mask ids out of future searches; base ids are only recorded as removed."""
+        ids = np.unique(np.asarray(ids, dtype="int64"))
+        base_ids = ids[(ids >= 0) & (ids < self.base_rows)]
+        base_ids = base_ids[~self.removed[base_ids]]
+        if len(base_ids):
+            if not self.removed.flags.writeable:
+                # Still shared with a copy
+                self.removed = self.removed.copy()
+            self.removed[base_ids] = True
+            self._removed_count += len(base_ids)
+        return len(base_ids) + self.added.remove_ids(ids[ids >= self.base_rows] - self.base_rows)
+
+    def copy(self):
+        """Copy that can be updated independently; the base index is shared."""
+        clone = LayeredIndex.__new__(LayeredIndex)
+        clone.__dict__.update(self.__dict__)
+        clone.added = self.added.copy()
+        # Both sides copy the removal mask before they next change it
+        self.removed = self.removed.view()
+        self.removed.flags.writeable = False
+        clone.removed = self.removed
+        return clone
+
+    def search(self, queries, k, allowed=None):
+        """
+        Return distances and ids of the k nearest live vectors of both layers.
+
+        If given, `allowed` is a boolean mask over ids restricting the search.
+        """
+        base_allowed = allowed
+        if self._removed_count:
+            base_allowed = ~self.removed
+            if allowed is not None:
+                limit = min(self.base_rows, len(allowed))
+                base_allowed[limit:] = False
+                base_allowed[:limit] &= allowed[:limit]
+        D, I = search_index(self.base, queries, k, base_allowed)
+        if not self.added.ntotal:
+            return D, I
+
+        D_added, I_added = self.added.search(queries, k, None if allowed is None else allowed[self.base_rows:])
+        I_added[I_added >= 0] += self.base_rows
+        D = np.hstack([D, D_added])
+        I = np.hstack([I, I_added])
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+
+def _default_nlist(n_vectors):
+    # Keep at least ~39 training points per centroid, as FAISS recommends
+    return max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39 or 1))
+
+
+def _pq_subquantizers(dim, requested):
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _scalar_quantizer(vector_dtype):
+    """FAISS scalar quantizer matching a storage precision, or None for float32."""
+    if vector_dtype == "float16":
+        return faiss.ScalarQuantizer.QT_fp16
+    if vector_dtype == "int8":
+        return faiss.ScalarQuantizer.QT_8bit
+    return None
+
+
+def build_index(embeddings, index_type, config=None, ids=None):
+    """
+    Build a search index of the given type over an embedding matrix.
+
+    Every index is id-mapped so vectors can later be added and removed by id.
+    With a float16 or int8 vector_dtype, Flat, HNSW and IVF-Flat store
+    scalar-quantized codes instead of float32 vectors.
+
+    Args:
+        embeddings (np.ndarray): (n, dim) vectors in float32, float16 or int8
+        index_type (str): One of INDEX_TYPES
+        config (dict): Tuning parameters, see DEFAULT_INDEX_CONFIG
+        ids (np.ndarray): int64 id of each row; defaults to the row numbers
+
+    Returns:
+        NumpyIndex or faiss.Index: Index with all vectors added
+    """
+    config = {**DEFAULT_INDEX_CONFIG, **(config or {})}
+    if index_type == "numpy":
+        if ids is not None and not np.array_equal(ids, np.arange(len(embeddings))):
+            raise ValueError("NumpyIndex ids must be the row numbers")
+        return NumpyIndex(embeddings)
+
+    n, dim = embeddings.shape
+    ids = np.arange(n, dtype="int64") if ids is None else np.ascontiguousarray(ids, dtype="int64")
+    qtype = _scalar_quantizer(config["vector_dtype"])
+
+    if index_type == "flat":
+        base = faiss.IndexFlatL2(dim) if qtype is None else faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_L2)
+        index = faiss.IndexIDMap2(base)
+    elif index_type == "hnsw":
+        if qtype is None:
+            hnsw = faiss.IndexHNSWFlat(dim, config["hnsw_m"])
+        else:
+            hnsw = faiss.IndexHNSWSQ(dim, qtype, config["hnsw_m"])
+        hnsw.hnsw.efConstruction = config["ef_construction"]
+        index = faiss.IndexIDMap2(hnsw)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = config["nlist"] or _default_nlist(n)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_pq":
+            m = _pq_subquantizers(dim, config["pq_m"])
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, config["pq_bits"])
+        elif qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qtype)
+    else:
+        raise ValueError(f"Unknown index type '{index_type}'")
+
+    if not index.is_trained:
+        rows = np.arange(n)
+        if n > TRAIN_SAMPLE_SIZE:
+            rows = np.sort(np.random.default_rng(0).choice(n, TRAIN_SAMPLE_SIZE, replace=False))
+        index.train(np.ascontiguousarray(decode_vectors(embeddings[rows])))
+
+    # Decode in batches so only one compact copy of the corpus is ever held
+    for start in range(0, n, ADD_BATCH_SIZE):
+        batch = np.ascontiguousarray(decode_vectors(embeddings[start:start + ADD_BATCH_SIZE]))
+        index.add_with_ids(batch, ids[start:start + ADD_BATCH_SIZE])
+    apply_search_params(index, config)
+    return index
+
+
+def supports_ids(index):
+    """Whether an index (e.g. one read from disk) was built with explicit ids."""
+    return isinstance(index, (NumpyIndex, LayeredIndex, faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def add_vectors(index, vectors, ids):
+    """Add vectors under explicit ids to an index from build_index."""
+    index.add_with_ids(np.ascontiguousarray(vectors, dtype="float32"), np.asarray(ids, dtype="int64"))
+
+
+def copy_index(index):
+    """Independent in-memory copy of an index from build_index or read from disk."""
+    if isinstance(index, (NumpyIndex, LayeredIndex)):
+        return index.copy()
+    return faiss.clone_index(index)
+
+
+def remove_vectors(index, ids):
+    """
+    Remove vectors by id.
+
+    Returns:
+        bool: False if the index cannot delete (e.g. HNSW), in which case
+            the caller must filter the ids out of search results itself
+    """
+    try:
+        index.remove_ids(np.asarray(ids, dtype="int64"))
+        return True
+    except RuntimeError:
+        return False
+
+
+def index_memory_bytes(index):
+    """
+    Estimate the memory held by an index's vectors, codes and graph links.
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(index, NumpyIndex):
+        return int(index.vectors.nbytes + index.norms.nbytes + index.removed.nbytes)
+    if isinstance(index, LayeredIndex):
+        return index_memory_bytes(index.base) + index_memory_bytes(index.added) + int(index.removed.nbytes)
+
+    total = 0
+    base = index
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        # Id map plus, for IndexIDMap2, the reverse lookup table
+        total += 8 * index.ntotal * (3 if isinstance(index, faiss.IndexIDMap2) else 1)
+        base = faiss.downcast_index(index.index)
+
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        return int(total + ivf.ntotal * (ivf.code_size + 8) + ivf.nlist * ivf.d * 4)
+
+    if hasattr(base, "hnsw"):
+        # Neighbour lists are int32 ids; vectors live in the storage index
+        total += base.hnsw.neighbors.size() * 4
+        base = faiss.downcast_index(base.storage)
+    try:
+        total += base.ntotal * base.sa_code_size()
+    except RuntimeError:
+        total += base.ntotal * base.d * 4
+    return int(total)
+
+
+def apply_search_params(index, config=None):
+    """Set query-time knobs (nprobe, efSearch) on a built or loaded index."""
+    config = {**DEFAULT_INDEX_CONFIG, **(config or {})}
+    if isinstance(index, NumpyIndex):
+        return index
+    if isinstance(index, LayeredIndex):
+        apply_search_params(index.base, config)
+        return index
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(config["nprobe"], ivf.nlist)
+    hnsw = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if hasattr(hnsw, "hnsw"):
+        hnsw.hnsw.efSearch = config["ef_search"]
+    return index
+
+
+def search_index(index, queries, k, allowed=None):
+    """
+    Search an index, optionally restricted to the ids set in a bitmap.
+
+    The restriction is applied inside the FAISS search through an
+    IDSelectorBitmap, so filtered queries visit only allowed vectors
+    instead of over-fetching and discarding the rest.
+
+    Args:
+        index: Index from build_index or read_index
+        queries (np.ndarray): (n, dim) float32 query vectors
+        k (int): Number of neighbours per query
+        allowed (np.ndarray): Boolean mask indexed by id, or None for no filter
+
+    Returns:
+        tuple: (distances, ids) arrays shaped (n, k), ids padded with -1
+    """
+    if isinstance(index, LayeredIndex):
+        return index.search(queries, k, allowed)
+    if allowed is None:
+        return index.search(queries, k)
+    if isinstance(index, NumpyIndex):
+        return index.search(queries, k, allowed=allowed)
+
+    selector = faiss.IDSelectorBitmap(np.packbits(allowed, bitorder="little"))
+    ivf = faiss.try_extract_index_ivf(index)
+    inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif hasattr(inner, "hnsw"):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    return index.search(queries, k, params=params)
+
+
+def recall_report(embeddings, queries=None, k=10, index_types=INDEX_TYPES, config=None, n_queries=200):
+    """
+    Measure recall@k and search latency of each index type against exact search.
+
+    Args:
+        embeddings (np.ndarray): (n, dim) corpus vectors
+        queries (np.ndarray): Query vectors; defaults to a sample of the corpus
+        k (int): Number of neighbours compared
+        index_types (tuple): Index types to evaluate
+        config (dict): Tuning parameters shared by every index
+        n_queries (int): Sample size when queries are drawn from the corpus
+
+    Returns:
+        list: One dictionary per index type with build time, recall and latency
+    """
+    vectors = np.ascontiguousarray(embeddings, dtype="float32")
+    if queries is None:
+        rng = np.random.default_rng(0)
+        rows = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+        queries = vectors[rows]
+    queries = np.ascontiguousarray(queries, dtype="float32")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    report = []
+    for index_type in index_types:
+        started = time.perf_counter()
+        try:
+            index = build_index(vectors, index_type, config)
+        except Exception as e:
+            # e.g. too few vectors to train IVF/PQ quantizers
+            report.append({"index_type": index_type, "vectors": int(len(vectors)), "error": str(e)})
+            continue
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        hits = 0
+        for i in range(len(queries)):
+            started = time.perf_counter()
+            _, I = index.search(queries[i:i + 1], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += len(set(I[0][I[0] >= 0]) & set(truth[i][truth[i] >= 0]))
+
+        report.append({
+            "index_type": index_type,
+            "vectors": int(len(vectors)),
+            "k": k,
+            "build_seconds": round(build_seconds, 4),
+            "recall_at_k": round(hits / float(truth.size), 4),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 4),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 4),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 4)
+        })
+    return report
+
+
+if __name__ == "__main__":
+    # Compare index strategies on the cached corpus embeddings
+    import sys
+    from embedding_store import EMBEDDINGS_FILE, current_file
+
+    cache_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv("EMBEDDINGS_CACHE_DIR", "embeddings_cache")
+    embeddings = np.load(current_file(cache_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    print(json.dumps(recall_report(embeddings, config=index_config_from_env()), indent=2))
@@ -0,0 +1,332 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from chunker import chunk_text, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from embedding_store import EmbeddingStore, store_key
+from index_backends import encode_vectors
+from retriever import content_hash
+from sharded_retriever import shard_for
+
+PROGRESS_FILE = "ingest_progress.json"
+# Vectors encoded so far, appended batch by batch in arrival order
+ENCODED_FILE = "ingest_encoded.bin"
+
+# Passages encoded and flushed to disk per step; bounds the vectors held in RAM
+INGEST_BATCH_SIZE = 4096
+# Passages per model call inside each worker process
+ENCODE_BATCH_SIZE = 64
+
+
+def _job_id(key, generation):
+    """
+    Identify an ingestion job so a restart only resumes the same work.
+
+    The store generation the job started from is part of the id, so staged
+    rows are not resumed into a store that has since been rewritten.
+    """
+    payload = json.dumps({"key": key, "generation": generation}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Progress:
+    """Documents already encoded into the staging file, persisted next to it."""
+
+    def __init__(self, cache_dir, job_id):
+        self.path = os.path.join(cache_dir, PROGRESS_FILE)
+        self.job_id = job_id
+        self.state = {"job_id": job_id, "dimension": None, "rows": 0, "documents": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                if saved.get("job_id") == job_id and "documents" in saved:
+                    self.state = saved
+            except Exception as e:
+                print(f"Ignoring unreadable ingestion progress {self.path}: {e}")
+
+    @property
+    def resuming(self):
+        return self.state["rows"] > 0
+
+    def update(self, **changes):
+        self.state.update(changes)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class _Encoder:
+    """SentenceTransformer encoding, spread over a process pool when processes > 1."""
+
+    def __init__(self, model_name, processes):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.pool = None
+        if processes > 1:
+            self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * processes)
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts):
+        if self.pool is not None:
+            vectors = self.model.encode_multi_process(texts, self.pool, batch_size=ENCODE_BATCH_SIZE)
+        else:
+            vectors = self.model.encode(texts, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False)
+        return np.asarray(vectors, dtype="float32").reshape(len(texts), self.dimension)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+class _IngestJob:
+    """
+    Ingestion into one embedding store.
+
+    Documents are hashed and chunked as they arrive. Passages of documents
+    not in the store are encoded once a batch fills and appended to an
+    on-disk staging file, so only the passages of a partly filled batch are
+    held in memory. The content hashes each batch completed are recorded,
+    so a restarted job skips documents it already encoded.
+    """
+
+    def __init__(self, cache_dir, key, chunk_size, chunk_overlap, vector_dtype, batch_size):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.vector_dtype = vector_dtype
+        self.batch_size = batch_size
+        self.store = EmbeddingStore(cache_dir, key)
+        self.manifest = self.store.load_manifest()
+
+        # Rows already embedded under the same settings, by content hash
+        self.stored = {}
+        self.old_embeddings = self.old_spans = None
+        if self.manifest is not None:
+            self.old_embeddings = self.store.read_embeddings()
+            self.old_spans = self.store.read_spans()
+            for entry in self.manifest["documents"]:
+                self.stored.setdefault(entry["hash"], entry)
+
+        self.progress = _Progress(cache_dir, _job_id(key, self.store.generation))
+        self.encoded_path = os.path.join(cache_dir, ENCODED_FILE)
+        if self.progress.resuming:
+            print(f"Resuming ingestion with {len(self.progress.state['documents'])} documents already encoded")
+        else:
+            self.progress.update(dimension=None, rows=0, documents={})
+
+        self.documents = []     # (source, content hash) in arrival order
+        self.spans = {}         # content hash -> (n_chunks, 2) int64 character offsets
+        self.pending = []       # (content hash, passages) waiting for a full batch
+        self.pending_chunks = 0
+        self.encoded = 0
+
+    def add(self, doc, encoder):
+        """Queue a document; encodes a batch once enough passages are waiting."""
+        key = content_hash(doc["text"])
+        self.documents.append((doc["source"], key))
+        if key in self.spans:
+            return
+        if key in self.stored:
+            entry = self.stored[key]
+            rows = slice(entry["offset"], entry["offset"] + entry["count"])
+            self.spans[key] = np.asarray(self.old_spans[rows], dtype="int64").reshape(-1, 2)
+            return
+
+        text = doc["text"]
+        doc_spans = np.asarray(chunk_text(text, self.chunk_size, self.chunk_overlap), dtype="int64").reshape(-1, 2)
+        self.spans[key] = doc_spans
+        if key in self.progress.state["documents"]:
+            return
+        self.pending.append((key, [text[s:e] for s, e in doc_spans.tolist()]))
+        self.pending_chunks += len(doc_spans)
+        if self.pending_chunks >= self.batch_size:
+            self.flush(encoder)
+
+    def flush(self, encoder):
+        """Encode the waiting passages and append them to the staging file."""
+        if not self.pending:
+            return
+        texts = [passage for _, passages in self.pending for passage in passages]
+        rows = self.progress.state["rows"]
+        dimension = self.progress.state["dimension"]
+        if texts:
+            vectors = np.ascontiguousarray(encode_vectors(encoder().encode(texts), self.vector_dtype))
+            dimension = int(vectors.shape[1])
+            with open(self.encoded_path, "r+b" if os.path.exists(self.encoded_path) else "w+b") as f:
+                # Drop rows of a batch that was written but never recorded
+                f.truncate(rows * vectors[0].nbytes)
+                f.seek(rows * vectors[0].nbytes)
+                f.write(vectors.tobytes())
+        documents = self.progress.state["documents"]
+        for key, passages in self.pending:
+            documents[key] = [rows, len(passages)]
+            rows += len(passages)
+        self.progress.update(dimension=dimension, rows=rows, documents=documents)
+        self.encoded += len(texts)
+        print(f"Encoded {len(texts)} chunks from {len(self.pending)} documents into {self.cache_dir}")
+        self.pending = []
+        self.pending_chunks = 0
+
+    def finish(self, encoder):
+        """
+        Sort the layout by source and publish the assembled matrix as a new store generation.
+
+        Returns:
+            dict: Counts of documents, chunks, reused and encoded chunks
+        """
+        self.flush(encoder)
+        self.documents.sort()
+        layout = []
+        span_parts = []
+        offset = 0
+        for _, key in self.documents:
+            doc_spans = self.spans[key]
+            layout.append({"hash": key, "offset": offset, "count": len(doc_spans)})
+            span_parts.append(doc_spans)
+            offset += len(doc_spans)
+        summary = {"documents": len(self.documents), "chunks": int(offset), "reused": int(offset - self.encoded),
+                   "encoded": self.encoded}
+
+        if self.manifest is not None and [entry["hash"] for entry in self.manifest["documents"]] \
+                == [key for _, key in self.documents]:
+            print(f"Embedding store in {self.cache_dir} is already up to date")
+        else:
+            dimension = self.progress.state["dimension"] or (self.manifest or {}).get("dimension") \
+                or encoder().dimension
+            staged, _ = self.store.open_staging(offset, dimension, self.vector_dtype)
+            encoded_rows = None
+            if self.progress.state["rows"]:
+                encoded_rows = np.memmap(self.encoded_path, dtype=self.vector_dtype, mode="r",
+                                         shape=(self.progress.state["rows"], dimension))
+            for (_, key), entry in zip(self.documents, layout):
+                target = slice(entry["offset"], entry["offset"] + entry["count"])
+                if key in self.stored:
+                    old = self.stored[key]
+                    staged[target] = self.old_embeddings[old["offset"]:old["offset"] + old["count"]]
+                else:
+                    row, count = self.progress.state["documents"][key]
+                    staged[target] = encoded_rows[row:row + count]
+            staged.flush()
+            del staged, encoded_rows
+            self.old_embeddings = self.old_spans = None
+            spans = np.vstack(span_parts) if span_parts else np.zeros((0, 2), dtype="int64")
+            self.store.commit_staging(layout, spans)
+
+        self.progress.clear()
+        if os.path.exists(self.encoded_path):
+            os.remove(self.encoded_path)
+        return summary
+
+
+def ingest_corpus(documents, cache_dir="embeddings_cache", model_name="all-MiniLM-L6-v2",
+                  chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, vector_dtype="float32",
+                  processes=None, batch_size=INGEST_BATCH_SIZE, shard_by=None):
+    """
+    Embed a corpus into the on-disk embedding store with bounded memory.
+
+    Documents can be streamed, e.g. from data_loader.iter_regulatory_docs:
+    each is chunked as it arrives, vectors for documents already in the
+    store are reused, and the rest are encoded batch by batch on a process
+    pool while the loader keeps reading. Encoded batches go to an on-disk
+    staging file and the documents they completed are recorded, so a job
+    that dies resumes without encoding them again. Once the stream ends,
+    the layout is sorted by source and the matrix assembled from staged and
+    stored rows is swapped into the store; the retriever builds its index
+    from it on the next start.
+
+    With shard_by set, documents are grouped as ShardedRetriever groups
+    them and each shard is ingested into its own store under cache_dir.
+
+    Args:
+        documents (iterable): Dictionaries with 'source' and 'text' keys, in any order
+        cache_dir (str): Embedding store directory shared with the retriever
+        model_name (str): Sentence transformer model name
+        chunk_size (int): Maximum passage length in characters
+        chunk_overlap (int): Characters shared between consecutive passages
+        vector_dtype (str): Storage precision: float32, float16 or int8
+        processes (int): Encoder processes; defaults to one per CPU core
+        batch_size (int): Passages encoded and flushed per step
+        shard_by (str): Metadata field to shard by, e.g. 'regulator'; None writes one store
+
+    Returns:
+        dict: Counts of documents, chunks, reused and encoded chunks, and timing,
+            plus the counts of each shard when sharded
+    """
+    started = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    key = store_key(model_name, chunk_size, chunk_overlap, vector_dtype)
+    jobs = {}
+    encoders = []
+
+    def job_for(doc):
+        name = shard_for(doc, shard_by) if shard_by else None
+        if name not in jobs:
+            job_dir = os.path.join(cache_dir, name) if name else cache_dir
+            jobs[name] = _IngestJob(job_dir, key, chunk_size, chunk_overlap, vector_dtype, batch_size)
+        return jobs[name]
+
+    def encoder():
+        # The model is only loaded once a document needs encoding
+        if not encoders:
+            encoders.append(_Encoder(model_name, processes))
+        return encoders[0]
+
+    try:
+        for doc in documents:
+            job_for(doc).add(doc, encoder)
+        if not jobs:
+            raise ValueError("No documents to ingest")
+        summaries = {name: job.finish(encoder) for name, job in sorted(jobs.items())}
+    finally:
+        for loaded in encoders:
+            loaded.close()
+
+    summary = {field: sum(part[field] for part in summaries.values())
+               for field in ("documents", "chunks", "reused", "encoded")}
+    if shard_by:
+        summary["shards"] = summaries
+    summary["processes"] = processes if encoders else 0
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    print(f"Ingested {summary['chunks']} chunks ({summary['encoded']} encoded) in {summary['seconds']}s")
+    return summary
+
+
+if __name__ == "__main__":
+    # Embed the configured document folder into the embedding store
+    from dotenv import load_dotenv
+    from data_loader import iter_regulatory_docs
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Embed the regulatory corpus into the on-disk embedding store")
+    parser.add_argument("--docs", default=os.getenv("DOCS_FOLDER", "reg_docs"))
+    parser.add_argument("--processes", type=int, default=int(os.getenv("INGEST_PROCESSES", "0")) or None)
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print(json.dumps(ingest_corpus(
+        iter_regulatory_docs(args.docs),
+        cache_dir=os.getenv("EMBEDDINGS_CACHE_DIR", "embeddings_cache"),
+        model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        chunk_size=int(os.getenv("CHUNK_SIZE", str(DEFAULT_CHUNK_SIZE))),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", str(DEFAULT_CHUNK_OVERLAP))),
+        vector_dtype=os.getenv("INDEX_VECTOR_DTYPE", "float32").lower(),
+        processes=args.processes,
+        batch_size=args.batch_size,
+        shard_by=os.getenv("SHARD_BY") or None
+    ), indent=2))
@@ -3,7 +3,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 import os
+import itertools
 import logging
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -11,10 +13,17 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import our modules
-from data_loader import load_regulatory_docs
-from retriever import RegulatoryRetriever
+from data_loader import iter_regulatory_docs
+from corpus_manifest import CorpusManifest
+from doc_watcher import DocumentWatcher
+from retriever import RegulatoryRetriever, SEARCH_MODES
+from index_backends import index_config_from_env
+from result_cutoff import cutoff_config_from_env
+from reranker import CrossEncoderReranker
+from sharded_retriever import ShardedRetriever, shard_for
+from retriever_snapshots import RetrieverSnapshots
 from llm_corep import generate_corep_output, test_llm_connection
-from template_mapper import map_to_template, format_template_rows, generate_template_export
+from template_mapper import map_to_template, format_template_rows, generate_template_export, attach_governing_sections
 from validator import generate_validation_report
 
 # Configure logging
@@ -39,13 +48,21 @@ app.add_middleware(
 )
 
 # Global variables for the system components
-retriever = None
+snapshots = RetrieverSnapshots()
+reload_lock = threading.Lock()
+# Corpus folder the live retriever was built from
+loaded_folder = None
+# Optional DOCS_FOLDER watcher (WATCH_DOCS=true)
+doc_watcher = None
 system_status = {
     "initialized": False,
     "documents_loaded": 0,
     "groq_connected": False,
     "last_init_time": None,
-    "api_status": "unknown"  # Adding the missing field
+    "api_status": "unknown",  # Adding the missing field
+    "encoder_warm": False,
+    "reloading": False,
+    "snapshot_generation": 0
 }
 
 # Pydantic models for API
@@ -53,6 +70,25 @@ class CorepRequest(BaseModel):
     user_query: str
     k_documents: int = 3
     export_format: Optional[str] = "json"
+    search_mode: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    cutoff: Optional[Dict[str, Any]] = None
+    mmr_lambda: Optional[float] = None
+    rerank: Optional[bool] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = 5
+    mode: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    cutoff: Optional[Dict[str, Any]] = None
+    mmr_lambda: Optional[float] = None
+    rerank: Optional[bool] = None
+
+class DocumentUpload(BaseModel):
+    source: str
+    text: str
+    metadata: Optional[Dict[str, Any]] = None
 
 class CorepResponse(BaseModel):
     status: str
@@ -62,6 +98,8 @@ class CorepResponse(BaseModel):
     corep_template: List[Dict[str, Any]]
     validation_report: Dict[str, Any]
     export_data: Optional[str] = None
+    retrieval_diagnostics: Optional[Dict[str, Any]] = None
+    governing_text: Optional[Dict[str, List[Dict[str, Any]]]] = None
 
 class SystemStatus(BaseModel):
     initialized: bool
@@ -69,36 +107,187 @@ class SystemStatus(BaseModel):
     groq_connected: bool
     last_init_time: Optional[str]
     api_status: str
+    encoder_warm: bool = False
+    reloading: bool = False
+    snapshot_generation: int = 0
 
 class HealthResponse(BaseModel):
     status: str
     system: SystemStatus
     message: str
 
-def initialize_system():
-    """Initialize the system components."""
-    global retriever, system_status
+def build_retriever(docs):
+    """
+    Build a fully indexed retriever from the environment configuration.
+    
+    With SHARD_BY set (e.g. 'regulator'), each corpus gets its own shard
+    and embedding store under EMBEDDINGS_CACHE_DIR.
+    """
+    cache_dir = os.getenv("EMBEDDINGS_CACHE_DIR", "embeddings_cache")
+    search_mode = os.getenv("SEARCH_MODE", "hybrid")
+    rerank_model = os.getenv("RERANK_MODEL")
+    reranker = CrossEncoderReranker(
+        rerank_model, cache_size=int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+    ) if rerank_model else None
+    ranking = {
+        "cutoff_config": cutoff_config_from_env(),
+        "mmr_lambda": float(os.getenv("MMR_LAMBDA")) if os.getenv("MMR_LAMBDA") else None,
+        "reranker": reranker,
+        "rerank_top_n": int(os.getenv("RERANK_TOP_N", "20")),
+        "rerank_budget_ms": float(os.getenv("RERANK_BUDGET_MS", "150"))
+    }
+    
+    def make_retriever(documents, shard_cache_dir, model=None, **options):
+        return RegulatoryRetriever(
+            documents,
+            model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+            cache_dir=shard_cache_dir,
+            chunk_size=int(os.getenv("CHUNK_SIZE", "800")),
+            chunk_overlap=int(os.getenv("CHUNK_OVERLAP", "150")),
+            index_config=index_config_from_env(),
+            query_cache_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            search_mode=search_mode,
+            query_encoder=os.getenv("QUERY_ENCODER", "torch"),
+            onnx_model_dir=os.getenv("ONNX_MODEL_DIR") or None,
+            model=model,
+            **options
+        )
     
+    shard_by = os.getenv("SHARD_BY")
+    if not shard_by:
+        return make_retriever(docs, cache_dir, **ranking)
+    
+    # Shards only retrieve candidates; ranking stages run once over the merged results
+    return ShardedRetriever(
+        docs,
+        factory=lambda name, documents, model: make_retriever(documents, os.path.join(cache_dir, name), model),
+        shard_by=shard_by,
+        search_mode=search_mode,
+        **ranking
+    )
+
+def track_documents(documents, loaded):
+    """Pass streamed documents through, keeping the file stats the corpus manifest records."""
+    for doc in documents:
+        loaded.append({key: doc[key] for key in ("source", "path", "size", "mtime_ns")})
+        yield doc
+
+def save_manifest(manifest, update):
+    """Apply an update to the corpus manifest; a read-only corpus folder only costs change detection."""
+    try:
+        update(manifest)
+    except OSError as e:
+        logger.warning(f"Could not save corpus manifest {manifest.path}: {e}")
+
+def publish_snapshot(retriever):
+    """
+    Save an updated copy of the live retriever and swap it in.
+    
+    Callers must hold reload_lock, so no reload can swap in a copy taken
+    before this update.
+    """
+    retriever.save()
+    drain_timeout = float(os.getenv("SNAPSHOT_DRAIN_TIMEOUT", "30"))
+    _, drained = snapshots.swap(retriever, drain_timeout=drain_timeout)
+    system_status["snapshot_generation"] = snapshots.generation
+    system_status["documents_loaded"] = len(retriever.documents)
+    if not drained:
+        logger.warning(f"Previous retriever snapshot still in use after {drain_timeout}s")
+
+def refresh_corpus(manifest, sources=None):
+    """
+    Index only the documents added, changed or removed since the manifest was saved.
+    
+    An unchanged corpus is detected from file sizes and mtimes alone, without
+    reading any file or touching the live retriever. Changes are applied to
+    a copy of the live retriever that is swapped in once it is complete and
+    saved, so a failure partway through leaves the previous snapshot serving.
+    Callers must hold reload_lock.
+    
+    Args:
+        manifest (CorpusManifest): Manifest of the live corpus
+        sources (list): Only check these source names; None checks the whole folder
+    """
+    retriever = snapshots.current
+    diff = manifest.diff(max_workers=int(os.getenv("LOADER_WORKERS", "0")) or None, sources=sources)
+    if not diff:
+        logger.info(f"Corpus unchanged ({len(diff.unchanged)} documents)")
+    else:
+        retriever = retriever.copy()
+        if diff.removed:
+            retriever.remove_documents(diff.removed)
+        if diff.documents:
+            retriever.add_documents(diff.documents)
+        publish_snapshot(retriever)
+        logger.info(f"Corpus updated: {len(diff.added)} added, {len(diff.changed)} changed, "
+                    f"{len(diff.removed)} removed")
+    save_manifest(manifest, lambda m: m.apply(diff, retriever.chunk_ids))
+    system_status["documents_loaded"] = len(retriever.documents)
+
+def initialize_system(full=False):
+    """
+    Initialize the system components.
+    
+    A new retriever is built alongside the live one and swapped in only
+    once it is complete, so requests keep being served during a reload.
+    Once a retriever is live, a reload only indexes the documents that
+    changed on disk according to the corpus manifest, unless full is set.
+    
+    Args:
+        full (bool): Rebuild the retriever from the whole corpus
+    """
+    global loaded_folder
+    if not reload_lock.acquire(blocking=False):
+        logger.info("System initialization already in progress")
+        return
+    
+    system_status["reloading"] = True
     try:
         logger.info("Initializing PRA COREP Reporting Assistant...")
         
-        # Load regulatory documents
-        logger.info("Loading regulatory documents...")
         docs_folder = os.getenv("DOCS_FOLDER", "reg_docs")
-        docs = load_regulatory_docs(docs_folder)
-        
-        if not docs:
-            logger.warning("No regulatory documents found. Please add documents to reg_docs folder.")
-            system_status["documents_loaded"] = 0
+        manifest = CorpusManifest(docs_folder, os.getenv("CORPUS_MANIFEST") or None)
+        if not full and snapshots.current is not None and loaded_folder == docs_folder and len(manifest):
+            logger.info("Checking regulatory documents for changes...")
+            refresh_corpus(manifest)
         else:
-            logger.info(f"Loaded {len(docs)} regulatory documents")
-            system_status["documents_loaded"] = len(docs)
+            # Stream regulatory documents into the retriever, which encodes them while the rest are read
+            logger.info("Loading regulatory documents...")
+            stream = iter_regulatory_docs(docs_folder, max_workers=int(os.getenv("LOADER_WORKERS", "0")) or None)
+            first = next(stream, None)
             
-            # Initialize retriever
-            logger.info("Initializing vector retriever...")
-            embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-            cache_file = os.getenv("EMBEDDINGS_CACHE_FILE", "embeddings_cache.pkl")
-            retriever = RegulatoryRetriever(docs, model_name=embedding_model, cache_file=cache_file)
+            if first is None:
+                logger.warning("No regulatory documents found. Please add documents to reg_docs folder.")
+                if snapshots.current is None:
+                    system_status["documents_loaded"] = 0
+            else:
+                # Build the new retriever next to the live one
+                logger.info("Initializing vector retriever...")
+                docs = []
+                new_retriever = build_retriever(track_documents(itertools.chain([first], stream), docs))
+                logger.info(f"Loaded {len(docs)} regulatory documents")
+                # The manifest records content hashes without holding on to the texts
+                document_info = new_retriever.document_info
+                for doc in docs:
+                    doc["hash"] = document_info[doc["source"]]["hash"]
+                if snapshots.current is None:
+                    # Nothing to serve yet: go live now and warm up in the background
+                    new_retriever.start_warmup()
+                else:
+                    # Warm up before going live so the swap has no latency cliff
+                    new_retriever.warm_up()
+                
+                drain_timeout = float(os.getenv("SNAPSHOT_DRAIN_TIMEOUT", "30"))
+                old_retriever, drained = snapshots.swap(new_retriever, drain_timeout=drain_timeout)
+                save_manifest(manifest, lambda m: m.rebuild(docs, new_retriever.chunk_ids))
+                loaded_folder = docs_folder
+                system_status["documents_loaded"] = len(docs)
+                system_status["snapshot_generation"] = snapshots.generation
+                if old_retriever is not None:
+                    if drained:
+                        logger.info("Previous retriever snapshot drained")
+                    else:
+                        logger.warning(f"Previous retriever snapshot still in use after {drain_timeout}s")
         
         # Test Hugging Face model connection
         logger.info("Testing Hugging Face model connection...")
@@ -118,17 +307,56 @@ def initialize_system():
         
     except Exception as e:
         logger.error(f"System initialization failed: {str(e)}")
-        system_status["initialized"] = False
-        system_status["api_status"] = "unhealthy"
+        if snapshots.current is None:
+            system_status["initialized"] = False
+            system_status["api_status"] = "unhealthy"
+        else:
+            logger.warning("Continuing to serve the previous retriever snapshot")
         raise
+    finally:
+        system_status["reloading"] = False
+        reload_lock.release()
+
+def apply_document_changes(sources):
+    """Watcher callback: index files changed in DOCS_FOLDER into the live retriever."""
+    if snapshots.current is None:
+        # Nothing is served yet, e.g. the folder was empty at startup
+        initialize_system()
+        return
+    with reload_lock:
+        try:
+            refresh_corpus(CorpusManifest(os.getenv("DOCS_FOLDER", "reg_docs"), os.getenv("CORPUS_MANIFEST") or None),
+                           sources)
+        except Exception:
+            logger.warning("Continuing to serve the previous retriever snapshot")
+            raise
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize system on startup."""
+    global doc_watcher
     try:
         initialize_system()
     except Exception as e:
         logger.error(f"Startup failed: {str(e)}")
+    
+    if os.getenv("WATCH_DOCS", "false").lower() == "true":
+        try:
+            doc_watcher = DocumentWatcher(
+                os.getenv("DOCS_FOLDER", "reg_docs"),
+                apply_document_changes,
+                backend=os.getenv("WATCH_BACKEND", "auto"),
+                debounce=float(os.getenv("WATCH_DEBOUNCE_SECONDS", "1.0")),
+                poll_interval=float(os.getenv("WATCH_POLL_INTERVAL", "2.0"))
+            ).start()
+        except Exception as e:
+            logger.error(f"Document watcher failed to start: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the document watcher."""
+    if doc_watcher is not None:
+        doc_watcher.stop()
 
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -148,20 +376,57 @@ async def health_check():
         system_status["api_status"] = "unknown"
     
     api_status = "healthy" if system_status["initialized"] and system_status["groq_connected"] else "unhealthy"
+    retriever = snapshots.current
+    system_status["encoder_warm"] = bool(retriever and retriever.is_warm)
+    if api_status == "healthy" and retriever and not retriever.is_warm:
+        # Serving, but the first search would still pay the encoder load
+        api_status = "warming"
     system_status["api_status"] = api_status  # Update status for the response
     
+    if api_status == "warming":
+        message = "System is initialized, query encoder is warming up"
+    else:
+        message = f"System is {'initialized and ready' if system_status['initialized'] else 'not initialized'}"
+    
     return HealthResponse(
         status=api_status,
         system=SystemStatus(**system_status),
-        message=f"System is {'initialized and ready' if system_status['initialized'] else 'not initialized'}"
+        message=message
     )
 
 @app.post("/initialize")
-async def initialize_endpoint(background_tasks: BackgroundTasks):
-    """Manually reinitialize the system."""
-    background_tasks.add_task(initialize_system)
+async def initialize_endpoint(background_tasks: BackgroundTasks, full: bool = False):
+    """Manually reinitialize the system; only changed documents are re-indexed unless full is set."""
+    background_tasks.add_task(initialize_system, full)
     return {"message": "System reinitialization started"}
 
+@app.post("/shards/{name}/rebuild")
+async def rebuild_shard(name: str, background_tasks: BackgroundTasks):
+    """Rebuild one corpus shard from the documents folder while the others keep serving."""
+    if not isinstance(snapshots.current, ShardedRetriever):
+        raise HTTPException(status_code=400, detail="Sharding is not enabled; set SHARD_BY")
+    
+    def rebuild():
+        # Rebuilt on a copy under the reload lock, so a concurrent reload can neither
+        # swap in a copy of the old shard nor be overwritten by this one
+        with reload_lock:
+            if not isinstance(snapshots.current, ShardedRetriever):
+                logger.warning(f"Sharding was disabled before shard '{name}' could be rebuilt")
+                return
+            retriever = snapshots.current.copy()
+            # Only this shard's texts are kept while the folder is streamed
+            shard_docs = [doc for doc in iter_regulatory_docs(os.getenv("DOCS_FOLDER", "reg_docs"),
+                                                              max_workers=int(os.getenv("LOADER_WORKERS", "0")) or None)
+                          if shard_for(doc, retriever.shard_by) == name]
+            if shard_docs:
+                retriever.rebuild_shard(name, shard_docs, drain_timeout=float(os.getenv("SNAPSHOT_DRAIN_TIMEOUT", "30")))
+            else:
+                retriever.drop_shard(name)
+            publish_snapshot(retriever)
+    
+    background_tasks.add_task(rebuild)
+    return {"message": f"Rebuild of shard '{name}' started"}
+
 @app.post("/generate_corep", response_model=CorepResponse)
 async def generate_corep(request: CorepRequest):
     """
@@ -180,16 +445,28 @@ async def generate_corep(request: CorepRequest):
     if not system_status["groq_connected"]:
         raise HTTPException(status_code=503, detail="Hugging Face model not connected. Check model installation.")
     
-    if not retriever:
-        raise HTTPException(status_code=503, detail="Retriever not initialized. Check regulatory documents.")
-    
     try:
         logger.info(f"Processing COREP request: {request.user_query[:100]}...")
         
+        if request.search_mode and request.search_mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode '{request.search_mode}'")
+        
         # Step 1: Retrieve relevant documents
         logger.info("Retrieving relevant regulatory documents...")
-        retrieved_docs = retriever.search(request.user_query, k=request.k_documents)
+        with snapshots.acquire() as retriever:
+            if not retriever:
+                raise HTTPException(status_code=503, detail="Retriever not initialized. Check regulatory documents.")
+            try:
+                retrieved_docs, retrieval_diagnostics = retriever.search_with_diagnostics(
+                    request.user_query, k=request.k_documents, mode=request.search_mode,
+                    filters=request.filters, cutoff=request.cutoff, mmr_lambda=request.mmr_lambda,
+                    rerank=request.rerank
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
         
+        logger.info(f"Retrieval kept {retrieval_diagnostics['returned']} of "
+                    f"{retrieval_diagnostics['candidates']} candidates")
         if not retrieved_docs:
             logger.warning("No relevant documents retrieved")
             raise HTTPException(
@@ -213,6 +490,12 @@ async def generate_corep(request: CorepRequest):
         template_rows = map_to_template(structured_output)
         formatted_template = format_template_rows(template_rows, structured_output.get("currency", "GBP"))
         
+        # Governing text of each reported row comes from the section index, not a search
+        with snapshots.acquire() as retriever:
+            governing_text = {row_number: retriever.row_sections(row_number)
+                              for row_number, _, _ in template_rows} if retriever else {}
+        attach_governing_sections(structured_output, governing_text)
+        
         # Step 4: Validate output
         logger.info("Validating COREP output...")
         validation_report = generate_validation_report(structured_output)
@@ -232,13 +515,18 @@ async def generate_corep(request: CorepRequest):
             timestamp=datetime.now().isoformat(),
             retrieved_sources=[{
                 "source": doc["source"],
+                "start": doc.get("start"),
+                "end": doc.get("end"),
                 "text": doc["text"],
-                "score": doc.get("score", 0)
+                "score": doc.get("score", 0),
+                "score_type": doc.get("score_type")
             } for doc in retrieved_docs],
             structured_output=structured_output,
             corep_template=formatted_template,
             validation_report=validation_report,
-            export_data=export_data
+            export_data=export_data,
+            retrieval_diagnostics=retrieval_diagnostics,
+            governing_text=governing_text
         )
         
         logger.info("COREP generation completed successfully")
@@ -267,51 +555,179 @@ async def get_templates():
 @app.get("/documents")
 async def get_documents():
     """Get list of loaded regulatory documents."""
-    if not retriever:
-        raise HTTPException(status_code=503, detail="Retriever not initialized")
-    
-    documents = []
-    for i, source in enumerate(retriever.sources):
-        documents.append({
-            "id": i,
-            "source": source,
-            "length": len(retriever.texts[i])
-        })
-    
-    return {"documents": documents}
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        return {"documents": retriever.list_documents()}
 
-@app.post("/search")
-async def search_documents(query: str, k: int = 5):
-    """Search regulatory documents."""
-    if not retriever:
-        raise HTTPException(status_code=503, detail="Retriever not initialized")
-    
+@app.get("/sections/rows/{code}")
+async def get_row_sections(code: str):
+    """Get the regulatory text that defines or governs a COREP row, e.g. 350."""
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        try:
+            sections = retriever.row_sections(code)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not sections:
+            raise HTTPException(status_code=404, detail=f"No sections found for row '{code}'")
+        return {"row": code.zfill(3), "sections": sections}
+
+@app.get("/sections/articles/{number}")
+async def get_article_sections(number: int):
+    """Get the full text of a regulatory article by number, e.g. 36."""
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        sections = retriever.article_sections(number)
+        if not sections:
+            raise HTTPException(status_code=404, detail=f"Article {number} not found")
+        return {"article": number, "sections": sections}
+
+@app.get("/documents/{source:path}")
+async def get_document(source: str, start: Optional[int] = None, end: Optional[int] = None):
+    """Get one regulatory document, or the UTF-8 byte range [start, end) of it."""
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        document = retriever.get_document_by_source(source, start=start, end=end)
+        if document is None:
+            raise HTTPException(status_code=404, detail=f"Document '{source}' not found")
+        return document
+
+@app.post("/documents")
+def add_documents(documents: List[DocumentUpload]):
+    """Index new or updated regulatory documents without a full rebuild."""
+    # A plain def handler runs on the thread pool, so encoding does not block the event loop.
+    # Updates go to a copy that is saved and swapped in while the reload lock is held.
+    if not reload_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Corpus reload in progress, retry shortly")
     try:
-        results = retriever.search(query, k=k)
-        return {
-            "query": query,
-            "results": results,
-            "total_found": len(results)
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+        if snapshots.current is None:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        retriever = snapshots.current.copy()
+        try:
+            added = retriever.add_documents([doc.dict() for doc in documents])
+            if added:
+                publish_snapshot(retriever)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Indexing failed: {str(e)}")
+        return {"chunks_added": added, "documents_loaded": len(snapshots.current.documents)}
+    finally:
+        reload_lock.release()
+
+@app.delete("/documents/{source:path}")
+def remove_document(source: str):
+    """Remove a regulatory document from the index."""
+    if not reload_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="Corpus reload in progress, retry shortly")
+    try:
+        if snapshots.current is None:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        if source not in snapshots.current.document_info:
+            raise HTTPException(status_code=404, detail=f"Document '{source}' not found")
+        
+        retriever = snapshots.current.copy()
+        try:
+            removed = retriever.remove_documents([source])
+            publish_snapshot(retriever)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Removal failed: {str(e)}")
+        return {"chunks_removed": removed, "documents_loaded": len(retriever.documents)}
+    finally:
+        reload_lock.release()
+
+@app.post("/search")
+async def search_documents(query: str, k: int = 5, mode: Optional[str] = None,
+                           regulator: Optional[str] = None, doc_type: Optional[str] = None,
+                           article_min: Optional[int] = None, article_max: Optional[int] = None,
+                           effective_from: Optional[str] = None, effective_to: Optional[str] = None,
+                           min_score: Optional[float] = None, rerank_min_score: Optional[float] = None,
+                           adaptive: Optional[str] = None, token_budget: Optional[int] = None,
+                           mmr_lambda: Optional[float] = None, rerank: Optional[bool] = None):
+    """Search regulatory documents, optionally restricted by document metadata."""
+    filters = {
+        "regulator": regulator,
+        "doc_type": doc_type,
+        "article_min": article_min,
+        "article_max": article_max,
+        "effective_from": effective_from,
+        "effective_to": effective_to
+    }
+    filters = {key: value for key, value in filters.items() if value is not None}
+    cutoff = {"min_score": min_score, "rerank_min_score": rerank_min_score, "adaptive": adaptive,
+              "token_budget": token_budget}
+    cutoff = {key: value for key, value in cutoff.items() if value is not None}
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        if mode and mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode '{mode}'")
+        
+        try:
+            results, diagnostics = retriever.search_with_diagnostics(query, k=k, mode=mode,
+                                                                     filters=filters, cutoff=cutoff,
+                                                                     mmr_lambda=mmr_lambda, rerank=rerank)
+            return {
+                "query": query,
+                "mode": mode or retriever.search_mode,
+                "filters": filters,
+                "results": results,
+                "total_found": len(results),
+                "diagnostics": diagnostics
+            }
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+
+@app.post("/search/batch")
+async def search_documents_batch(request: BatchSearchRequest):
+    """Search regulatory documents for many queries in one encoder and index pass."""
+    with snapshots.acquire() as retriever:
+        if not retriever:
+            raise HTTPException(status_code=503, detail="Retriever not initialized")
+        
+        if request.mode and request.mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"Unknown search mode '{request.mode}'")
+        
+        try:
+            results, diagnostics = retriever.search_many_with_diagnostics(
+                request.queries, k=request.k, mode=request.mode,
+                filters=request.filters, cutoff=request.cutoff, mmr_lambda=request.mmr_lambda,
+                rerank=request.rerank
+            )
+            return {
+                "results": [
+                    {"query": query, "results": hits, "total_found": len(hits), "diagnostics": diag}
+                    for query, hits, diag in zip(request.queries, results, diagnostics)
+                ]
+            }
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
 
 @app.get("/stats")
 async def get_system_stats():
     """Get system statistics."""
-    stats = {
-        "system_status": system_status,
-        "retriever_info": None
-    }
-    
-    if retriever:
-        stats["retriever_info"] = {
-            "documents_count": len(retriever.documents),
-            "embedding_dimension": retriever.embeddings.shape[1] if hasattr(retriever, 'embeddings') else None,
-            "index_size": retriever.index.ntotal if hasattr(retriever, 'index') else None
+    with snapshots.acquire() as retriever:
+        stats = {
+            "system_status": system_status,
+            "retriever_info": None
         }
-    
-    return stats
+        
+        if retriever:
+            stats["retriever_info"] = retriever.stats()
+        
+        return stats
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,277 @@
+from datetime import date, datetime
+import re
+
+import numpy as np
+
+# Filename or title prefixes that identify the issuing body
+REGULATOR_PREFIXES = {
+    "CRR": "CRR",
+    "CRD": "CRD",
+    "PRA": "PRA",
+    "EBA": "EBA",
+    "COREP": "EBA"
+}
+
+DOC_TYPES = {
+    "CRR": "regulation",
+    "CRD": "directive",
+    "PRA": "rulebook",
+    "EBA": "guideline",
+    "COREP": "reporting_instructions"
+}
+
+ARTICLE_PATTERN = re.compile(r"\bArticle[\s_]+(\d+)", re.IGNORECASE)
+
+MONTHS = ("january", "february", "march", "april", "may", "june", "july",
+          "august", "september", "october", "november", "december")
+DATE_PATTERN = (
+    r"(\d{4}-\d{2}-\d{2}"
+    r"|\d{1,2}/\d{1,2}/\d{4}"
+    r"|\d{1,2}\s+(?:" + "|".join(MONTHS) + r")\s+\d{4})"
+)
+EFFECTIVE_DATE_PATTERN = re.compile(
+    r"(?:effective|in force|applies|applicable|apply)\s+(?:date\s*)?(?:from|on|as of|since)?[:\s]*" + DATE_PATTERN,
+    re.IGNORECASE
+)
+
+# Filter keys accepted by MetadataFilterIndex.bitmap
+CATEGORICAL_FIELDS = ("regulator", "doc_type", "source")
+# Fields with few distinct values get one bitmap per value; sources are a code column
+BITMAP_FIELDS = ("regulator", "doc_type")
+FILTER_KEYS = CATEGORICAL_FIELDS + ("article_min", "article_max", "effective_from", "effective_to")
+
+FILTER_CACHE_SIZE = 256
+
+
+def parse_date(value):
+    """Parse an ISO, DD/MM/YYYY or '1 January 2022' date; returns None if unrecognised."""
+    if isinstance(value, date):
+        return value
+    value = " ".join(str(value).split())
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d %B %Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _prefix(value):
+    return re.split(r"[\s_\-.]+", value.strip().upper(), 1)[0]
+
+
+def labels_outdated(source, metadata):
+    """
+    Whether regulator and doc_type extracted earlier from a source's filename
+    differ from what the current prefix tables give, e.g. in a saved corpus.
+
+    Labels taken from a document's title are not checked, as that needs its text.
+    """
+    prefix = _prefix(source)
+    if prefix not in REGULATOR_PREFIXES:
+        return False
+    return (metadata.get("regulator"), metadata.get("doc_type")) != (REGULATOR_PREFIXES[prefix], DOC_TYPES[prefix])
+
+
+def extract_metadata(source, text):
+    """
+    Derive filterable metadata from a document's filename and opening lines.
+
+    Args:
+        source (str): Source filename, e.g. 'CRR_Article_36.txt'
+        text (str): Document text
+
+    Returns:
+        dict: regulator, doc_type, article (int or None) and
+            effective_date (ISO string or None)
+    """
+    title = text.lstrip().split("\n", 1)[0]
+    prefix = _prefix(source)
+    if prefix not in REGULATOR_PREFIXES:
+        prefix = _prefix(title)
+
+    article = ARTICLE_PATTERN.search(source) or ARTICLE_PATTERN.search(title)
+    effective = EFFECTIVE_DATE_PATTERN.search(text)
+    effective_date = parse_date(effective.group(1)) if effective else None
+
+    return {
+        "regulator": REGULATOR_PREFIXES.get(prefix),
+        "doc_type": DOC_TYPES.get(prefix, "other"),
+        "article": int(article.group(1)) if article else None,
+        "effective_date": effective_date.isoformat() if effective_date else None
+    }
+
+
+def _read_only(array):
+    """Read-only view of an array, to be shared between copies of an index."""
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def _writable(array):
+    """The array itself, or a private copy if it is a read-only view shared with a copy."""
+    return array if array.flags.writeable else array.copy()
+
+
+class MetadataFilterIndex:
+    """
+    Per-chunk metadata columns and precomputed bitmaps for filtered search.
+
+    Rows match the retriever's chunk ids. Each regulator and document type
+    keeps a boolean bitmap that is updated as documents are added or
+    removed. Sources, which grow with the corpus, are an integer code column
+    instead, as are article numbers and effective dates, so those filters
+    are one vectorised comparison. Combined bitmaps are cached per filter
+    until the corpus next changes. Copies share every column and bitmap as
+    a read-only view, and an index copies one before it first writes to it.
+    """
+
+    def __init__(self, capacity=0):
+        self.n_rows = 0
+        self.live = np.zeros(capacity, dtype=bool)
+        self.articles = np.full(capacity, -1, dtype="int64")
+        self.effective = np.full(capacity, -1, dtype="int64")
+        self.source_codes = np.full(capacity, -1, dtype="int32")
+        self.bitmaps = {field: {} for field in BITMAP_FIELDS}
+        self._source_ids = {}
+        self._cache = {}
+
+    def _grow(self, needed):
+        """Extend every column to hold at least `needed` rows, doubling capacity."""
+        capacity = len(self.live)
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+
+        def grown(column, fill):
+            buffer = np.full(capacity, fill, dtype=column.dtype)
+            buffer[:len(column)] = column
+            return buffer
+
+        self.live = grown(self.live, False)
+        self.articles = grown(self.articles, -1)
+        self.effective = grown(self.effective, -1)
+        self.source_codes = grown(self.source_codes, -1)
+        for values in self.bitmaps.values():
+            for value, bitmap in values.items():
+                values[value] = grown(bitmap, False)
+
+    def add(self, rows, source, metadata):
+        """Mark a document's chunk rows as live with the given metadata."""
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype="int64")
+        self._grow(int(rows.max()) + 1)
+        self.n_rows = max(self.n_rows, int(rows.max()) + 1)
+
+        self.live = _writable(self.live)
+        self.live[rows] = True
+        self.articles = _writable(self.articles)
+        self.articles[rows] = metadata.get("article") if metadata.get("article") is not None else -1
+        effective = parse_date(metadata["effective_date"]) if metadata.get("effective_date") else None
+        self.effective = _writable(self.effective)
+        self.effective[rows] = effective.toordinal() if effective else -1
+        self.source_codes = _writable(self.source_codes)
+        self.source_codes[rows] = self._source_ids.setdefault(source, len(self._source_ids))
+        for field in BITMAP_FIELDS:
+            value = metadata.get(field)
+            if value is None:
+                continue
+            bitmap = self.bitmaps[field].get(value)
+            if bitmap is None:
+                bitmap = np.zeros(len(self.live), dtype=bool)
+            bitmap = self.bitmaps[field][value] = _writable(bitmap)
+            bitmap[rows] = True
+        self._cache.clear()
+
+    def remove(self, rows):
+        """Clear a document's chunk rows from every bitmap."""
+        if not rows:
+            return
+        rows = np.asarray(rows, dtype="int64")
+        self.live = _writable(self.live)
+        self.live[rows] = False
+        self.source_codes = _writable(self.source_codes)
+        self.source_codes[rows] = -1
+        for values in self.bitmaps.values():
+            for value, bitmap in values.items():
+                if bitmap[rows].any():
+                    bitmap = values[value] = _writable(bitmap)
+                    bitmap[rows] = False
+        self._cache.clear()
+
+    def copy(self):
+        """Copy that can be updated without affecting this index; columns are shared until written."""
+        for name in ("live", "articles", "effective", "source_codes"):
+            setattr(self, name, _read_only(getattr(self, name)))
+        for values in self.bitmaps.values():
+            for value, bitmap in values.items():
+                values[value] = _read_only(bitmap)
+
+        clone = MetadataFilterIndex()
+        clone.n_rows = self.n_rows
+        clone.live = self.live
+        clone.articles = self.articles
+        clone.effective = self.effective
+        clone.source_codes = self.source_codes
+        clone._source_ids = dict(self._source_ids)
+        clone.bitmaps = {field: dict(values) for field, values in self.bitmaps.items()}
+        return clone
+
+    def bitmap(self, filters):
+        """
+        Combine precomputed bitmaps into the set of chunk rows a filter allows.
+
+        Args:
+            filters (dict): Any of regulator, doc_type, source (a value or list
+                of values), article_min, article_max (inclusive article
+                numbers) and effective_from, effective_to (inclusive dates)
+
+        Returns:
+            np.ndarray: Read-only boolean array over chunk rows
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}; expected {', '.join(FILTER_KEYS)}")
+        key = tuple(sorted((name, tuple(value) if isinstance(value, list) else value)
+                           for name, value in filters.items() if value is not None))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        n = self.n_rows
+        allowed = self.live[:n].copy()
+        for name, value in key:
+            if name == "source":
+                codes = [self._source_ids[item] for item in (value if isinstance(value, tuple) else (value,))
+                         if item in self._source_ids]
+                allowed &= np.isin(self.source_codes[:n], codes)
+            elif name in BITMAP_FIELDS:
+                selected = np.zeros(n, dtype=bool)
+                for item in (value if isinstance(value, tuple) else (value,)):
+                    bitmap = self.bitmaps[name].get(item)
+                    if bitmap is not None:
+                        selected |= bitmap[:n]
+                allowed &= selected
+            elif name in ("article_min", "article_max"):
+                articles = self.articles[:n]
+                allowed &= articles >= 0
+                allowed &= articles >= int(value) if name == "article_min" else articles <= int(value)
+            else:
+                bound = parse_date(value)
+                if bound is None:
+                    raise ValueError(f"Invalid date for {name}: '{value}'")
+                effective = self.effective[:n]
+                allowed &= effective >= 0
+                allowed &= effective >= bound.toordinal() if name == "effective_from" else effective <= bound.toordinal()
+
+        allowed.flags.writeable = False
+        if len(self._cache) >= FILTER_CACHE_SIZE:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = allowed
+        return allowed
+
+    def values(self):
+        """Return the categorical values available for filtering."""
+        return {field: sorted(values) for field, values in self.bitmaps.items()}
@@ -0,0 +1,50 @@
+import numpy as np
+
+# Candidates re-ranked by MMR, relative to the number of results wanted
+MMR_DEPTH_FACTOR = 4
+MMR_MIN_DEPTH = 20
+
+
+def mmr_select(relevance, vectors, k, lambda_mult=0.5):
+    """
+    Greedy Maximal Marginal Relevance selection.
+
+    Each step picks the candidate maximising
+    lambda * relevance - (1 - lambda) * max cosine similarity to the
+    candidates already picked, so near-duplicate passages give way to ones
+    covering different ground.
+
+    Args:
+        relevance (np.ndarray): (n,) higher-is-better query relevance per candidate
+        vectors (np.ndarray): (n, dim) candidate embeddings
+        k (int): Number of candidates to select
+        lambda_mult (float): 1.0 ranks purely by relevance, 0.0 purely by diversity
+
+    Returns:
+        list: Positions of the selected candidates, in selection order
+    """
+    n = len(relevance)
+    if n == 0 or k <= 0:
+        return []
+
+    relevance = np.asarray(relevance, dtype="float32")
+    spread = relevance.max() - relevance.min()
+    # Put relevance on the same [0, 1] scale as cosine similarity
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(n, dtype="float32")
+
+    vectors = np.asarray(vectors, dtype="float32")
+    vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    similarity = vectors @ vectors.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, n):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return selected
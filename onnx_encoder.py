@@ -0,0 +1,318 @@
+import numpy as np
+import inspect
+import json
+import os
+import time
+
+ONNX_MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+PARITY_FILE = "parity.json"
+# An exported model whose embeddings drift further than this from PyTorch is rejected
+PARITY_MIN_COSINE = 0.99
+PARITY_SAMPLE_TEXTS = [
+    "What are the components of CET1 capital?",
+    "How are intangible assets deducted in row 350?",
+    "AT1 instruments under CRR Article 51",
+    "Deferred tax assets that rely on future profitability",
+    "Own funds requirements for credit risk under the standardised approach"
+]
+
+
+def _hub_name(model_name):
+    """Sentence-transformers models are published under their organisation on the hub."""
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def export_inputs(forward, sample):
+    """
+    Order tokenizer outputs to match the model's forward signature.
+
+    torch.onnx.export passes the input tuple positionally, while tokenizers
+    return their tensors in their own order (BERT tokenizers put
+    token_type_ids before attention_mask, the reverse of BertModel.forward).
+
+    Args:
+        forward (callable): The model's forward method
+        sample (dict): Tokenizer output, keyed by input name
+
+    Returns:
+        list: Input names in the order forward expects them
+    """
+    parameters = list(inspect.signature(forward).parameters)
+    names = [name for name in parameters if name in sample]
+    unknown = sorted(set(sample) - set(names))
+    if unknown:
+        raise ValueError(f"forward() does not accept tokenizer outputs {unknown}")
+    if names != parameters[:len(names)]:
+        raise ValueError(f"Tokenizer outputs {names} are not the leading parameters of forward{tuple(parameters)}")
+    return names
+
+
+class ParityError(ValueError):
+    """An exported encoder's embeddings drift too far from the reference model."""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+def check_parity(reference, candidate, texts=PARITY_SAMPLE_TEXTS, min_cosine=PARITY_MIN_COSINE):
+    """
+    Run parity_check and reject a candidate encoder that drifts from the reference.
+
+    Returns:
+        dict: The parity_check statistics
+
+    Raises:
+        ParityError: If any sample's cosine similarity falls below min_cosine
+    """
+    stats = parity_check(reference, candidate, texts)
+    if stats["cosine_min"] < min_cosine:
+        raise ParityError(f"Encoder parity check failed: cosine_min {stats['cosine_min']} < {min_cosine} ({stats})",
+                          stats)
+    return stats
+
+
+def export_onnx_model(model_name, output_dir, quantize=True, reference=None):
+    """
+    Export a sentence-transformers model to ONNX, optionally with dynamic int8 quantization.
+
+    The exported model is checked against the PyTorch one before it is
+    used; on a failed parity check its files are removed again and the
+    failure is recorded, so load_onnx_encoder does not export it again.
+
+    Args:
+        model_name (str): Sentence transformer model name, e.g. 'all-MiniLM-L6-v2'
+        output_dir (str): Directory to write the model and tokenizer to
+        quantize (bool): Also write a dynamically quantized int8 model
+        reference: SentenceTransformer to check parity against (loaded from model_name if omitted)
+
+    Returns:
+        str: Path of the model file the encoder should load
+
+    Raises:
+        ParityError: If the exported embeddings do not match the reference model
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    parity_path = os.path.join(output_dir, PARITY_FILE)
+    if os.path.exists(parity_path):
+        os.remove(parity_path)
+    tokenizer = AutoTokenizer.from_pretrained(_hub_name(model_name))
+    model = AutoModel.from_pretrained(_hub_name(model_name))
+    model.eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = export_inputs(model.forward, sample)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    onnx_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            onnx_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    print(f"Exported {model_name} to {onnx_path}")
+
+    model_path = onnx_path
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        model_path = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+        quantize_dynamic(onnx_path, model_path, weight_type=QuantType.QInt8)
+        print(f"Quantized model written to {model_path}")
+
+    if reference is None:
+        from sentence_transformers import SentenceTransformer
+        reference = SentenceTransformer(model_name)
+    model_file = os.path.basename(model_path)
+    try:
+        stats = check_parity(reference, OnnxQueryEncoder(output_dir, quantized=quantize))
+    except ParityError as e:
+        for path in {onnx_path, model_path}:
+            os.remove(path)
+        _write_parity_record(parity_path, model_file, False, e.stats)
+        raise
+    # load_onnx_encoder only trusts model files with a passing parity record
+    _write_parity_record(parity_path, model_file, True, stats)
+    print(f"Parity check passed: {stats}")
+    return model_path
+
+
+def _write_parity_record(path, model_file, passed, stats):
+    with open(path, "w") as f:
+        json.dump({"model_file": model_file, "passed": passed, **stats}, f, indent=2)
+
+
+class OnnxQueryEncoder:
+    """
+    Query encoder running an exported sentence-transformers model on ONNX Runtime.
+
+    Reproduces the all-MiniLM-L6-v2 pipeline (mean pooling followed by L2
+    normalization) and exposes the subset of the SentenceTransformer API
+    the retriever uses.
+    """
+
+    def __init__(self, model_dir, quantized=True, max_length=256):
+        """
+        Args:
+            model_dir (str): Directory produced by export_onnx_model
+            quantized (bool): Load the int8 model rather than the float one
+            max_length (int): Token limit, matching the sentence transformer
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The ONNX query encoder requires onnxruntime: pip install onnxruntime")
+        from transformers import AutoTokenizer
+
+        model_file = QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.model_path = os.path.join(model_dir, model_file)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        """
+        Embed texts into normalized vectors.
+
+        Returns:
+            np.ndarray: (len(texts), dim) float32 embeddings
+        """
+        texts = list(texts)
+        outputs = []
+        for i in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                    max_length=self.max_length, return_tensors="np")
+            feeds = {name: tokens[name].astype("int64") for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = tokens["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not outputs:
+            return np.zeros((0, self.dimension or 0), dtype="float32")
+        return np.vstack(outputs).astype("float32")
+
+
+def _parity_record(model_dir, model_file):
+    """Parity check result recorded for a model file, or None if it was never checked."""
+    try:
+        with open(os.path.join(model_dir, PARITY_FILE)) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if record.get("model_file") == model_file else None
+
+
+def load_onnx_encoder(model_name, model_dir, quantized=True):
+    """
+    Load the ONNX encoder, exporting the model first unless a checked export exists.
+
+    Raises:
+        ParityError: If the export fails its parity check, now or in an earlier run;
+            delete the model directory's parity.json to export it again
+    """
+    model_file = QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE
+    record = _parity_record(model_dir, model_file)
+    if record is not None and not record.get("passed", True):
+        stats = {key: value for key, value in record.items() if key not in ("model_file", "passed")}
+        raise ParityError(f"{os.path.join(model_dir, model_file)} failed its parity check: "
+                          f"cosine_min {stats.get('cosine_min')} < {PARITY_MIN_COSINE} ({stats})", stats)
+    if record is None or not os.path.exists(os.path.join(model_dir, model_file)):
+        export_onnx_model(model_name, model_dir, quantize=quantized)
+    return OnnxQueryEncoder(model_dir, quantized=quantized)
+
+
+def parity_check(reference, candidate, texts):
+    """
+    Compare a candidate encoder's embeddings with the reference PyTorch model.
+
+    Args:
+        reference: SentenceTransformer used to build the corpus embeddings
+        candidate: Encoder under test, e.g. OnnxQueryEncoder
+        texts (list): Sample queries or passages
+
+    Returns:
+        dict: Cosine similarity statistics and the largest absolute difference
+    """
+    expected = np.asarray(reference.encode(texts, normalize_embeddings=True), dtype="float32")
+    actual = np.asarray(candidate.encode(texts), dtype="float32")
+    cosine = np.sum(expected * actual, axis=1)
+    return {
+        "samples": len(texts),
+        "cosine_min": round(float(cosine.min()), 6),
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "max_abs_diff": round(float(np.abs(expected - actual).max()), 6)
+    }
+
+
+def benchmark_encoders(encoders, queries, repeats=20):
+    """
+    Measure single-query encoding latency for each encoder.
+
+    Args:
+        encoders (dict): Mapping of label to encoder
+        queries (list): Queries encoded one at a time
+        repeats (int): Passes over the query list
+
+    Returns:
+        list: One dictionary per encoder with p50/p95/p99 latency in milliseconds
+    """
+    report = []
+    for label, encoder in encoders.items():
+        encoder.encode(queries[:1])  # exclude one-off initialization from timings
+        latencies = []
+        for _ in range(repeats):
+            for query in queries:
+                started = time.perf_counter()
+                encoder.encode([query])
+                latencies.append((time.perf_counter() - started) * 1000)
+        report.append({
+            "encoder": label,
+            "calls": len(latencies),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3)
+        })
+    return report
+
+
+if __name__ == "__main__":
+    # Export the configured model, then check parity and latency against PyTorch
+    from sentence_transformers import SentenceTransformer
+
+    model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    model_dir = os.getenv("ONNX_MODEL_DIR", os.path.join("onnx_models", model_name))
+    queries = [
+        "What are the components of CET1 capital?",
+        "How are intangible assets deducted in row 350?",
+        "AT1 instruments under CRR Article 51",
+        "The bank has £120m ordinary share capital, £30m retained earnings, £10m AT1 instruments, and £8m intangible assets."
+    ]
+
+    torch_model = SentenceTransformer(model_name)
+    onnx_model = load_onnx_encoder(model_name, model_dir)
+    print(json.dumps({
+        "parity": parity_check(torch_model, onnx_model, queries),
+        "latency": benchmark_encoders({"torch": torch_model, "onnx_int8": onnx_model}, queries)
+    }, indent=2))
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+import threading
+
+
+def normalize_query(query):
+    """Collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(query.split())
+
+
+class QueryLRUCache:
+    """
+    Bounded LRU cache of per-query values keyed on (namespace, normalized query).
+
+    Tracks hits, misses and evictions so the hit rate can be reported.
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        Args:
+            max_size (int): Maximum number of cached values; 0 disables caching
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, namespace, query):
+        """Return the cached value for a query, or None on a miss."""
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, namespace, query, value):
+        """Store a value, evicting the least recently used entry if full."""
+        if self.max_size <= 0:
+            return
+        key = (namespace, normalize_query(query))
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached values; counters are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache size and hit/miss/eviction counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class QueryEmbeddingCache(QueryLRUCache):
+    """Query embeddings keyed on (model id, normalized query)."""
@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import time
+
+from query_cache import QueryLRUCache
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """
+    Second-stage re-scoring of retrieved passages with a local cross-encoder.
+
+    Scoring runs in small batches against a deadline: before each batch the
+    expected cost (a running average of past batches) is checked against the
+    time left, and once it would overrun, the remaining candidates keep
+    their first-stage order. Scores are cached per (query, chunk text).
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, batch_size=8, cache_size=4096, max_length=512):
+        """
+        Args:
+            model_name (str): sentence-transformers CrossEncoder model
+            batch_size (int): (query, passage) pairs scored per model call
+            cache_size (int): Number of (query, chunk) scores kept in the LRU cache
+            max_length (int): Token limit for each query/passage pair
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        # Keyed on ((model, chunk text hash), normalized query)
+        self.cache = QueryLRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._model = None
+        self._seconds_per_pair = None
+
+    def _get_model(self):
+        """Load the cross-encoder on first use."""
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name, max_length=self.max_length)
+        return self._model
+
+    def warm_up(self):
+        """Load the model and score one pair so the first request is not slowed down."""
+        self._score([("warm-up query", "warm-up passage")])
+
+    def _score(self, pairs):
+        model = self._get_model()
+        started = time.perf_counter()
+        scores = model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        per_pair = (time.perf_counter() - started) / len(pairs)
+        self._seconds_per_pair = per_pair if self._seconds_per_pair is None else (
+            0.8 * self._seconds_per_pair + 0.2 * per_pair)
+        return [float(score) for score in scores]
+
+    def rerank(self, query, candidates, deadline):
+        """
+        Re-score candidates until the deadline, best cross-encoder score first.
+
+        Args:
+            query (str): Search query
+            candidates (list): Result dictionaries with 'text' and 'score', in first-stage order
+            deadline (float): time.perf_counter() value by which scoring must stop
+
+        Returns:
+            tuple: (re-ordered results, info dict with scored/cached counts and
+                whether the budget ran out). Scored results carry the cross-encoder
+                score; unscored ones follow in their original order.
+        """
+        keys = [hashlib.sha1(result["text"].encode("utf-8")).hexdigest() for result in candidates]
+        scores = {}
+        pending = []
+        for i, key in enumerate(keys):
+            cached = self.cache.get((self.model_name, key), query)
+            if cached is not None:
+                scores[i] = cached
+            else:
+                pending.append(i)
+        cache_hits = len(scores)
+
+        exhausted = False
+        for offset in range(0, len(pending), self.batch_size):
+            batch = pending[offset:offset + self.batch_size]
+            remaining = deadline - time.perf_counter()
+            expected = (self._seconds_per_pair or 0.0) * len(batch)
+            if remaining <= 0 or expected > remaining:
+                exhausted = True
+                if remaining > 0 and self._seconds_per_pair:
+                    # Let one slow batch's estimate decay so later requests try again
+                    self._seconds_per_pair *= 0.9
+                break
+            for i, score in zip(batch, self._score([(query, candidates[i]["text"]) for i in batch])):
+                scores[i] = score
+                self.cache.put((self.model_name, keys[i]), query, score)
+
+        scored = sorted(scores, key=lambda i: scores[i], reverse=True)
+        reranked = []
+        for i in scored:
+            result = dict(candidates[i])
+            result["retrieval_score"] = result["score"]
+            result["retrieval_score_type"] = result["score_type"]
+            result["score"] = scores[i]
+            result["score_type"] = "cross_encoder"
+            reranked.append(result)
+        reranked.extend(candidates[i] for i in range(len(candidates)) if i not in scores)
+
+        info = {
+            "candidates": len(candidates),
+            "scored": len(scores),
+            "cache_hits": cache_hits,
+            "budget_exhausted": exhausted
+        }
+        return reranked, info
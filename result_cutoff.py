@@ -0,0 +1,116 @@
+import os
+
+ADAPTIVE_STRATEGIES = ("none", "gap", "tokens")
+
+# Rough characters-per-token ratio for English regulatory text
+CHARS_PER_TOKEN = 4
+
+DEFAULT_CUTOFF_CONFIG = {
+    "min_score": None,        # Drop results less relevant than this (see relevance())
+    "rerank_min_score": None, # Threshold for cross-encoder scores, which are on their own scale
+    "adaptive": "none",       # 'gap' cuts at the largest score drop, 'tokens' at token_budget
+    "token_budget": 1500,     # Estimated prompt tokens allowed for retrieved context
+    "min_gap_ratio": 0.1,     # Smallest drop, relative to the top score, that counts as a gap
+    "min_results": 1          # Never cut below this many results
+}
+
+
+def cutoff_config_from_env():
+    """
+    Read result cutoff settings from environment variables.
+
+    Returns:
+        dict: Cutoff configuration with the keys of DEFAULT_CUTOFF_CONFIG
+    """
+    config = dict(DEFAULT_CUTOFF_CONFIG)
+    min_score = os.getenv("RETRIEVAL_MIN_SCORE")
+    if min_score:
+        config["min_score"] = float(min_score)
+    rerank_min_score = os.getenv("RERANK_MIN_SCORE")
+    if rerank_min_score:
+        config["rerank_min_score"] = float(rerank_min_score)
+    config["adaptive"] = os.getenv("RETRIEVAL_ADAPTIVE", config["adaptive"]).lower()
+    token_budget = os.getenv("RETRIEVAL_TOKEN_BUDGET")
+    if token_budget:
+        config["token_budget"] = int(token_budget)
+    return config
+
+
+def estimate_tokens(text):
+    """Approximate the number of LLM tokens in a passage."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def relevance(score, score_type):
+    """
+    Map a result score to a higher-is-better relevance value.
+
+    Squared L2 distances between unit vectors become cosine similarity
+    (1 - d / 2); BM25, RRF and cross-encoder scores are already
+    higher-is-better.
+    """
+    if score_type == "l2_distance":
+        return 1.0 - score / 2.0
+    return score
+
+
+def apply_cutoff(results, config=None):
+    """
+    Trim a best-first result list by relevance threshold and adaptive k.
+
+    Thresholds and gaps compare scores with each other, so every result
+    must carry the same score type. Cross-encoder scores are checked
+    against rerank_min_score, everything else against min_score.
+
+    Args:
+        results (list): Result dictionaries with 'score', 'score_type' and 'text'
+        config (dict): Overrides for DEFAULT_CUTOFF_CONFIG
+
+    Returns:
+        tuple: (kept results, diagnostics dictionary)
+    """
+    config = {**DEFAULT_CUTOFF_CONFIG, **(config or {})}
+    if config["adaptive"] not in ADAPTIVE_STRATEGIES:
+        raise ValueError(f"Unknown adaptive strategy '{config['adaptive']}', expected one of {', '.join(ADAPTIVE_STRATEGIES)}")
+    score_types = {r["score_type"] for r in results}
+    if len(score_types) > 1:
+        raise ValueError(f"Cannot cut off results with mixed score types: {', '.join(sorted(score_types))}")
+    min_results = max(0, int(config["min_results"]))
+    dropped_by = {"threshold": 0, "gap": 0, "tokens": 0}
+
+    kept = list(results)
+    min_score = config["rerank_min_score"] if score_types == {"cross_encoder"} else config["min_score"]
+    if min_score is not None:
+        passing = [r for r in kept if relevance(r["score"], r["score_type"]) >= min_score]
+        # min_results only guards the adaptive cuts; a threshold is absolute
+        dropped_by["threshold"] = len(kept) - len(passing)
+        kept = passing
+
+    if config["adaptive"] == "gap" and len(kept) > max(min_results, 1):
+        scores = [relevance(r["score"], r["score_type"]) for r in kept]
+        start = max(min_results, 1)
+        gaps = [(scores[i - 1] - scores[i], i) for i in range(start, len(scores))]
+        gap, cut = max(gaps)
+        if gap > 0 and gap >= config["min_gap_ratio"] * abs(scores[0]):
+            dropped_by["gap"] = len(kept) - cut
+            kept = kept[:cut]
+
+    if config["adaptive"] == "tokens":
+        used = 0
+        for i, result in enumerate(kept):
+            used += estimate_tokens(result["text"])
+            if used > config["token_budget"] and i >= min_results:
+                dropped_by["tokens"] = len(kept) - i
+                kept = kept[:i]
+                break
+
+    kept_tokens = sum(estimate_tokens(r["text"]) for r in kept)
+    diagnostics = {
+        "candidates": len(results),
+        "returned": len(kept),
+        "dropped": len(results) - len(kept),
+        "dropped_by": dropped_by,
+        "estimated_tokens": kept_tokens,
+        "estimated_tokens_dropped": sum(estimate_tokens(r["text"]) for r in results) - kept_tokens
+    }
+    return kept, diagnostics
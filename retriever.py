@@ -1,110 +1,1213 @@
-from sentence_transformers import SentenceTransformer
-import faiss
 import numpy as np
-import pickle
+import copy
+import hashlib
+import json
 import os
+import threading
+import time
 
-class RegulatoryRetriever:
+from chunker import chunk_text, DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP
+from corpus_store import CorpusStore, utf8_offsets
+from section_parser import SectionIndex, parse_sections
+from embedding_store import (
+    BM25_FILE, CHUNK_BYTES_FILE, CHUNK_BYTES_TAIL_FILE, CORPUS_FILE, CORPUS_TAIL_FILE, DOCUMENTS_FILE,
+    DOCUMENTS_TAIL_FILE, EmbeddingStore, store_key
+)
+from bm25 import BM25Index, reciprocal_rank_fusion
+from metadata import MetadataFilterIndex, extract_metadata, labels_outdated
+from result_cutoff import ADAPTIVE_STRATEGIES, DEFAULT_CUTOFF_CONFIG, apply_cutoff, relevance
+from mmr import MMR_DEPTH_FACTOR, MMR_MIN_DEPTH, mmr_select
+from onnx_encoder import ParityError, load_onnx_encoder
+from query_cache import QueryEmbeddingCache, normalize_query
+from retriever_snapshots import ReadWriteLock
+from index_backends import (
+    DEFAULT_INDEX_CONFIG, VECTOR_DTYPES, AppendOnlyMatrix, LayeredIndex, NumpyIndex, add_vectors,
+    apply_search_params, build_index, copy_index, decode_vectors, encode_vectors, index_memory_bytes,
+    remove_vectors, resolve_index_type, search_index, supports_ids
+)
+
+SEARCH_MODES = ("dense", "bm25", "hybrid")
+QUERY_ENCODERS = ("torch", "onnx")
+
+# Passages encoded per batch while a document stream is still being read
+STREAM_ENCODE_CHUNKS = 1024
+
+# Rows added and removed since the store's base, relative to its size, up to
+# which save() writes a delta instead of a new base
+MAX_DELTA_FRACTION = 0.25
+
+# Candidates taken from each retriever before rank fusion, relative to k
+HYBRID_DEPTH_FACTOR = 4
+HYBRID_MIN_DEPTH = 20
+
+def hybrid_depth(k, n_chunks):
+    """Candidates taken from each of the dense and BM25 rankings before rank fusion."""
+    return min(max(k * HYBRID_DEPTH_FACTOR, HYBRID_MIN_DEPTH), n_chunks)
+
+def fuse_rankings(dense, keyword, k, mode):
+    """
+    Combine dense and BM25 rankings into the top k candidates of a search mode.
+    
+    Args:
+        dense (list): (id, squared L2 distance) tuples, nearest first
+        keyword (list): (id, BM25 score) tuples, best first
+        k (int): Number of candidates to keep
+        mode (str): 'dense', 'bm25' or 'hybrid' (reciprocal rank fusion of both)
+        
+    Returns:
+        tuple: (ids, scores, score type), best first
+    """
+    if mode == "dense":
+        hits, score_type = dense[:k], "l2_distance"
+    elif mode == "bm25":
+        hits, score_type = keyword[:k], "bm25"
+    else:
+        hits = reciprocal_rank_fusion([[idx for idx, _ in dense], [idx for idx, _ in keyword]])[:k]
+        score_type = "rrf"
+    return [idx for idx, _ in hits], [score for _, score in hits], score_type
+
+def content_hash(text):
+    """Return a stable hash of a document's text for cache addressing."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class SearchPipeline:
+    """
+    Query-time stages shared by single and sharded retrievers.
+    
+    Subclasses retrieve candidate pools with _search_candidates() and expose
+    stored chunk vectors through _candidate_vectors(); this class runs the
+    optional cross-encoder, MMR and cutoff stages over those pools. It
+    expects cutoff_config, mmr_lambda, reranker, rerank_top_n and
+    rerank_budget_ms attributes.
+    """
+    
+    def _resolve_cutoff(self, cutoff, base=None):
+        """Merge cutoff overrides onto a base policy and validate the strategy."""
+        config = {**(base or DEFAULT_CUTOFF_CONFIG), **(cutoff or {})}
+        if config["adaptive"] not in ADAPTIVE_STRATEGIES:
+            raise ValueError(f"Unknown adaptive strategy '{config['adaptive']}', expected one of {', '.join(ADAPTIVE_STRATEGIES)}")
+        return config
+    
+    @staticmethod
+    def _check_mmr_lambda(mmr_lambda):
+        if mmr_lambda is not None and not 0.0 <= mmr_lambda <= 1.0:
+            raise ValueError(f"mmr_lambda must be between 0 and 1, got {mmr_lambda}")
+        return mmr_lambda
+    
+    def search(self, query, k=3, mode=None, filters=None, cutoff=None, mmr_lambda=None, rerank=None):
+        """
+        Search for relevant passages given a query.
+        
+        Args:
+            query (str): Search query
+            k (int): Number of top results to return
+            mode (str): 'dense', 'bm25' or 'hybrid'; defaults to the retriever's search_mode
+            filters (dict): Metadata restrictions, e.g. {'regulator': 'PRA'} or
+                {'article_min': 26, 'article_max': 36}; see metadata.FILTER_KEYS
+            cutoff (dict): Per-request overrides of the retriever's cutoff_config
+            mmr_lambda (float): Per-request MMR trade-off; defaults to the retriever's mmr_lambda
+            rerank (bool): Apply the cross-encoder stage; defaults to on when a reranker is configured
+            
+        Returns:
+            list: Up to k dictionaries with the source, character offsets
+                and text of each matching chunk
+        """
+        return self.search_many([query], k=k, mode=mode, filters=filters, cutoff=cutoff,
+                                mmr_lambda=mmr_lambda, rerank=rerank)[0]
+    
+    def search_with_diagnostics(self, query, k=3, mode=None, filters=None, cutoff=None, mmr_lambda=None,
+                                rerank=None):
+        """
+        Search like search(), also reporting what the cutoff policy dropped.
+        
+        Returns:
+            tuple: (results, diagnostics), see result_cutoff.apply_cutoff
+        """
+        results, diagnostics = self.search_many_with_diagnostics([query], k=k, mode=mode, filters=filters,
+                                                                 cutoff=cutoff, mmr_lambda=mmr_lambda,
+                                                                 rerank=rerank)
+        return results[0], diagnostics[0]
+    
+    def search_many(self, queries, k=3, mode=None, filters=None, cutoff=None, mmr_lambda=None, rerank=None):
+        """
+        Search for several queries with one encoder batch and one index search.
+        
+        Args:
+            queries (list): List of query strings
+            k (int): Maximum number of results to return per query
+            mode (str): 'dense', 'bm25' or 'hybrid'; defaults to the retriever's search_mode
+            filters (dict): Metadata restrictions applied to every query
+            cutoff (dict): Per-request overrides of the retriever's cutoff_config
+            mmr_lambda (float): Per-request MMR trade-off; defaults to the retriever's mmr_lambda
+            rerank (bool): Apply the cross-encoder stage; defaults to on when a reranker is configured
+            
+        Returns:
+            list: One result list per query, in the same order, shaped like search()
+        """
+        return self.search_many_with_diagnostics(queries, k=k, mode=mode, filters=filters, cutoff=cutoff,
+                                                 mmr_lambda=mmr_lambda, rerank=rerank)[0]
+    
+    def search_many_with_diagnostics(self, queries, k=3, mode=None, filters=None, cutoff=None, mmr_lambda=None,
+                                     rerank=None):
+        """
+        Batched search that re-ranks, diversifies and trims each result list.
+        
+        The stages run in order, each optional:
+        1. The cross-encoder re-scores the top rerank_top_n candidates within
+           the request's time budget (at least k of them). Only the candidates
+           it scored go on, so later stages never compare its scores with
+           retrieval scores; if the budget ran out before k were scored, the
+           retrieval pool is kept, so the request never returns fewer results.
+        2. MMR picks k passages from a deeper pool that are relevant but not
+           near-duplicates of one another.
+        3. The relevance threshold (rerank_min_score for cross-encoder scores)
+           and adaptive-k strategy drop weak tail results so they do not reach
+           the LLM prompt.
+        
+        Returns:
+            tuple: (one result list per query, one diagnostics dict per query)
+        """
+        config = self._resolve_cutoff(cutoff, self.cutoff_config)
+        mmr_lambda = self._check_mmr_lambda(self.mmr_lambda if mmr_lambda is None else mmr_lambda)
+        rerank = self.reranker is not None if rerank is None else rerank
+        if rerank and self.reranker is None:
+            raise ValueError("Re-ranking requested but no cross-encoder is configured")
+        
+        depth = k
+        if rerank:
+            depth = max(depth, self.rerank_top_n)
+        if mmr_lambda is not None:
+            depth = max(depth, min(max(k * MMR_DEPTH_FACTOR, MMR_MIN_DEPTH), self._chunk_count()))
+        pools = self._search_candidates(queries, depth, mode, filters)
+        
+        rerank_info = [None] * len(pools)
+        if rerank:
+            # One budget for the whole request, shared by all of its queries
+            started = time.perf_counter()
+            deadline = started + self.rerank_budget_ms / 1000.0
+            for i, (query, pool) in enumerate(zip(queries, pools)):
+                reranked, rerank_info[i] = self.reranker.rerank(query, pool[:max(self.rerank_top_n, k)], deadline)
+                scored = [result for result in reranked if result["score_type"] == "cross_encoder"]
+                rerank_info[i]["applied"] = len(scored) >= min(k, len(pool))
+                if rerank_info[i]["applied"]:
+                    pools[i] = scored
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        
+        if mmr_lambda is None:
+            candidates = [pool[:k] for pool in pools]
+        else:
+            candidates = [self._diversify(pool, k, mmr_lambda) for pool in pools]
+        
+        trimmed = [apply_cutoff(results, config) for results in candidates]
+        diagnostics = [diag for _, diag in trimmed]
+        for diag, pool, info in zip(diagnostics, pools, rerank_info):
+            if info is not None:
+                diag["rerank"] = {**info, "budget_ms": self.rerank_budget_ms, "elapsed_ms": elapsed_ms}
+            if mmr_lambda is not None:
+                diag["mmr"] = {"lambda": mmr_lambda, "pool_size": len(pool)}
+        return [results for results, _ in trimmed], diagnostics
+    
+    def _diversify(self, pool, k, mmr_lambda):
+        """
+        Re-rank a candidate pool with Maximal Marginal Relevance.
+        
+        Redundancy is measured on the chunk vectors already held in the
+        embedding store, so no passage is re-encoded.
+        """
+        if len(pool) <= 1:
+            return pool[:k]
+        vectors = self._candidate_vectors(pool)
+        scores = [relevance(result["score"], result["score_type"]) for result in pool]
+        return [pool[i] for i in mmr_select(scores, vectors, k, mmr_lambda)]
+
+class RegulatoryRetriever(SearchPipeline):
     """
     Vector-based retriever for regulatory documents using sentence embeddings
     and FAISS index for efficient similarity search.
     """
     
-    def __init__(self, documents, model_name="all-MiniLM-L6-v2", cache_file="embeddings_cache.pkl"):
+    def __init__(self, documents, model_name="all-MiniLM-L6-v2", cache_dir="embeddings_cache",
+                 chunk_size=DEFAULT_CHUNK_SIZE, chunk_overlap=DEFAULT_CHUNK_OVERLAP, index_config=None,
+                 query_cache_size=1024, search_mode="dense", query_encoder="torch", onnx_model_dir=None,
+                 cutoff_config=None, mmr_lambda=None, reranker=None, rerank_top_n=20, rerank_budget_ms=150,
+                 model=None):
         """
         Initialize the retriever with documents and build the vector index.
         
         Args:
-            documents (list): List of dictionaries with 'source' and 'text' keys
+            documents (iterable): Dictionaries with 'source' and 'text' keys in any
+                order, e.g. streamed from data_loader.iter_regulatory_docs
             model_name (str): Name of the sentence transformer model
-            cache_file (str): File to cache embeddings for faster loading
+            cache_dir (str): Directory holding the embedding store for faster loading
+            chunk_size (int): Maximum passage length in characters
+            chunk_overlap (int): Characters shared between consecutive passages
+            index_config (dict): Index type and tuning knobs, see index_backends
+            query_cache_size (int): Number of query embeddings kept in the LRU cache
+            search_mode (str): Default search mode: 'dense', 'bm25' or 'hybrid'
+            query_encoder (str): 'torch' (SentenceTransformer) or 'onnx' (int8 ONNX Runtime)
+            onnx_model_dir (str): Where the exported ONNX model lives or is exported to
+            cutoff_config (dict): Default relevance threshold and adaptive-k policy, see result_cutoff
+            mmr_lambda (float): Default MMR relevance/diversity trade-off; None disables re-ranking
+            reranker (CrossEncoderReranker): Optional second stage applied to the top candidates
+            rerank_top_n (int): Candidates handed to the re-ranker
+            rerank_budget_ms (float): Time allowed for re-ranking per request
+            model (SentenceTransformer): Already loaded model to use, e.g. shared between shards
         """
-        self.documents = documents
         self.model_name = model_name
-        self.cache_file = cache_file
-        
-        # Load or create embeddings
-        if os.path.exists(cache_file):
-            print(f"Loading cached embeddings from {cache_file}")
-            with open(cache_file, 'rb') as f:
-                cached_data = pickle.load(f)
-                self.texts = cached_data['texts']
-                self.sources = cached_data['sources']
-                self.embeddings = cached_data['embeddings']
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.index_config = {**DEFAULT_INDEX_CONFIG, **(index_config or {})}
+        self.vector_dtype = self.index_config["vector_dtype"]
+        if self.vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype '{self.vector_dtype}', expected one of {', '.join(VECTOR_DTYPES)}")
+        self.store = EmbeddingStore(cache_dir, self._cache_key())
+        os.makedirs(cache_dir, exist_ok=True)
+        self._model_lock = threading.Lock()
+        if model is not None:
+            self.model = model
+        self._warm = threading.Event()
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search_mode}', expected one of {', '.join(SEARCH_MODES)}")
+        self.search_mode = search_mode
+        if query_encoder not in QUERY_ENCODERS:
+            raise ValueError(f"Unknown query encoder '{query_encoder}', expected one of {', '.join(QUERY_ENCODERS)}")
+        self.query_encoder = query_encoder
+        self.onnx_model_dir = onnx_model_dir or os.path.join("onnx_models", model_name)
+        self.cutoff_config = self._resolve_cutoff(cutoff_config)
+        self.mmr_lambda = self._check_mmr_lambda(mmr_lambda)
+        self.reranker = reranker
+        self.rerank_top_n = rerank_top_n
+        self.rerank_budget_ms = rerank_budget_ms
+        
+        # Searches hold the read side, incremental updates the write side
+        self._lock = ReadWriteLock()
+        # What the store's base generation holds, see _mark_saved; None until it matches this retriever
+        self._store_base = None
+        self._unsaved = False
+        
+        manifest = self.store.load_manifest()
+        documents, hashes, embedded = self._read_documents(documents, manifest)
+        self.sources = [doc["source"] for doc in documents]
+        
+        if manifest is not None and [d["hash"] for d in manifest["documents"]] == hashes:
+            # Unchanged corpus: map the stored vectors and index as they are
+            print(f"Loading cached embeddings from {cache_dir}")
+            self.embeddings = self.store.read_embeddings()
+            saved = self.store.read_corpus()
+            if saved is not None and ([(d["source"], d["hash"]) for d in saved["documents"]]
+                                      != [(source, key) for source, key in zip(self.sources, hashes)]
+                                      or any(labels_outdated(d["source"], d["metadata"]) for d in saved["documents"])):
+                # Re-parsed, and saved again, if the corpus or its metadata rules changed
+                saved = None
+            self._load_chunks(documents, manifest["documents"], self.store.read_spans(), saved)
+            if saved is None:
+                # Stores written by ingest.py or before the corpus was saved with them
+                self.store.write_corpus(self._write_corpus)
+                if not len(self.embeddings.tail):
+                    self._mark_saved(self.corpus.nbytes)
+            self.index_type = resolve_index_type(self.index_config["index_type"], len(self.chunks))
+            
+            # The saved index holds the base rows as they were saved, including those removed since
+            removed = saved["removed_rows"] if saved is not None else []
+            base_rows = len(self.embeddings.base)
+            self.index = None
+            if self.index_type != "numpy" and manifest.get("index_type") == self.index_type:
+                base = self.store.read_index()
+                if base is not None and supports_ids(base) \
+                        and base.ntotal == sum(row < base_rows for row in self.chunks) + len(removed):
+                    self.index = self._new_index(base_rows, removed, base)
+            if self.index is None:
+                self._build_index(removed)
+                if self.index_type != "numpy":
+                    self.store.write_index(self.index.base, self.index_type)
         else:
-            print("Creating new embeddings...")
-            self.model = SentenceTransformer(model_name)
-            self.texts = [doc["text"] for doc in documents]
-            self.sources = [doc["source"] for doc in documents]
-            
-            print(f"Encoding {len(self.texts)} documents...")
-            self.embeddings = self.model.encode(self.texts, show_progress_bar=True)
-            
-            # Cache embeddings
-            with open(cache_file, 'wb') as f:
-                pickle.dump({
-                    'texts': self.texts,
-                    'sources': self.sources,
-                    'embeddings': self.embeddings
-                }, f)
-            print(f"Embeddings cached to {cache_file}")
-        
-        # Build FAISS index
+            self._refresh_store(documents, hashes, manifest, embedded)
+        
+        print(f"{self.index_type} index ready with {len(self.chunks)} chunks")
+    
+    def _cache_key(self):
+        """Settings that invalidate every cached vector when they change."""
+        return store_key(self.model_name, self.chunk_size, self.chunk_overlap, self.vector_dtype)
+    
+    def _read_documents(self, documents, manifest):
+        """
+        Hash documents as they arrive and encode those not in the store in batches.
+        
+        Encoding a batch overlaps with the loader reading the next files, so
+        a streamed corpus does not have to be read in full first. Only the
+        document list is sorted afterwards, to give a stable corpus order.
+        
+        Args:
+            documents (iterable): Documents in any order
+            manifest (dict or None): Store manifest with a matching key
+            
+        Returns:
+            tuple: (documents sorted by source, their content hashes, mapping of
+                content hash to a (spans, embeddings) tuple for encoded documents)
+        """
+        stored = {entry["hash"] for entry in manifest["documents"]} if manifest is not None else set()
+        keyed = []
+        embedded = {}
+        pending = {}
+        pending_chunks = 0
+        for doc in documents:
+            key = content_hash(doc["text"])
+            keyed.append((doc["source"], key, doc))
+            if key in stored or key in embedded or key in pending:
+                continue
+            pending[key] = doc["text"]
+            # Passage count estimated from the text length, before chunking
+            pending_chunks += len(doc["text"]) // max(self.chunk_size - self.chunk_overlap, 1) + 1
+            if pending_chunks >= STREAM_ENCODE_CHUNKS:
+                embedded.update(self._embed_documents(list(pending.items())))
+                pending = {}
+                pending_chunks = 0
+        if pending:
+            embedded.update(self._embed_documents(list(pending.items())))
+        
+        keyed.sort(key=lambda item: item[0])
+        return [doc for _, _, doc in keyed], [key for _, key, _ in keyed], embedded
+    
+    def _refresh_store(self, documents, hashes, manifest, embedded=None):
+        """
+        Rebuild the embedding store, reusing vectors of unchanged documents
+        and encoding only new or edited ones.
+        
+        Args:
+            documents (list): Documents in corpus order
+            hashes (list): Content hash of each document, in corpus order
+            manifest (dict or None): Previous store manifest with a matching key
+            embedded (dict): Documents already encoded, see _read_documents
+        """
+        cached = dict(embedded or {})
+        old_embeddings = old_spans = None
+        if manifest is not None:
+            old_embeddings = self.store.read_embeddings()
+            old_spans = self.store.read_spans()
+            for entry in manifest["documents"]:
+                rows = slice(entry["offset"], entry["offset"] + entry["count"])
+                cached[entry["hash"]] = (old_spans[rows], old_embeddings[rows])
+        
+        pending = {}
+        for key, doc in zip(hashes, documents):
+            if key not in cached:
+                pending[key] = doc["text"]
+        if pending:
+            cached.update(self._embed_documents(list(pending.items())))
+        
+        layout = []
+        span_parts = []
+        vector_parts = []
+        offset = 0
+        for key in hashes:
+            doc_spans, doc_vectors = cached[key]
+            layout.append({"hash": key, "offset": offset, "count": len(doc_spans)})
+            span_parts.append(np.asarray(doc_spans, dtype='int64').reshape(-1, 2))
+            vector_parts.append(encode_vectors(doc_vectors, self.vector_dtype))
+            offset += len(doc_spans)
+        
+        spans = np.vstack(span_parts)
+        self._set_vectors(np.vstack(vector_parts))
+        
+        # Release the old memory maps before their generation is removed
+        cached.clear()
+        span_parts = vector_parts = old_embeddings = old_spans = None
+        
+        self._load_chunks(documents, layout, spans)
+        self.index_type = resolve_index_type(self.index_config["index_type"], len(self.chunks))
         self._build_index()
+        # Serve vectors from the memory-mapped store rather than a private copy.
+        # write() maps the generation it just wrote rather than whatever the
+        # cache directory holds afterwards, which another writer sharing it
+        # (e.g. the live snapshot's save) may already have replaced.
+        self._set_vectors(self.store.write(layout, spans, self.embeddings, self.index.base, self.index_type,
+                                           write_corpus=self._write_corpus))
+        self._mark_saved(self.corpus.nbytes)
+        if self.index_type == "numpy":
+            self._build_index()
     
-    def _build_index(self):
-        """Build the FAISS index for similarity search."""
-        dim = self.embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dim)
+    def _load_chunks(self, documents, layout, spans, saved=None):
+        """
+        Expand stored chunk offsets into chunk dictionaries keyed by chunk id.
         
-        # Add embeddings to index
-        embeddings_array = np.array(self.embeddings).astype('float32')
-        self.index.add(embeddings_array)
+        A chunk's id is its row in the embedding matrix, and each document
+        owns a contiguous range of rows.
+        
+        Args:
+            documents (list): Documents in corpus order
+            layout (list): Per-document {'hash', 'offset', 'count'} in corpus order
+            spans (np.ndarray): (n_rows, 2) character offsets
+            saved (dict): Corpus saved with the store (see EmbeddingStore.read_corpus);
+                its blob and BM25 postings are mapped and loaded instead of
+                re-parsing and re-tokenizing every document, except for rows
+                a delta added after the saved postings
+        """
+        self.documents = []
+        self.chunks = {}
+        self._doc_rows = {}
+        self._documents_by_source = {}
+        self.document_info = {}
+        self._corpus_entries = {}
+        self.filter_index = MetadataFilterIndex(len(spans))
+        self.section_index = SectionIndex()
+        self._next_doc_id = 0
+        self._store_base = None
+        if saved is None:
+            # Every document text is held once, in a memory-mapped blob next to the embeddings
+            self.corpus = CorpusStore(self.cache_dir)
+            self.bm25 = BM25Index()
+            for doc, entry in zip(documents, layout):
+                rows = list(range(entry["offset"], entry["offset"] + entry["count"]))
+                self._register_document(doc, entry["hash"], rows, spans[entry["offset"]:entry["offset"] + entry["count"]])
+            return
+        
+        self.corpus = CorpusStore(self.cache_dir, path=saved["blob"], tail_path=saved["tail_blob"])
+        self.bm25 = BM25Index.load(saved["bm25"])
+        for row in saved["removed_rows"]:
+            self.bm25.remove(row)
+        spans = spans.tolist()
+        chunk_bytes = saved["chunk_bytes"].tolist()
+        for doc, entry, corpus_entry in zip(documents, layout, saved["documents"]):
+            rows = slice(entry["offset"], entry["offset"] + entry["count"])
+            self._add_document(doc, list(range(rows.start, rows.stop)), spans[rows], chunk_bytes[rows], corpus_entry)
+        for row in range(saved["base_rows"], len(spans)):
+            chunk = self.chunks.get(row)
+            if chunk is not None:
+                self.bm25.add(row, self.corpus.text(chunk["offset"], chunk["length"]))
+        if saved["base_rows"] == len(self.embeddings.base):
+            self._mark_saved(os.path.getsize(saved["blob"]), saved["base_sources"])
+    
+    def _register_document(self, doc, key, rows, doc_spans):
+        """
+        Store a document's text in the corpus blob, then parse its sections,
+        metadata and BM25 terms and index its chunks.
+        """
+        source, text = doc["source"], doc["text"]
+        offset, length = self.corpus.append(text)
+        doc_spans = [(int(start), int(end)) for start, end in doc_spans]
+        sections = parse_sections(text)
+        byte_offsets = utf8_offsets(text, [p for span in doc_spans for p in span]
+                                    + [p for section in sections for p in (section["start"], section["end"])])
+        chunk_bytes = []
+        for row, (start, end) in zip(rows, doc_spans):
+            chunk_bytes.append((offset + byte_offsets[start], byte_offsets[end] - byte_offsets[start]))
+            self.bm25.add(row, text[start:end])
         
-        print(f"Built FAISS index with {self.index.ntotal} vectors")
+        self._add_document(doc, rows, doc_spans, chunk_bytes, {
+            "source": source,
+            "hash": key,
+            "offset": offset,
+            "length": length,
+            "chars": len(text),
+            "metadata": extract_metadata(source, text),
+            "sections": [{
+                **section,
+                "offset": offset + byte_offsets[section["start"]],
+                "length": byte_offsets[section["end"]] - byte_offsets[section["start"]]
+            } for section in sections]
+        })
     
-    def search(self, query, k=3):
+    def _add_document(self, doc, rows, doc_spans, chunk_bytes, entry):
         """
-        Search for relevant documents given a query.
+        Create a document's chunks and record its metadata for O(1) lookup.
+        
+        Chunks and the retained document record hold byte ranges into the
+        blob instead of strings; text is decoded only when it is returned.
         
         Args:
-            query (str): Search query
-            k (int): Number of top results to return
+            doc (dict): The document; its 'metadata' overrides the extracted fields
+            rows (list): Chunk ids of its chunks
+            doc_spans (list): (start, end) character offsets of each chunk
+            chunk_bytes (list): (offset, length) of each chunk in the corpus blob
+            entry (dict): Corpus record with the document's 'hash', blob 'offset'
+                and 'length', 'chars', extracted 'metadata' and parsed 'sections'
+        """
+        source = doc["source"]
+        for row, (start, end), (offset, length) in zip(rows, doc_spans, chunk_bytes):
+            self.chunks[row] = {
+                "source": source,
+                "start": start,
+                "end": end,
+                "offset": offset,
+                "length": length
+            }
+        self.section_index.add(source, entry["sections"])
+        
+        metadata = {**entry["metadata"], **(doc.get("metadata") or {})}
+        record = {"source": source, "text": self.corpus.view(entry["offset"], entry["length"]), "metadata": metadata}
+        self.documents.append(record)
+        self._doc_rows[source] = rows
+        self._documents_by_source[source] = record
+        self._corpus_entries[source] = entry
+        self.document_info[source] = {
+            "id": self._next_doc_id,
+            "source": source,
+            "length": entry["chars"],
+            "bytes": entry["length"],
+            "hash": entry["hash"],
+            "chunk_count": len(rows),
+            "metadata": metadata
+        }
+        self.filter_index.add(rows, source, metadata)
+        self._next_doc_id += 1
+    
+    def _write_corpus(self, directory):
+        """
+        Save the corpus blob, chunk byte offsets, BM25 postings and parsed
+        documents into a store directory, in source order.
+        
+        Texts of removed documents are left out of the saved blob, so every
+        byte offset is shifted to the document's new position.
+        """
+        sources = sorted(self.sources)
+        entries = [self._corpus_entries[source] for source in sources]
+        offsets = self.corpus.save(os.path.join(directory, CORPUS_FILE),
+                                   [(entry["offset"], entry["length"]) for entry in entries])
+        chunk_bytes = np.zeros((len(self.embeddings), 2), dtype='int64')
+        documents = []
+        for source, entry, offset in zip(sources, entries, offsets):
+            shift = offset - entry["offset"]
+            for row in self._doc_rows[source]:
+                chunk_bytes[row] = (self.chunks[row]["offset"] + shift, self.chunks[row]["length"])
+            documents.append({
+                **entry,
+                "offset": offset,
+                "sections": [{**section, "offset": section["offset"] + shift} for section in entry["sections"]]
+            })
+        np.save(os.path.join(directory, CHUNK_BYTES_FILE), chunk_bytes)
+        self.bm25.save(os.path.join(directory, BM25_FILE))
+        with open(os.path.join(directory, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump(documents, f)
+    
+    def _write_corpus_delta(self, directory, removed_rows):
+        """
+        Save what changed in the corpus since the store's base into a delta
+        generation: the texts, chunk byte offsets and document records added
+        since, and the base documents and BM25 rows that are gone.
+        
+        Texts keep their offsets, as the tail blob continues the base one;
+        BM25 postings of the added rows are re-derived from them on load.
+        """
+        base = self._store_base
+        base_bytes = base["corpus_bytes"]
+        self.corpus.save(os.path.join(directory, CORPUS_TAIL_FILE), [(base_bytes, self.corpus.nbytes - base_bytes)])
+        base_rows, n_rows = self.index.base_rows, len(self.embeddings)
+        chunk_bytes = np.zeros((n_rows - base_rows, 2), dtype='int64')
+        for row in range(base_rows, n_rows):
+            chunk = self.chunks.get(row)
+            if chunk is not None:
+                chunk_bytes[row - base_rows] = (chunk["offset"], chunk["length"])
+        np.save(os.path.join(directory, CHUNK_BYTES_TAIL_FILE), chunk_bytes)
+        kept = {source for source, entry in base["entries"].items() if self._corpus_entries.get(source) is entry}
+        with open(os.path.join(directory, DOCUMENTS_TAIL_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "removed_sources": sorted(set(base["entries"]) - kept),
+                "removed_rows": [int(row) for row in removed_rows],
+                "documents": [self._corpus_entries[source] for source in sorted(self.sources) if source not in kept]
+            }, f)
+    
+    def _mark_saved(self, corpus_bytes, sources=None):
+        """
+        Record that the store's base generation holds this retriever's rows
+        up to the index's base_rows, the first corpus_bytes of its blob at the
+        same offsets, and the current records of the given documents, so
+        save() can write only what is added or removed after it.
+        
+        Args:
+            corpus_bytes (int): Length of the base blob
+            sources (list): Documents whose record is in the base; defaults to all
+        """
+        sources = self._corpus_entries if sources is None else sources
+        self._store_base = {
+            "corpus_bytes": corpus_bytes,
+            "entries": {source: self._corpus_entries[source] for source in sources}
+        }
+        self._unsaved = False
+    
+    def _set_vectors(self, matrix):
+        """Use a matrix (possibly a read-only memory map) as the base of the embedding matrix."""
+        self.embeddings = AppendOnlyMatrix(matrix)
+    
+    def _append_vectors(self, vectors):
+        """
+        Append vectors after the base rows, in a tail buffer grown
+        geometrically so repeated additions cost time proportional to their own size.
+        
+        Returns:
+            np.ndarray: int64 chunk ids (row numbers) of the appended vectors
+        """
+        return self.embeddings.append(encode_vectors(vectors, self.vector_dtype))
+    
+    def add_documents(self, documents):
+        """
+        Index new or changed documents without rebuilding the whole index.
+        
+        Documents whose source is already indexed replace the old version;
+        unchanged documents are skipped, and vectors are reused for any text
+        already in the corpus.
+        
+        Args:
+            documents (list): List of dictionaries with 'source' and 'text' keys
+            
+        Returns:
+            int: Number of chunks added
+        """
+        keyed = [(content_hash(doc["text"]), doc) for doc in documents]
+        with self._lock.read():
+            known = {info["hash"] for info in self.document_info.values()}
+            changed = [(key, doc) for key, doc in keyed if self._document_hash(doc["source"]) != key]
+        if not changed:
+            return 0
+        
+        # Encode before taking the write lock so searches keep running meanwhile
+        pending = {key: doc["text"] for key, doc in changed if key not in known}
+        embedded = self._embed_documents(list(pending.items())) if pending else {}
+        
+        with self._lock.write():
+            # Another update may have landed while encoding
+            changed = [(key, doc) for key, doc in changed if self._document_hash(doc["source"]) != key]
+            if not changed:
+                return 0
+            
+            self._unsaved = True
+            self._remove_sources([doc["source"] for _, doc in changed if doc["source"] in self._doc_rows])
+            
+            reusable = {}
+            for source, info in self.document_info.items():
+                reusable.setdefault(info["hash"], source)
+            missing = {key: doc["text"] for key, doc in changed if key not in embedded and key not in reusable}
+            if missing:
+                embedded.update(self._embed_documents(list(missing.items())))
+            
+            added = 0
+            for key, doc in changed:
+                source = doc["source"]
+                if key in embedded:
+                    doc_spans, vectors = embedded[key]
+                else:
+                    rows = self._doc_rows[reusable[key]]
+                    doc_spans = [(self.chunks[row]["start"], self.chunks[row]["end"]) for row in rows]
+                    vectors = decode_vectors(self.embeddings[rows])
+                
+                ids = self._append_vectors(vectors)
+                if len(ids):
+                    add_vectors(self.index, vectors, ids)
+                self._register_document(doc, key, ids.tolist(), doc_spans)
+                reusable.setdefault(key, source)
+                self.sources.append(source)
+                added += len(ids)
+            
+            print(f"Indexed {added} chunks from {len(changed)} documents")
+            return added
+    
+    def remove_documents(self, sources):
+        """
+        Remove documents from the index by source name.
+        
+        Args:
+            sources (list): Source filenames to remove; unknown names are ignored
+            
+        Returns:
+            int: Number of chunks removed
+        """
+        with self._lock.write():
+            removed = self._remove_sources(sources)
+            print(f"Removed {removed} chunks")
+            return removed
+    
+    def _remove_sources(self, sources):
+        """Drop documents' chunks from the index, BM25 and corpus lists."""
+        ids = []
+        for source in sources:
+            rows = self._doc_rows.pop(source, None)
+            if rows is None:
+                continue
+            self._documents_by_source.pop(source)
+            self._corpus_entries.pop(source)
+            self.document_info.pop(source)
+            self.section_index.remove(source)
+            self.filter_index.remove(rows)
+            ids.extend(rows)
+            for row in rows:
+                self.chunks.pop(row)
+                self.bm25.remove(row)
+        
+        if ids:
+            # Base rows are only masked, so they stay in the index saved with the store's base
+            remove_vectors(self.index, ids)
+            self._unsaved = True
+        
+        dropped = set(sources)
+        keep = [i for i, source in enumerate(self.sources) if source not in dropped]
+        self.documents = [self.documents[i] for i in keep]
+        self.sources = [self.sources[i] for i in keep]
+        return len(ids)
+    
+    def _document_hash(self, source):
+        info = self.document_info.get(source)
+        return info["hash"] if info else None
+    
+    def chunk_ids(self, source):
+        """Chunk ids of a document, or an empty list if it is not indexed."""
+        with self._lock.read():
+            return list(self._doc_rows.get(source, ()))
+    
+    def copy(self):
+        """
+        Independent copy of the retriever that can be updated while this one keeps serving.
+        
+        Chunk and document tables are copied. The vector matrix, the base of
+        the index, BM25 posting lists, filter bitmaps and section id lists are
+        shared, and either retriever copies only the parts it changes, so an
+        update costs time and memory in proportion to its own size. The
+        model, query cache and append-only corpus blob are shared.
+        
+        Returns:
+            RegulatoryRetriever: The copy, with its own lock and store handle
+        """
+        with self._lock.read():
+            clone = copy.copy(self)
+            clone._lock = ReadWriteLock()
+            clone.store = copy.copy(self.store)
+            clone.sources = list(self.sources)
+            clone.documents = list(self.documents)
+            clone.chunks = dict(self.chunks)
+            clone._doc_rows = dict(self._doc_rows)
+            clone._documents_by_source = dict(self._documents_by_source)
+            clone.document_info = dict(self.document_info)
+            clone._corpus_entries = dict(self._corpus_entries)
+            clone.bm25 = self.bm25.copy()
+            clone.section_index = self.section_index.copy()
+            clone.filter_index = self.filter_index.copy()
+            clone.embeddings = self.embeddings.copy()
+            clone.index = copy_index(self.index)
+            return clone
+    
+    def memory_footprint(self):
+        """
+        Report the memory held by vectors and the search index.
+        
+        Returns:
+            dict: Storage precision and byte sizes; memory-mapped embeddings
+                live in the shared OS page cache rather than process memory
+        """
+        index_bytes = index_memory_bytes(self.index)
+        base = self.index.base
+        if isinstance(base, NumpyIndex) and np.may_share_memory(base.vectors, self.embeddings.base):
+            # The NumPy index searches the embedding matrix in place
+            index_bytes -= base.vectors.nbytes
+        return {
+            "vector_dtype": self.vector_dtype,
+            "embedding_rows": len(self.embeddings),
+            "embeddings_bytes": int(self.embeddings.nbytes),
+            "embeddings_memory_mapped": isinstance(self.embeddings.base, np.memmap),
+            "corpus_bytes": int(self.corpus.nbytes),
+            "index_bytes": int(index_bytes),
+            "bytes_per_chunk": round((self.embeddings.nbytes + index_bytes) / max(len(self.chunks), 1), 1)
+        }
+    
+    def stats(self):
+        """Corpus size, index, cache and memory statistics."""
+        with self._lock.read():
+            return {
+                "documents_count": len(self.documents),
+                "chunks_count": len(self.chunks),
+                "embedding_dimension": int(self.embeddings.shape[1]),
+                "index_type": self.index_type,
+                "query_encoder": self.query_encoder,
+                "index_size": int(self.index.ntotal),
+                "query_cache": self.query_cache.stats(),
+                "memory": self.memory_footprint(),
+                "filter_values": self.filter_index.values(),
+                "sections": self.section_index.stats(),
+                "rerank_cache": self.reranker.cache.stats() if self.reranker else None
+            }
+    
+    def save(self, compact=False):
+        """
+        Persist the current corpus, vectors and index to the embedding store.
+        
+        Documents are listed in source order, as a restart loads them, so the
+        next start maps the store instead of rebuilding it. Rows stay where
+        incremental updates put them; each document's layout entry points at its own.
+        
+        Changes since the store's base generation are saved as a delta that
+        shares the base files: only the rows, texts and document records
+        added since are written, plus a new manifest. Once the rows added and
+        removed reach MAX_DELTA_FRACTION of the base, or with compact, a new
+        base is written instead, leaving out the texts of removed documents,
+        and this retriever switches to serving it. Nothing is written if
+        nothing changed since the last save or load.
+        
+        Args:
+            compact (bool): Write a new base even if the delta is small
+        """
+        with self._lock.read():
+            if not self._unsaved and not compact:
+                return
+            layout = []
+            for source in sorted(self.sources):
+                rows = self._doc_rows[source]
+                layout.append({
+                    "hash": self.document_info[source]["hash"],
+                    "offset": rows[0] if rows else 0,
+                    "count": len(rows)
+                })
+            n_rows = len(self.embeddings)
+            base_rows = self.index.base_rows
+            removed = np.flatnonzero(self.index.removed)
+            if not compact and self._store_base is not None \
+                    and n_rows - base_rows + len(removed) <= MAX_DELTA_FRACTION * base_rows:
+                written = self.store.write_delta(
+                    layout, self._spans(base_rows, n_rows), self.embeddings[base_rows:n_rows], self.index_type,
+                    lambda directory: self._write_corpus_delta(directory, removed))
+                if written:
+                    self._unsaved = False
+                    return
+            
+            # Fold everything into a new base, with a base index over every live row
+            index = self._new_index(n_rows) if self.index_type != "numpy" else None
+            spans = self._spans(0, n_rows)
+            mapped = self.store.write(layout, spans, self.embeddings, index.base if index else None,
+                                      self.index_type, write_corpus=self._write_corpus)
+            saved = self.store.read_corpus()
+        
+        with self._lock.write():
+            # The same rows and index, now backed by the new base
+            self._set_vectors(mapped)
+            self.index = index or self._new_index(n_rows)
+            if saved is None:
+                # Already superseded and removed by another writer; the next save writes a new base
+                self._store_base = None
+            elif os.path.getsize(saved["blob"]) != self.corpus.nbytes:
+                # Leaving out removed texts moved the others; switch to the saved corpus and its offsets
+                documents = [self._documents_by_source[source] for source in sorted(self.sources)]
+                self._load_chunks(documents, layout, spans, saved)
+                self.sources = [doc["source"] for doc in self.documents]
+            else:
+                self._mark_saved(self.corpus.nbytes)
+    
+    def _spans(self, start, stop):
+        """(start, end) character offsets of rows [start, stop); rows no longer in the corpus are zero."""
+        spans = np.zeros((stop - start, 2), dtype='int64')
+        for row in range(start, stop):
+            chunk = self.chunks.get(row)
+            if chunk is not None:
+                spans[row - start] = (chunk["start"], chunk["end"])
+        return spans
+    
+    def _get_model(self):
+        """Load the sentence transformer on first use."""
+        with self._model_lock:
+            if not hasattr(self, 'model'):
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_name)
+        return self.model
+    
+    def _get_query_encoder(self):
+        """
+        Return the encoder used for queries, loading the ONNX backend on first use.
+        
+        An ONNX model that fails its parity check is not retried: queries fall
+        back to the PyTorch model after a single warning.
+        """
+        if self.query_encoder == "torch":
+            return self._get_model()
+        with self._model_lock:
+            if not hasattr(self, 'onnx_encoder'):
+                try:
+                    self.onnx_encoder = load_onnx_encoder(self.model_name, self.onnx_model_dir)
+                except ParityError as e:
+                    print(f"Warning: {e}; falling back to the PyTorch query encoder")
+                    self.onnx_encoder = None
+                    self.query_encoder = "torch"
+        if self.onnx_encoder is None:
+            return self._get_model()
+        return self.onnx_encoder
+    
+    def warm_up(self):
+        """Load the query encoder and run a dummy encode so the first search is fast."""
+        try:
+            self._get_query_encoder().encode(["warm-up query"])
+            if self.reranker is not None:
+                self.reranker.warm_up()
+        finally:
+            self._warm.set()
+        print("Query encoder warmed up")
+    
+    def start_warmup(self):
+        """Warm up the query encoder in a background thread."""
+        thread = threading.Thread(target=self.warm_up, name="encoder-warmup", daemon=True)
+        thread.start()
+        return thread
+    
+    @property
+    def is_warm(self):
+        """Whether the query encoder has finished loading."""
+        return self._warm.is_set()
+    
+    def _embed_documents(self, pending):
+        """
+        Chunk and encode documents that are not in the cache.
+        
+        Args:
+            pending (list): List of (content_hash, text) tuples
+            
+        Returns:
+            dict: Mapping of content hash to a (spans, embeddings) tuple
+        """
+        spans = [chunk_text(text, self.chunk_size, self.chunk_overlap) for _, text in pending]
+        passages = [text[s:e] for (_, text), doc_spans in zip(pending, spans) for s, e in doc_spans]
+        
+        print(f"Encoding {len(passages)} chunks from {len(pending)} new or changed documents...")
+        model = self._get_model()
+        vectors = np.asarray(model.encode(passages, show_progress_bar=True), dtype='float32')
+        vectors = vectors.reshape(len(passages), model.get_sentence_embedding_dimension())
+        
+        entries = {}
+        offset = 0
+        for (key, _), doc_spans in zip(pending, spans):
+            entries[key] = (doc_spans, vectors[offset:offset + len(doc_spans)])
+            offset += len(doc_spans)
+        return entries
+    
+    def _build_index(self, removed=()):
+        """
+        Build the search index for the configured or automatically chosen strategy.
+        
+        Args:
+            removed (list): Base rows removed since the store's base was saved, see _new_index
+        """
+        self.index = self._new_index(len(self.embeddings.base), removed)
+        print(f"Built {self.index_type} index with {self.index.ntotal} vectors")
+    
+    def _new_index(self, base_rows, removed=(), base=None):
+        """
+        Index the first base_rows rows in a base index and add the rest on top of it.
+        
+        The base holds the live rows below base_rows plus the removed rows
+        given, which are then masked, so it matches the index saved with the
+        store's base generation; a base already read from the store can be
+        passed in instead of being built.
+        
+        Returns:
+            LayeredIndex: Index over every live chunk
+        """
+        ids = np.fromiter(sorted(self.chunks), dtype='int64', count=len(self.chunks))
+        removed = np.asarray(removed, dtype='int64')
+        base_ids = np.union1d(ids[ids < base_rows], removed)
+        if base is not None:
+            pass
+        elif self.index_type == "numpy":
+            # NumPy search runs over the base rows in place; rows not in the base are masked
+            base = build_index(self.embeddings[:base_rows], self.index_type, self.index_config)
+            dead = np.setdiff1d(np.arange(base_rows), base_ids)
+            if len(dead):
+                base.remove_ids(dead)
+        elif len(base_ids) == base_rows:
+            base = build_index(self.embeddings[:base_rows], self.index_type, self.index_config)
+        else:
+            base = build_index(self.embeddings[base_ids], self.index_type, self.index_config, ids=base_ids)
+        
+        index = LayeredIndex(base, base_rows)
+        index.remove_ids(removed)
+        n_rows = len(self.embeddings)
+        if n_rows > base_rows:
+            # Added ids must be contiguous, so rows no longer in the corpus are added and masked too
+            add_vectors(index, decode_vectors(self.embeddings[base_rows:n_rows]), np.arange(base_rows, n_rows))
+            dead = np.setdiff1d(np.arange(base_rows, n_rows), ids[ids >= base_rows])
+            if len(dead):
+                index.remove_ids(dead)
+        apply_search_params(index, self.index_config)
+        return index
+    
+    def _chunk_count(self):
+        return len(self.chunks)
+    
+    def _candidate_vectors(self, results):
+        """Decode the stored vectors of result chunks to float32."""
+        with self._lock.read():
+            return decode_vectors(self.embeddings[[result["chunk_id"] for result in results]])
+    
+    def _search_candidates(self, queries, k, mode, filters, query_embeddings=None):
+        """
+        Retrieve the top k candidates per query before any re-ranking or cutoff.
+        
+        Args:
+            query_embeddings (np.ndarray): Precomputed query vectors, e.g. shared
+                by every shard of a ShardedRetriever; encoded here if None
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+        if not queries:
+            return []
+        
+        # Encode outside the lock; a cold encoder must not hold up updates
+        q_emb = query_embeddings
+        if q_emb is None and mode != "bm25":
+            q_emb = self._encode_queries(queries)
+        
+        with self._lock.read():
+            depth = hybrid_depth(k, len(self.chunks)) if mode == "hybrid" else k
+            return [self._collect_results(*fuse_rankings(dense, keyword, k, mode))
+                    for dense, keyword in self._rank_candidates(queries, depth, mode, filters, q_emb)]
+    
+    def _rank_candidates(self, queries, depth, mode, filters, query_embeddings, bm25_stats=None):
+        """
+        Dense and BM25 rankings of each query, before rank fusion.
+        
+        Args:
+            depth (int): Candidates per ranking
+            query_embeddings (np.ndarray): Query vectors; unused in 'bm25' mode
+            bm25_stats (list): Per-query corpus statistics to score BM25 with (see
+                merge_term_stats), e.g. those of every shard; defaults to this index's own
             
         Returns:
-            list: List of dictionaries with search results
+            list: One (dense, bm25) pair per query, each a best-first list of
+                (chunk id, score) tuples; dense scores are squared L2 distances,
+                and a ranking the mode does not use is empty
         """
-        if not hasattr(self, 'model'):
-            self.model = SentenceTransformer(self.model_name)
+        with self._lock.read():
+            # Precomputed bitmap of the chunk ids the filters allow
+            allowed = self.filter_index.bitmap(filters) if filters else None
+            if allowed is not None and not allowed.any():
+                return [([], []) for _ in queries]
+            
+            dense = [[] for _ in queries]
+            if mode != "bm25":
+                # Search, with any filter applied inside the index
+                D, I = search_index(self.index, query_embeddings, depth, allowed)
+                dense = [[(int(idx), float(distance)) for idx, distance in zip(ids, distances)
+                          if int(idx) in self.chunks][:depth] for ids, distances in zip(I, D)]
+            
+            keyword = [[] for _ in queries]
+            if mode != "dense":
+                keyword = [self.bm25.search(query, depth, allowed, stats=stats)
+                           for query, stats in zip(queries, bm25_stats or [None] * len(queries))]
+            return list(zip(dense, keyword))
+    
+    def _bm25_term_stats(self, queries):
+        """BM25 corpus statistics of each query, for scoring across shards."""
+        with self._lock.read():
+            return [self.bm25.term_stats(query) for query in queries]
+    
+    def _encode_queries(self, queries):
+        """
+        Embed queries, serving repeats from the LRU cache and encoding all
+        misses in a single batch.
         
-        # Encode query
-        q_emb = self.model.encode([query])
-        q_emb = np.array(q_emb).astype('float32')
+        Returns:
+            np.ndarray: (len(queries), dim) float32 query embeddings
+        """
+        encoder_id = f"{self.model_name}:{self.query_encoder}"
+        vectors = [self.query_cache.get(encoder_id, query) for query in queries]
         
-        # Search
-        D, I = self.index.search(q_emb, k)
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(normalize_query(queries[i]), []).append(i)
         
+        if missing:
+            texts = list(missing)
+            encoded = np.asarray(self._get_query_encoder().encode(texts), dtype='float32')
+            for text, vector in zip(texts, encoded):
+                self.query_cache.put(encoder_id, text, vector)
+                for i in missing[text]:
+                    vectors[i] = vector
+        
+        return np.vstack(vectors).astype('float32')
+    
+    def _collect_results(self, ids, scores, score_type):
+        """
+        Turn one row of search output into result dictionaries.
+        
+        Args:
+            ids (list): Chunk ids, best first; padding and removed ids are skipped
+            scores (list): Score of each id
+            score_type (str): 'l2_distance' (lower is better), 'bm25' or 'rrf'
+        """
         results = []
-        for idx, distance in zip(I[0], D[0]):
-            if idx < len(self.documents):
+        for idx, score in zip(ids, scores):
+            chunk = self.chunks.get(int(idx))
+            if chunk is not None:
                 results.append({
-                    "source": self.sources[idx],
-                    "text": self.texts[idx][:1000],  # Limit text length for readability
-                    "score": float(distance),
-                    "full_text": self.texts[idx]
+                    "chunk_id": int(idx),
+                    "source": chunk["source"],
+                    "start": chunk["start"],
+                    "end": chunk["end"],
+                    "text": self.corpus.text(chunk["offset"], chunk["length"]),
+                    "score": float(score),
+                    "score_type": score_type
                 })
         
         return results
     
-    def get_document_by_source(self, source):
-        """Get a specific document by its source filename."""
-        for i, doc_source in enumerate(self.sources):
-            if doc_source == source:
-                return {
-                    "source": doc_source,
-                    "text": self.texts[i]
-                }
-        return None
+    def get_document_by_source(self, source, start=None, end=None):
+        """
+        Get a specific document, or a byte range of it, by its source filename.
+        
+        Args:
+            source (str): Source filename
+            start (int): First UTF-8 byte offset to return (default: start of document)
+            end (int): Byte offset to stop before (default: end of document)
+            
+        Returns:
+            dict or None: Document metadata and text, or None if the source is unknown
+        """
+        with self._lock.read():
+            doc = self._documents_by_source.get(source)
+            if doc is None:
+                return None
+            
+            result = dict(self.document_info[source])
+            view = doc["text"]
+            if start is None and end is None:
+                result["text"] = str(view)
+            else:
+                # Only the requested bytes are read from the corpus blob
+                start = 0 if start is None else max(0, start)
+                end = view.nbytes if end is None else min(end, view.nbytes)
+                result["range"] = {"start": start, "end": max(start, end)}
+                result["text"] = view.slice_bytes(start, end)
+            return result
+    
+    def list_documents(self):
+        """Return precomputed metadata for every indexed document."""
+        with self._lock.read():
+            return list(self.document_info.values())
+    
+    def _section_results(self, sections):
+        return [{
+            "source": section["source"],
+            "type": section["type"],
+            "key": section["key"],
+            "heading": section["heading"],
+            "start": section["start"],
+            "end": section["end"],
+            "text": self.corpus.text(section["offset"], section["length"])
+        } for section in sections]
+    
+    def row_sections(self, code):
+        """
+        Governing text for a COREP row, looked up in the section index
+        rather than searched for.
+        
+        Args:
+            code (str or int): Row code, e.g. '350'
+            
+        Returns:
+            list: Sections defining the row first, then sections whose heading names it
+        """
+        with self._lock.read():
+            return self._section_results(self.section_index.row(code))
+    
+    def article_sections(self, number):
+        """Full text of every indexed article with this number."""
+        with self._lock.read():
+            return self._section_results(self.section_index.article(number))
 
 if __name__ == "__main__":
     # Test the retriever
@@ -123,7 +1226,7 @@ if __name__ == "__main__":
         
         print(f"\nSearch results for: '{test_query}'")
         for i, result in enumerate(results, 1):
-            print(f"\n{i}. {result['source']} (score: {result['score']:.4f})")
+            print(f"\n{i}. {result['source']} [{result['start']}:{result['end']}] (score: {result['score']:.4f})")
             print(f"   {result['text'][:200]}...")
     else:
         print("No documents found. Please add regulatory documents to the reg_docs folder.")
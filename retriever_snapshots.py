@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+import threading
+import time
+
+
+class ReadWriteLock:
+    """
+    Lock shared by any number of readers or held by a single writer.
+
+    Searches read and incremental updates write, so an update never runs
+    while a search is walking the index. Waiting writers block new
+    readers, so a steady stream of searches cannot starve an update. Both
+    sides are reentrant per thread, and the writer may also read.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of the block."""
+        me = threading.get_ident()
+        depth = getattr(self._local, "depth", 0)
+        with self._cond:
+            if not depth and self._writer != me:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.depth = depth + 1
+        try:
+            yield
+        finally:
+            self._local.depth = depth
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of the block."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+            else:
+                if getattr(self._local, "depth", 0):
+                    raise RuntimeError("Cannot take the write lock while holding the read lock")
+                self._writers_waiting += 1
+                try:
+                    while self._writer is not None or self._readers:
+                        self._cond.wait()
+                finally:
+                    self._writers_waiting -= 1
+                self._writer = me
+                self._writer_depth = 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer_depth -= 1
+                if not self._writer_depth:
+                    self._writer = None
+                    self._cond.notify_all()
+
+
+class RetrieverSnapshots:
+    """
+    Blue/green holder for the live retriever.
+
+    Requests pin the current snapshot for their whole duration with
+    acquire(). A rebuilt retriever is swapped in atomically, after which
+    the previous snapshot is drained: swap() waits until no request is
+    still using it before returning it to the caller.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._generation = 0
+        self._in_flight = {}
+        self._cond = threading.Condition()
+
+    @property
+    def current(self):
+        """The live retriever, or None before the first successful build."""
+        return self._current
+
+    @property
+    def generation(self):
+        """Number of snapshots swapped in so far."""
+        return self._generation
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the current retriever for the duration of a request.
+
+        Yields:
+            RegulatoryRetriever or None: The snapshot to use throughout the request
+        """
+        with self._cond:
+            snapshot = self._current
+            if snapshot is not None:
+                self._in_flight[snapshot] = self._in_flight.get(snapshot, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                with self._cond:
+                    self._in_flight[snapshot] -= 1
+                    if not self._in_flight[snapshot]:
+                        del self._in_flight[snapshot]
+                        self._cond.notify_all()
+
+    def in_flight(self, snapshot=None):
+        """Number of requests currently using a snapshot (default: the live one)."""
+        with self._cond:
+            return self._in_flight.get(snapshot or self._current, 0)
+
+    def swap(self, new_snapshot, drain_timeout=30.0):
+        """
+        Make a fully built retriever live and drain the previous one.
+
+        Args:
+            new_snapshot (RegulatoryRetriever): Retriever to serve from now on
+            drain_timeout (float): Seconds to wait for in-flight requests on the old snapshot
+
+        Returns:
+            tuple: (previous snapshot or None, True if it drained within the timeout)
+        """
+        with self._cond:
+            old_snapshot = self._current
+            self._current = new_snapshot
+            self._generation += 1
+
+            if old_snapshot is None:
+                return None, True
+            deadline = time.monotonic() + drain_timeout
+            while self._in_flight.get(old_snapshot):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return old_snapshot, False
+                self._cond.wait(remaining)
+            return old_snapshot, True
@@ -0,0 +1,215 @@
+import re
+
+SECTION_TYPES = ("article", "section", "paragraph", "row")
+
+# Headings are short lines; a line such as "Article 26 of the CRR defines ..."
+# is a sentence, not a heading
+MAX_HEADING_LENGTH = 100
+
+ARTICLE_HEADING = re.compile(r"^(?:(?:CRR|CRD|PRA|EBA)\s+)?Article\s+(\d+)[A-Za-z]?\b(?!\()")
+SECTION_HEADING = re.compile(r"^(?:Section|Chapter|Part|Title|Annex)\s+([0-9IVXLC]+)\b")
+TOPIC_HEADING = re.compile(r"^[A-Z][^\n]{0,78}:$")
+NUMBERED_PARAGRAPH = re.compile(r"^(\d{1,2})\.\s+\S")
+ROW_DEFINITION = re.compile(r"^(?:[-*•]\s*)?Row\s+(\d{3})\s*[:–-]\s*\S")
+ROW_MENTION = re.compile(r"\bRow\s+(\d{3})\b")
+
+# Nesting depth of each section type; a heading closes every open section at
+# its own depth or deeper. Row definitions are single-line leaves.
+_LEVELS = {"article": 0, "section": 1, "paragraph": 2, "row": 3}
+
+
+def normalize_row(code):
+    """Canonical three-digit COREP row code, e.g. 10 or '10' -> '010'."""
+    text = str(code).strip()
+    if not text.isdigit():
+        raise ValueError(f"Invalid COREP row code '{code}'")
+    return text.zfill(3)
+
+
+def _classify(line):
+    """Return (section type, key) for a heading line, or None for body text."""
+    indented = line[:1].isspace()
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_HEADING_LENGTH:
+        return None
+
+    row = ROW_DEFINITION.match(stripped)
+    if row:
+        return "row", row.group(1)
+    if indented or stripped.startswith(("-", "*", "•")):
+        return None
+
+    article = ARTICLE_HEADING.match(stripped)
+    if article and not stripped.endswith("."):
+        return "article", int(article.group(1))
+    section = SECTION_HEADING.match(stripped)
+    if section:
+        return "section", section.group(1)
+    numbered = NUMBERED_PARAGRAPH.match(stripped)
+    if numbered:
+        return "paragraph", int(numbered.group(1))
+    if TOPIC_HEADING.match(stripped):
+        return "section", None
+    return None
+
+
+def parse_sections(text):
+    """
+    Split a regulatory document into typed, nested sections.
+
+    Recognised headings are article titles ('CRR Article 36 - ...'),
+    sections and topic headings ('Section 4: Regulatory Deductions',
+    'Validation Rules:'), numbered paragraphs ('1. Intangible assets
+    (Row 350):') and COREP row definitions ('- Row 350: Intangible
+    assets'). A section runs from its heading to the next heading at the
+    same or a higher level; row definitions cover their own line.
+
+    Args:
+        text (str): Full document text
+
+    Returns:
+        list: Section dictionaries with 'type', 'key', 'heading', 'start',
+            'end' (character offsets), 'parent' (position in the list or None)
+            and 'rows' (COREP row codes the section defines or names)
+    """
+    sections = []
+    open_sections = []  # positions in sections, outermost first
+    last_content_end = 0
+
+    def close(level):
+        while open_sections and _LEVELS[sections[open_sections[-1]]["type"]] >= level:
+            section = sections[open_sections.pop()]
+            section["end"] = max(last_content_end, section["heading_end"])
+
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        line_start, pos = pos, pos + len(line)
+        body = line.rstrip("\r\n")
+        if not body.strip():
+            continue
+        content_start = line_start + len(body) - len(body.lstrip())
+        content_end = line_start + len(body.rstrip())
+
+        kind = _classify(body)
+        if kind is not None:
+            section_type, key = kind
+            close(_LEVELS[section_type])
+            heading = body.strip()
+            if section_type == "row":
+                rows = [key]
+            else:
+                rows = sorted(set(ROW_MENTION.findall(heading)))
+            sections.append({
+                "type": section_type,
+                "key": key,
+                "heading": heading,
+                "start": content_start,
+                "end": content_end,
+                "heading_end": content_end,
+                "parent": open_sections[-1] if open_sections else None,
+                "rows": rows
+            })
+            if section_type != "row":
+                open_sections.append(len(sections) - 1)
+        last_content_end = content_end
+
+    close(0)
+    for section in sections:
+        del section["heading_end"]
+    return sections
+
+
+def _append(lookup, key, value):
+    lookup[key] = lookup.get(key, []) + [value]
+
+
+class SectionIndex:
+    """
+    Lookup of document sections by COREP row code and article number.
+
+    Row lookups return the sections that define a row first, then those
+    whose heading names it; article lookups return whole article sections.
+    Both are dictionary lookups, independent of corpus size.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self._by_source = {}
+        self._row_definitions = {}
+        self._row_mentions = {}
+        self._articles = {}
+        self._next_id = 0
+
+    def add(self, source, sections):
+        """
+        Index a document's sections, replacing any earlier version.
+
+        Args:
+            source (str): Document source name
+            sections (list): Section dictionaries from parse_sections, optionally
+                with extra fields (e.g. byte offsets) that are kept as they are
+        """
+        self.remove(source)
+        ids = []
+        for section in sections:
+            section_id = self._next_id
+            self._next_id += 1
+            self.sections[section_id] = {**section, "source": source}
+            ids.append(section_id)
+            # Id lists are replaced rather than appended to, so copies can share them
+            if section["type"] == "row":
+                _append(self._row_definitions, section["key"], section_id)
+            else:
+                for code in section["rows"]:
+                    _append(self._row_mentions, code, section_id)
+            if section["type"] == "article":
+                _append(self._articles, section["key"], section_id)
+        self._by_source[source] = ids
+
+    def remove(self, source):
+        """Drop a document's sections."""
+        ids = set(self._by_source.pop(source, ()))
+        if not ids:
+            return
+        for section_id in ids:
+            section = self.sections.pop(section_id)
+            keys = section["rows"] if section["type"] != "row" else [section["key"]]
+            lookup = self._row_definitions if section["type"] == "row" else self._row_mentions
+            for code in keys:
+                lookup[code] = [i for i in lookup.get(code, ()) if i not in ids]
+                if not lookup[code]:
+                    del lookup[code]
+            if section["type"] == "article":
+                remaining = [i for i in self._articles.get(section["key"], ()) if i not in ids]
+                if remaining:
+                    self._articles[section["key"]] = remaining
+                else:
+                    self._articles.pop(section["key"], None)
+
+    def copy(self):
+        """Copy that can be updated without affecting this index; id lists are shared."""
+        clone = SectionIndex()
+        clone.sections = dict(self.sections)
+        clone._by_source = dict(self._by_source)
+        clone._row_definitions = dict(self._row_definitions)
+        clone._row_mentions = dict(self._row_mentions)
+        clone._articles = dict(self._articles)
+        clone._next_id = self._next_id
+        return clone
+
+    def row(self, code):
+        """Sections defining or naming a COREP row, definitions first."""
+        code = normalize_row(code)
+        ids = self._row_definitions.get(code, []) + self._row_mentions.get(code, [])
+        return [self.sections[i] for i in ids]
+
+    def article(self, number):
+        """Article sections for an article number."""
+        return [self.sections[i] for i in self._articles.get(int(number), [])]
+
+    def stats(self):
+        return {
+            "sections": len(self.sections),
+            "rows": sorted(set(self._row_definitions) | set(self._row_mentions)),
+            "articles": sorted(self._articles)
+        }
@@ -0,0 +1,349 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import copy
+import threading
+
+import numpy as np
+
+from bm25 import merge_term_stats
+from metadata import extract_metadata
+from result_cutoff import DEFAULT_CUTOFF_CONFIG
+from retriever import SEARCH_MODES, SearchPipeline, fuse_rankings, hybrid_depth
+from retriever_snapshots import RetrieverSnapshots
+
+# Shard for documents whose metadata names no regulator, e.g. internal policies
+DEFAULT_SHARD = "internal"
+
+
+def shard_for(doc, shard_by="regulator"):
+    """Name of the shard a document belongs to, taken from its metadata."""
+    metadata = doc.get("metadata") or extract_metadata(doc["source"], doc["text"])
+    return str(metadata.get(shard_by) or DEFAULT_SHARD)
+
+
+def group_documents(documents, shard_by="regulator"):
+    """Split documents into per-shard lists, keeping corpus order within each shard."""
+    groups = {}
+    for doc in documents:
+        groups.setdefault(shard_for(doc, shard_by), []).append(doc)
+    return groups
+
+
+class ShardedRetriever(SearchPipeline):
+    """
+    Retriever over independent per-corpus shards (CRR, PRA, EBA, internal).
+
+    Each shard is a RegulatoryRetriever with its own embedding store and
+    index, held in its own RetrieverSnapshots so it can be rebuilt and
+    swapped without blocking queries to the others. Searches encode the
+    query once, fan out to every shard on a thread pool (FAISS releases
+    the GIL while searching) and fuse the per-shard rankings into one
+    candidate list before the shared re-ranking, MMR and cutoff stages.
+    """
+
+    def __init__(self, documents, factory, shard_by="regulator", max_workers=None, search_mode="dense",
+                 cutoff_config=None, mmr_lambda=None, reranker=None, rerank_top_n=20, rerank_budget_ms=150):
+        """
+        Args:
+            documents (list): List of dictionaries with 'source', 'text' and optional 'metadata'
+            factory (callable): factory(shard name, documents, model) returning a
+                RegulatoryRetriever; model is an already loaded SentenceTransformer or None
+            shard_by (str): Metadata field that assigns documents to shards
+            max_workers (int): Search threads; defaults to one per shard
+            search_mode (str): Default search mode: 'dense', 'bm25' or 'hybrid'
+            cutoff_config (dict): Default relevance threshold and adaptive-k policy
+            mmr_lambda (float): Default MMR trade-off; None disables re-ranking
+            reranker (CrossEncoderReranker): Optional cross-encoder applied to the merged candidates
+            rerank_top_n (int): Merged candidates handed to the re-ranker
+            rerank_budget_ms (float): Time allowed for re-ranking per request
+        """
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{search_mode}', expected one of {', '.join(SEARCH_MODES)}")
+        self.factory = factory
+        self.shard_by = shard_by
+        self.search_mode = search_mode
+        self.cutoff_config = self._resolve_cutoff(cutoff_config, DEFAULT_CUTOFF_CONFIG)
+        self.mmr_lambda = self._check_mmr_lambda(mmr_lambda)
+        self.reranker = reranker
+        self.rerank_top_n = rerank_top_n
+        self.rerank_budget_ms = rerank_budget_ms
+
+        self.shards = {}
+        self._shards_lock = threading.Lock()
+        self._rebuild_locks = {}
+        self._pinned = threading.local()
+        self._warm = threading.Event()
+
+        for name, docs in group_documents(documents, shard_by).items():
+            self.rebuild_shard(name, docs)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or max(len(self.shards), 1),
+                                            thread_name_prefix="shard-search")
+
+    def _shared_model(self):
+        """A sentence transformer already loaded by any shard, to avoid loading it again."""
+        for holder in list(self.shards.values()):
+            model = getattr(holder.current, "model", None)
+            if model is not None:
+                return model
+        return None
+
+    def rebuild_shard(self, name, documents, drain_timeout=30.0):
+        """
+        Build a shard from scratch and swap it in; other shards keep serving.
+
+        Args:
+            name (str): Shard name
+            documents (list): The shard's complete document list
+            drain_timeout (float): Seconds to wait for in-flight requests on the old shard
+
+        Returns:
+            bool: True if the previous version of the shard drained within the timeout
+        """
+        with self._shards_lock:
+            rebuild_lock = self._rebuild_locks.setdefault(name, threading.Lock())
+        with rebuild_lock:
+            shard = self.factory(name, documents, self._shared_model())
+            if self._warm.is_set():
+                shard.warm_up()
+            with self._shards_lock:
+                holder = self.shards.setdefault(name, RetrieverSnapshots())
+            _, drained = holder.swap(shard, drain_timeout=drain_timeout)
+            print(f"Shard '{name}' ready with {len(shard.chunks)} chunks")
+            return drained
+
+    def copy(self):
+        """
+        Independent copy whose shards can be updated while this retriever keeps serving.
+
+        Returns:
+            ShardedRetriever: Copy sharing the search pool, re-ranker and loaded model
+        """
+        clone = copy.copy(self)
+        clone.shards = {}
+        clone._shards_lock = threading.Lock()
+        clone._rebuild_locks = {}
+        clone._pinned = threading.local()
+        for name, shard in self._live_shards().items():
+            clone.shards[name] = RetrieverSnapshots()
+            clone.shards[name].swap(shard.copy())
+        return clone
+
+    def drop_shard(self, name):
+        """Stop serving a shard; in-flight requests finish on their pinned snapshot."""
+        with self._shards_lock:
+            return self.shards.pop(name, None) is not None
+
+    def _live_shards(self):
+        """Pinned shard retrievers for the current request, or the live ones outside a request."""
+        pinned = getattr(self._pinned, "shards", None)
+        if pinned is not None:
+            return pinned
+        with self._shards_lock:
+            holders = list(self.shards.items())
+        return {name: holder.current for name, holder in holders if holder.current is not None}
+
+    def search_many_with_diagnostics(self, queries, k=3, mode=None, filters=None, cutoff=None, mmr_lambda=None,
+                                     rerank=None):
+        """
+        Fan a batched search out to every shard and merge the results.
+
+        Every shard snapshot is pinned for the whole request, so a shard
+        rebuilt mid-request is only released once this search is done.
+
+        Returns:
+            tuple: (one result list per query, one diagnostics dict per query);
+                each result carries the name of its shard
+        """
+        with self._shards_lock:
+            holders = list(self.shards.items())
+        with ExitStack() as stack:
+            pinned = {}
+            for name, holder in holders:
+                shard = stack.enter_context(holder.acquire())
+                if shard is not None:
+                    pinned[name] = shard
+            self._pinned.shards = pinned
+            try:
+                results, diagnostics = super().search_many_with_diagnostics(
+                    queries, k=k, mode=mode, filters=filters, cutoff=cutoff, mmr_lambda=mmr_lambda, rerank=rerank
+                )
+            finally:
+                self._pinned.shards = None
+        for diag in diagnostics:
+            diag["shards_searched"] = len(pinned)
+        return results, diagnostics
+
+    def _search_candidates(self, queries, k, mode, filters):
+        """
+        Search all pinned shards concurrently and fuse into a global top k.
+
+        Dense candidates share one embedding space and merge by distance;
+        every shard scores BM25 with the statistics of the whole corpus, so
+        keyword candidates merge by score. Rank fusion then runs once over
+        the merged rankings, as it would over a single index.
+        """
+        mode = mode or self.search_mode
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}")
+        shards = self._live_shards()
+        if not queries or not shards:
+            return [[] for _ in queries]
+
+        # Encode once and share the vectors with every shard
+        query_embeddings = None if mode == "bm25" else next(iter(shards.values()))._encode_queries(queries)
+        bm25_stats = None
+        if mode != "dense":
+            per_shard = [shard._bm25_term_stats(queries) for shard in shards.values()]
+            bm25_stats = [merge_term_stats(stats) for stats in zip(*per_shard)]
+        depth = hybrid_depth(k, self._chunk_count()) if mode == "hybrid" else k
+        futures = {
+            name: self._executor.submit(shard._rank_candidates, queries, depth, mode, filters,
+                                        query_embeddings, bm25_stats)
+            for name, shard in shards.items()
+        }
+
+        merged = [([], []) for _ in queries]
+        for name, future in futures.items():
+            for (dense, keyword), (shard_dense, shard_keyword) in zip(merged, future.result()):
+                dense.extend(((name, idx), distance) for idx, distance in shard_dense)
+                keyword.extend(((name, idx), score) for idx, score in shard_keyword)
+
+        results = []
+        for dense, keyword in merged:
+            dense.sort(key=lambda hit: hit[1])
+            keyword.sort(key=lambda hit: hit[1], reverse=True)
+            keys, scores, score_type = fuse_rankings(dense[:depth], keyword[:depth], k, mode)
+            pool = []
+            for (name, idx), score in zip(keys, scores):
+                for result in shards[name]._collect_results([idx], [score], score_type):
+                    result["shard"] = name
+                    pool.append(result)
+            results.append(pool)
+        return results
+
+    def _chunk_count(self):
+        return sum(len(shard.chunks) for shard in self._live_shards().values())
+
+    def _candidate_vectors(self, results):
+        """Gather stored vectors of merged results from the shards that own them."""
+        shards = self._live_shards()
+        return np.vstack([shards[result["shard"]]._candidate_vectors([result]) for result in results])
+
+    @property
+    def documents(self):
+        return [doc for shard in self._live_shards().values() for doc in shard.documents]
+
+    @property
+    def document_info(self):
+        info = {}
+        for shard in self._live_shards().values():
+            info.update(shard.document_info)
+        return info
+
+    def _shard_of_source(self, source):
+        for name, shard in self._live_shards().items():
+            if source in shard.document_info:
+                return name, shard
+        return None, None
+
+    def chunk_ids(self, source):
+        """Chunk ids of a document within its shard."""
+        _, shard = self._shard_of_source(source)
+        return shard.chunk_ids(source) if shard is not None else []
+
+    def row_sections(self, code):
+        """Governing text for a COREP row from every shard, tagged with its shard."""
+        sections = [{**section, "shard": name}
+                    for name, shard in self._live_shards().items() for section in shard.row_sections(code)]
+        # Keep row definitions ahead of sections that only name the row
+        return sorted(sections, key=lambda section: section["type"] != "row")
+
+    def article_sections(self, number):
+        """Article text from every shard, tagged with its shard."""
+        return [{**section, "shard": name}
+                for name, shard in self._live_shards().items() for section in shard.article_sections(number)]
+
+    def list_documents(self):
+        """Return precomputed metadata for every indexed document, tagged with its shard."""
+        return [{**info, "shard": name}
+                for name, shard in self._live_shards().items() for info in shard.list_documents()]
+
+    def get_document_by_source(self, source, start=None, end=None):
+        """Get a document, or a byte range of it, from whichever shard holds it."""
+        name, shard = self._shard_of_source(source)
+        if shard is None:
+            return None
+        return {**shard.get_document_by_source(source, start=start, end=end), "shard": name}
+
+    def add_documents(self, documents):
+        """
+        Route new or changed documents to their shards, creating shards as needed.
+
+        Returns:
+            int: Number of chunks added
+        """
+        added = 0
+        for name, docs in group_documents(documents, self.shard_by).items():
+            # A document whose metadata changed shard is removed from the old one
+            for doc in docs:
+                owner, shard = self._shard_of_source(doc["source"])
+                if shard is not None and owner != name:
+                    shard.remove_documents([doc["source"]])
+            shard = self._live_shards().get(name)
+            if shard is None:
+                self.rebuild_shard(name, docs)
+                added += len(self.shards[name].current.chunks)
+            else:
+                added += shard.add_documents(docs)
+        return added
+
+    def remove_documents(self, sources):
+        """Remove documents by source name from the shards that hold them."""
+        removed = 0
+        for source in sources:
+            _, shard = self._shard_of_source(source)
+            if shard is not None:
+                removed += shard.remove_documents([source])
+        return removed
+
+    def save(self):
+        """Persist every shard to its embedding store."""
+        for shard in self._live_shards().values():
+            shard.save()
+
+    def warm_up(self):
+        """Load the query encoder once and share it with every shard."""
+        shards = list(self._live_shards().values())
+        try:
+            if self.reranker is not None:
+                self.reranker.warm_up()
+            if shards:
+                shards[0].warm_up()
+                model = getattr(shards[0], "model", None)
+                for shard in shards[1:]:
+                    if model is not None and not hasattr(shard, "model"):
+                        shard.model = model
+                    shard.warm_up()
+        finally:
+            self._warm.set()
+
+    def start_warmup(self):
+        """Warm up the query encoder in a background thread."""
+        thread = threading.Thread(target=self.warm_up, name="encoder-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def is_warm(self):
+        return self._warm.is_set()
+
+    def stats(self):
+        """Corpus size and per-shard index statistics."""
+        shards = self._live_shards()
+        return {
+            "documents_count": sum(len(shard.documents) for shard in shards.values()),
+            "chunks_count": sum(len(shard.chunks) for shard in shards.values()),
+            "shard_by": self.shard_by,
+            "shards": {name: shard.stats() for name, shard in shards.items()},
+            "rerank_cache": self.reranker.cache.stats() if self.reranker else None
+        }
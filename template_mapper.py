@@ -49,6 +49,28 @@ def map_to_template(data: Dict[str, Any]) -> List[Tuple[str, str, Any]]:
     
     return rows
 
+def attach_governing_sections(data: Dict[str, Any], governing_text: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Reference the regulatory sections that govern each reported row.
+    
+    Args:
+        data (dict): Structured COREP output; components with a 'corep_row' get
+            a 'governing_sections' list of "source: heading" references
+        governing_text (dict): Row code -> sections from the section index
+        
+    Returns:
+        dict: The same structured output, updated in place
+    """
+    for tier in data.get("own_funds", {}).values():
+        if not isinstance(tier, dict):
+            continue
+        for component in tier.values():
+            if isinstance(component, dict) and component.get("corep_row") in governing_text:
+                component["governing_sections"] = [
+                    f"{section['source']}: {section['heading']}" for section in governing_text[component["corep_row"]]
+                ]
+    return data
+
 def format_template_rows(rows: List[Tuple[str, str, Any]], currency: str = "GBP") -> List[Dict[str, Any]]:
     """
     Format template rows with proper currency formatting.
@@ -0,0 +1,152 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_store import BM25_FILE, CORPUS_FILE, DOCUMENTS_FILE, EMBEDDINGS_FILE, EMBEDDINGS_TAIL_FILE
+from retriever import SEARCH_MODES, RegulatoryRetriever
+from tests.test_retriever_concurrency import HashingEncoder, make_documents
+
+
+def make_unicode_documents(count):
+    return [{"source": f"eba_{i}.txt",
+             "text": f"EBA Guidelines {i}\n\nRow {i:03d}: Überleitung of own funds – €{i} million. " * 20}
+            for i in range(count)]
+
+
+class SavedCorpusTest(unittest.TestCase):
+    """A restart must map the saved corpus and serve exactly what a rebuild would."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="corpus_test_")
+        self.encoder = HashingEncoder()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def retriever(self, documents):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return RegulatoryRetriever(documents, cache_dir=self.cache_dir, model=self.encoder)
+
+    def state(self, retriever):
+        searches = [[(r["source"], r["start"], r["score"], r["text"])
+                     for r in retriever.search("row 003 own funds deduction", k=5, mode=mode)]
+                    for mode in SEARCH_MODES]
+        # A restart loads documents in source order; a live retriever lists added ones last
+        texts = [retriever.get_document_by_source(source)["text"] for source in sorted(retriever.sources)]
+        sections = [(s["source"], s["text"]) for s in retriever.row_sections("003")]
+        # Document ids number documents in load order, and are reassigned on every start
+        info = sorted(({key: value for key, value in doc.items() if key != "id"} for doc in retriever.list_documents()),
+                      key=lambda doc: doc["source"])
+        return searches, texts, sections, info
+
+    def saved_corpus(self, retriever):
+        return os.path.join(retriever.cache_dir, retriever.store.generation, DOCUMENTS_FILE)
+
+    def test_restart_loads_saved_corpus(self):
+        documents = make_documents(6) + make_unicode_documents(6)
+        built = self.retriever(documents)
+        self.assertTrue(os.path.exists(self.saved_corpus(built)))
+
+        restarted = self.retriever(documents)
+        self.assertEqual(restarted.corpus._base_size, restarted.corpus.nbytes)
+        self.assertEqual(self.state(restarted), self.state(built))
+
+    def test_saved_corpus_leaves_out_removed_documents(self):
+        documents = make_documents(4) + make_unicode_documents(4)
+        retriever = self.retriever(documents)
+        retriever.remove_documents(["eba_0.txt", "doc_1.txt"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            retriever.add_documents(make_unicode_documents(6)[4:])
+            before = self.state(retriever)
+            retriever.save(compact=True)
+
+        # The retriever switches to the compacted corpus it saved
+        self.assertEqual(retriever.corpus._base_size, retriever.corpus.nbytes)
+        self.assertEqual(self.state(retriever), before)
+        current = [{"source": doc["source"], "text": str(doc["text"])} for doc in retriever.documents]
+        restarted = self.retriever(current)
+        self.assertEqual(restarted.corpus.nbytes, retriever.corpus.nbytes)
+        self.assertEqual(self.state(restarted), before)
+
+    def test_update_saves_delta_on_shared_base(self):
+        retriever = self.retriever(make_documents(40))
+        base = os.path.join(retriever.cache_dir, retriever.store.generation)
+        inodes = {name: os.stat(os.path.join(base, name)).st_ino for name in (EMBEDDINGS_FILE, CORPUS_FILE, BM25_FILE)}
+        with contextlib.redirect_stdout(io.StringIO()):
+            retriever.remove_documents(["doc_2.txt"])
+            retriever.add_documents([{"source": "doc_5.txt", "text": "Row 003: replaced guidance. " * 20}])
+            added = retriever.chunk_ids("doc_5.txt")
+            retriever.save()
+
+        delta = os.path.join(retriever.cache_dir, retriever.store.generation)
+        self.assertNotEqual(delta, base)
+        self.assertEqual({name: os.stat(os.path.join(delta, name)).st_ino for name in inodes}, inodes)
+        self.assertEqual(len(np.load(os.path.join(delta, EMBEDDINGS_TAIL_FILE))), len(added))
+
+        current = [{"source": doc["source"], "text": str(doc["text"])} for doc in retriever.documents]
+        restarted = self.retriever(current)
+        self.assertEqual(restarted.store.generation, retriever.store.generation)
+        self.assertEqual(restarted.corpus._base_size, restarted.corpus.nbytes)
+        self.assertEqual(self.state(restarted), self.state(retriever))
+
+        # A delta on top of the loaded delta still shares the original base
+        with contextlib.redirect_stdout(io.StringIO()):
+            restarted.remove_documents(["doc_7.txt"])
+            restarted.save()
+        saved = os.path.join(restarted.cache_dir, restarted.store.generation, EMBEDDINGS_FILE)
+        self.assertEqual(os.stat(saved).st_ino, inodes[EMBEDDINGS_FILE])
+        current = [{"source": doc["source"], "text": str(doc["text"])} for doc in restarted.documents]
+        self.assertEqual(self.state(self.retriever(current)), self.state(restarted))
+
+    def test_restart_after_update_maps_saved_store(self):
+        retriever = self.retriever(make_documents(4))
+        with contextlib.redirect_stdout(io.StringIO()):
+            retriever.add_documents([{"source": "AAA_new.txt", "text": "Row 003: newly added guidance. " * 20}])
+            retriever.save()
+
+        current = [{"source": doc["source"], "text": str(doc["text"])} for doc in retriever.documents]
+        restarted = self.retriever(current)
+        self.assertEqual(restarted.store.generation, retriever.store.generation)
+        self.assertGreater(restarted.corpus._base_size, 0)
+        self.assertEqual(self.state(restarted), self.state(retriever))
+
+    def test_saved_corpus_with_outdated_labels_is_reparsed(self):
+        documents = make_documents(3) + [{"source": "CRD_Article_92.txt", "text": "CRD Article 92\n\nOwn funds. " * 20}]
+        built = self.retriever(documents)
+        path = self.saved_corpus(built)
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        for doc in saved:
+            if doc["source"].startswith("CRD"):
+                # Written when CRD files were labelled with the CRR regulator
+                doc["metadata"]["regulator"] = "CRR"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(saved, f)
+
+        restarted = self.retriever(documents)
+        self.assertEqual(restarted.get_document_by_source("CRD_Article_92.txt")["metadata"]["regulator"], "CRD")
+        self.assertEqual(self.state(restarted), self.state(built))
+        with open(self.saved_corpus(restarted), encoding="utf-8") as f:
+            self.assertEqual({doc["source"]: doc["metadata"]["regulator"] for doc in json.load(f)}["CRD_Article_92.txt"],
+                             "CRD")
+
+    def test_store_without_corpus(self):
+        # e.g. written by ingest.py: rebuilt from the documents once, then saved
+        documents = make_documents(3) + make_unicode_documents(3)
+        built = self.retriever(documents)
+        os.remove(self.saved_corpus(built))
+
+        rebuilt = self.retriever(documents)
+        self.assertEqual(rebuilt.corpus._base_size, 0)
+        self.assertTrue(os.path.exists(self.saved_corpus(rebuilt)))
+        self.assertEqual(self.state(self.retriever(documents)), self.state(built))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from embedding_store import EmbeddingStore, store_key
+
+
+def snapshot(n_rows, seed):
+    vectors = np.random.default_rng(seed).standard_normal((n_rows, 8)).astype("float32")
+    spans = np.stack([np.arange(n_rows) * 10, np.arange(n_rows) * 10 + 10], axis=1)
+    return [{"hash": f"doc-{seed}", "offset": 0, "count": n_rows}], spans, vectors
+
+
+class SharedCacheDirTest(unittest.TestCase):
+    """Two snapshots writing to one cache directory must not see each other's files."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="store_test_")
+        self.key = store_key("test-model", 800, 150, "float32")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_interleaved_writes(self):
+        rebuilt, live = EmbeddingStore(self.cache_dir, self.key), EmbeddingStore(self.cache_dir, self.key)
+        layout, spans, vectors = snapshot(5, seed=1)
+        mapped = rebuilt.write(layout, spans, vectors, None, "numpy")
+
+        # The live snapshot's background save lands right after the rebuild's write
+        live_layout, live_spans, live_vectors = snapshot(7, seed=2)
+        live.write(live_layout, live_spans, live_vectors, None, "numpy")
+
+        np.testing.assert_array_equal(mapped, vectors)
+        reader = EmbeddingStore(self.cache_dir, self.key)
+        self.assertEqual(reader.load_manifest()["documents"], live_layout)
+        np.testing.assert_array_equal(reader.read_embeddings(), live_vectors)
+        np.testing.assert_array_equal(reader.read_spans(), live_spans)
+
+    def test_superseded_generations_are_removed(self):
+        store = EmbeddingStore(self.cache_dir, self.key)
+        for seed in range(3):
+            store.write(*snapshot(4, seed), None, "numpy")
+        generations = [name for name in os.listdir(self.cache_dir) if name != "manifest.json"]
+        self.assertEqual(generations, [store.generation])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+import numpy as np
+
+from index_backends import AppendOnlyMatrix, LayeredIndex, NumpyIndex, build_index, search_index
+
+
+def random_vectors(n, seed):
+    return np.random.default_rng(seed).standard_normal((n, 8)).astype("float32")
+
+
+class NumpyIndexAppendTest(unittest.TestCase):
+
+    def test_appends_grow_buffers_geometrically(self):
+        index = NumpyIndex(random_vectors(4, seed=0))
+        reallocations = 0
+        for step in range(64):
+            buffer = index._vectors
+            index.add_with_ids(random_vectors(1, seed=step + 1), [index.vectors.shape[0]])
+            reallocations += index._vectors is not buffer
+        self.assertEqual(index.ntotal, 68)
+        self.assertLessEqual(reallocations, 6)
+
+        _, ids = index.search(index.vectors[[10, 67]], 1)
+        self.assertEqual(ids[:, 0].tolist(), [10, 67])
+
+    def test_copy_and_original_append_independently(self):
+        index = NumpyIndex(random_vectors(4, seed=0))
+        index.add_with_ids(random_vectors(1, seed=1), [4])
+        clone = index.copy()
+        clone.add_with_ids(random_vectors(2, seed=2), [5, 6])
+        clone.remove_ids([0])
+        index.add_with_ids(random_vectors(1, seed=3), [5])
+
+        self.assertEqual((index.ntotal, clone.ntotal), (6, 6))
+        np.testing.assert_array_equal(clone.vectors[5], random_vectors(2, seed=2)[0])
+        np.testing.assert_array_equal(index.vectors[5], random_vectors(1, seed=3)[0])
+        self.assertFalse(index.removed[0])
+
+
+class LayeredIndexTest(unittest.TestCase):
+
+    def test_matches_exact_search_after_updates(self):
+        vectors = random_vectors(40, seed=0)
+        for index_type in ("numpy", "flat", "hnsw"):
+            with self.subTest(index_type=index_type):
+                index = LayeredIndex(build_index(vectors[:30], index_type), 30)
+                index.add_with_ids(vectors[30:], np.arange(30, 40))
+                index.remove_ids([3, 31])
+                live = np.setdiff1d(np.arange(40), [3, 31])
+
+                allowed = np.zeros(40, dtype=bool)
+                allowed[::2] = True
+                for mask in (None, allowed):
+                    expected = live if mask is None else live[mask[live]]
+                    exact = NumpyIndex(vectors[expected])
+                    _, truth = exact.search(vectors[:5], 4)
+                    _, ids = search_index(index, vectors[:5], 4, mask)
+                    np.testing.assert_array_equal(ids, expected[truth])
+                self.assertEqual(index.ntotal, 38)
+
+    def test_copies_share_the_base(self):
+        index = LayeredIndex(build_index(random_vectors(10, seed=0), "flat"), 10)
+        clone = index.copy()
+        clone.remove_ids([0])
+        clone.add_with_ids(random_vectors(1, seed=1), [10])
+
+        self.assertIs(clone.base, index.base)
+        self.assertEqual((index.ntotal, clone.ntotal), (10, 10))
+        self.assertFalse(index.removed[0])
+        self.assertEqual(index.search(random_vectors(10, seed=0)[:1], 1)[1][0, 0], 0)
+
+
+class AppendOnlyMatrixTest(unittest.TestCase):
+
+    def test_appends_leave_the_base_and_copies_alone(self):
+        base = random_vectors(4, seed=0)
+        base.flags.writeable = False
+        matrix = AppendOnlyMatrix(base)
+        matrix.append(random_vectors(2, seed=1))
+        clone = matrix.copy()
+        clone.append(random_vectors(1, seed=2))
+        matrix.append(random_vectors(1, seed=3))
+
+        self.assertIs(clone.base, base)
+        self.assertEqual((len(matrix), len(clone)), (7, 7))
+        np.testing.assert_array_equal(matrix[[1, 5, 6]], np.vstack([base[1], random_vectors(2, seed=1)[1],
+                                                                    random_vectors(1, seed=3)[0]]))
+        np.testing.assert_array_equal(clone[6], random_vectors(1, seed=2)[0])
+        np.testing.assert_array_equal(np.asarray(matrix)[:4], base)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from chunker import chunk_text
+from embedding_store import EmbeddingStore, store_key
+from ingest import ingest_corpus
+from retriever import RegulatoryRetriever
+from tests.test_retriever_concurrency import HashingEncoder, make_documents
+
+
+class RecordingEncoder(HashingEncoder):
+    """Stands in for ingest._Encoder and logs each call into a shared event list."""
+
+    events = []
+    fail_after = None
+
+    def __init__(self, model_name, processes):
+        pass
+
+    def encode(self, texts, **kwargs):
+        if RecordingEncoder.fail_after is not None and self.calls() >= RecordingEncoder.fail_after:
+            raise RuntimeError("encoder died")
+        self.events.append(("encode", len(texts)))
+        return super().encode(texts)
+
+    def calls(self):
+        return sum(event == "encode" for event, _ in self.events)
+
+    def close(self):
+        pass
+
+
+class StreamingIngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="ingest_test_")
+        RecordingEncoder.events = []
+        RecordingEncoder.fail_after = None
+        self.documents = make_documents(12)
+        self.patch = mock.patch("ingest._Encoder", RecordingEncoder)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stream(self):
+        # Completion order of the threaded loader is not the sorted order
+        for doc in reversed(self.documents):
+            RecordingEncoder.events.append(("read", doc["source"]))
+            yield doc
+
+    def ingest(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ingest_corpus(self.stream(), cache_dir=self.cache_dir, model_name="test-model", batch_size=8)
+
+    def test_encodes_while_reading(self):
+        summary = self.ingest()
+        kinds = [event for event, _ in RecordingEncoder.events]
+        self.assertLess(kinds.index("encode"), len(kinds) - 1 - kinds[::-1].index("read"))
+        self.assertEqual(summary["encoded"], summary["chunks"])
+
+        store = EmbeddingStore(self.cache_dir, store_key("test-model", 800, 150, "float32"))
+        ordered = sorted(self.documents, key=lambda doc: doc["source"])
+        passages = [doc["text"][s:e] for doc in ordered for s, e in chunk_text(doc["text"])]
+        self.assertEqual(len(store.load_manifest()["documents"]), len(ordered))
+        np.testing.assert_allclose(store.read_embeddings(), HashingEncoder().encode(passages), rtol=1e-6)
+
+    def test_resumes_without_encoding_finished_documents(self):
+        RecordingEncoder.fail_after = 2
+        self.assertRaises(RuntimeError, self.ingest)
+        encoded_before = sum(count for event, count in RecordingEncoder.events if event == "encode")
+
+        RecordingEncoder.fail_after = None
+        RecordingEncoder.events = []
+        summary = self.ingest()
+        self.assertEqual(summary["encoded"], summary["chunks"] - encoded_before)
+        self.assertEqual(self.ingest()["encoded"], 0)
+
+    def test_does_not_resume_into_newer_store_generation(self):
+        RecordingEncoder.fail_after = 2
+        self.assertRaises(RuntimeError, self.ingest)
+
+        # Another writer publishes a new generation before the job is restarted
+        RecordingEncoder.fail_after = None
+        with contextlib.redirect_stdout(io.StringIO()):
+            RegulatoryRetriever(self.documents[:3], model_name="test-model", cache_dir=self.cache_dir,
+                                model=HashingEncoder())
+        summary = self.ingest()
+        stored = sum(len(chunk_text(doc["text"])) for doc in self.documents[:3])
+        self.assertEqual(summary["reused"], stored)
+        self.assertEqual(summary["encoded"], summary["chunks"] - stored)
+
+    def test_shards_into_subdirectories(self):
+        self.documents = make_documents(5, prefix="CRR") + make_documents(4, prefix="PRA")
+        with contextlib.redirect_stdout(io.StringIO()):
+            summary = ingest_corpus(self.stream(), cache_dir=self.cache_dir, model_name="test-model",
+                                    batch_size=8, shard_by="regulator")
+        self.assertEqual({name: part["documents"] for name, part in summary["shards"].items()}, {"CRR": 5, "PRA": 4})
+        self.assertEqual(summary["documents"], 9)
+
+        for name in ("CRR", "PRA"):
+            shard_docs = [doc for doc in self.documents if doc["source"].startswith(name)]
+            encoder = mock.Mock(wraps=HashingEncoder())
+            with contextlib.redirect_stdout(io.StringIO()):
+                retriever = RegulatoryRetriever(shard_docs, model_name="test-model",
+                                                cache_dir=os.path.join(self.cache_dir, name), model=encoder)
+            encoder.encode.assert_not_called()
+            self.assertEqual(retriever.sources, sorted(doc["source"] for doc in shard_docs))
+
+    def test_retriever_reads_ingested_store_from_stream(self):
+        self.ingest()
+        encoder = mock.Mock(wraps=HashingEncoder())
+        with contextlib.redirect_stdout(io.StringIO()):
+            retriever = RegulatoryRetriever(self.stream(), model_name="test-model", cache_dir=self.cache_dir,
+                                            model=encoder)
+        encoder.encode.assert_not_called()
+        self.assertEqual(retriever.sources, sorted(doc["source"] for doc in self.documents))
+        self.assertIsInstance(retriever.embeddings.base, np.memmap)
+
+
+if __name__ == "__main__":
+    unittest.main()
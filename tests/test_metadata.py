@@ -0,0 +1,49 @@
+import unittest
+
+from metadata import MetadataFilterIndex, extract_metadata, labels_outdated
+
+
+class MetadataFilterIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = MetadataFilterIndex()
+        for doc in range(6):
+            self.index.add(list(range(doc * 4, doc * 4 + 4)), f"doc_{doc}.txt",
+                           {"regulator": "CRR" if doc % 2 else "PRA", "doc_type": "regulation", "article": doc})
+
+    def rows(self, **filters):
+        return self.index.bitmap(filters).nonzero()[0].tolist()
+
+    def test_source_filter(self):
+        self.assertEqual(self.rows(source="doc_1.txt"), [4, 5, 6, 7])
+        self.assertEqual(self.rows(source=["doc_1.txt", "doc_2.txt", "unknown.txt"], regulator="CRR"), [4, 5, 6, 7])
+        self.assertEqual(self.rows(source="unknown.txt"), [])
+
+    def test_removed_and_readded_source(self):
+        self.index.remove([4, 5, 6, 7])
+        self.assertEqual(self.rows(source="doc_1.txt"), [])
+        self.index.add([24, 25], "doc_1.txt", {"regulator": "CRR"})
+        self.assertEqual(self.rows(source="doc_1.txt"), [24, 25])
+
+    def test_memory_does_not_grow_per_source(self):
+        # One bitmap per regulator and document type; sources share a single code column
+        self.assertEqual(sum(len(values) for values in self.index.bitmaps.values()), 3)
+        self.assertEqual(self.index.values(), {"regulator": ["CRR", "PRA"], "doc_type": ["regulation"]})
+
+
+class ExtractMetadataTest(unittest.TestCase):
+
+    def test_directive_and_regulation_are_separate_regulators(self):
+        crd = extract_metadata("CRD_Article_92.txt", "Capital Requirements Directive\n\nArticle 92")
+        crr = extract_metadata("CRR_Article_36.txt", "Capital Requirements Regulation\n\nArticle 36")
+        self.assertEqual((crd["regulator"], crd["doc_type"]), ("CRD", "directive"))
+        self.assertEqual((crr["regulator"], crr["doc_type"]), ("CRR", "regulation"))
+
+    def test_labels_outdated(self):
+        self.assertTrue(labels_outdated("CRD_Article_92.txt", {"regulator": "CRR", "doc_type": "directive"}))
+        self.assertFalse(labels_outdated("CRD_Article_92.txt", {"regulator": "CRD", "doc_type": "directive"}))
+        self.assertFalse(labels_outdated("policy.txt", {"regulator": "CRR", "doc_type": "regulation"}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from onnx_encoder import (PARITY_FILE, PARITY_MIN_COSINE, PARITY_SAMPLE_TEXTS, QUANTIZED_MODEL_FILE, ParityError,
+                          check_parity, export_inputs, load_onnx_encoder)
+from retriever import RegulatoryRetriever
+from tests.test_retriever_concurrency import HashingEncoder, make_documents
+
+EXPORT_DEPENDENCIES = ("torch", "transformers", "onnxruntime", "sentence_transformers")
+
+
+def bert_forward(input_ids=None, attention_mask=None, token_type_ids=None, position_ids=None,
+                 head_mask=None, inputs_embeds=None):
+    """Leading parameters of transformers' BertModel.forward."""
+
+
+class ShuffledEncoder(HashingEncoder):
+    """Encoder whose embeddings no longer line up with the reference."""
+
+    def encode(self, texts, **kwargs):
+        return np.roll(super().encode(texts), 1, axis=1)
+
+
+class ExportInputsTest(unittest.TestCase):
+
+    def test_follows_forward_order(self):
+        # BERT tokenizers return token_type_ids before attention_mask
+        sample = {"input_ids": 0, "token_type_ids": 0, "attention_mask": 0}
+        self.assertEqual(export_inputs(bert_forward, sample), ["input_ids", "attention_mask", "token_type_ids"])
+
+    def test_rejects_inputs_that_cannot_be_passed_positionally(self):
+        self.assertRaises(ValueError, export_inputs, bert_forward, {"input_ids": 0, "token_type_ids": 0})
+        self.assertRaises(ValueError, export_inputs, bert_forward, {"input_ids": 0, "pixel_values": 0})
+
+
+class ParityGateTest(unittest.TestCase):
+
+    def test_accepts_matching_encoder(self):
+        stats = check_parity(HashingEncoder(), HashingEncoder())
+        self.assertGreaterEqual(stats["cosine_min"], PARITY_MIN_COSINE)
+
+    def test_rejects_drifting_encoder(self):
+        self.assertRaises(ParityError, check_parity, HashingEncoder(), ShuffledEncoder())
+
+
+class FailedParityTest(unittest.TestCase):
+    """A recorded parity failure is not exported again; queries fall back to PyTorch."""
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp(prefix="onnx_test_")
+        self.cache_dir = tempfile.mkdtemp(prefix="onnx_cache_test_")
+        with open(os.path.join(self.model_dir, PARITY_FILE), "w") as f:
+            json.dump({"model_file": QUANTIZED_MODEL_FILE, "passed": False, "samples": 5,
+                       "cosine_min": 0.93, "cosine_mean": 0.97, "max_abs_diff": 0.08}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_load_does_not_export_again(self):
+        with mock.patch("onnx_encoder.export_onnx_model") as export:
+            with self.assertRaises(ParityError) as raised:
+                load_onnx_encoder("all-MiniLM-L6-v2", self.model_dir)
+        export.assert_not_called()
+        self.assertEqual(raised.exception.stats["cosine_min"], 0.93)
+
+    def test_retriever_falls_back_to_torch_once(self):
+        encoder = HashingEncoder()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), mock.patch("onnx_encoder.export_onnx_model") as export:
+            retriever = RegulatoryRetriever(make_documents(3), cache_dir=self.cache_dir, model=encoder,
+                                            query_encoder="onnx", onnx_model_dir=self.model_dir)
+            for query in ("row 001", "row 002", "row 003"):
+                retriever.search(query, k=2)
+        export.assert_not_called()
+        self.assertIs(retriever._get_query_encoder(), encoder)
+        self.assertEqual(retriever.query_encoder, "torch")
+        self.assertEqual(output.getvalue().count("failed its parity check"), 1)
+
+
+@unittest.skipUnless(all(importlib.util.find_spec(name) for name in EXPORT_DEPENDENCIES),
+                     "ONNX export needs " + ", ".join(EXPORT_DEPENDENCIES))
+class OnnxExportParityTest(unittest.TestCase):
+    """Exported model must reproduce the PyTorch embeddings."""
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp(prefix="onnx_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir, ignore_errors=True)
+
+    def test_exported_model_matches_torch(self):
+        from sentence_transformers import SentenceTransformer
+        from onnx_encoder import load_onnx_encoder, parity_check
+
+        reference = SentenceTransformer("all-MiniLM-L6-v2")
+        for quantized in (False, True):
+            with self.subTest(quantized=quantized):
+                encoder = load_onnx_encoder("all-MiniLM-L6-v2", self.model_dir, quantized=quantized)
+                stats = parity_check(reference, encoder, PARITY_SAMPLE_TEXTS)
+                self.assertGreaterEqual(stats["cosine_min"], PARITY_MIN_COSINE)
+
+
+if __name__ == "__main__":
+    unittest.main()
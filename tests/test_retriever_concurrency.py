@@ -0,0 +1,170 @@
+import hashlib
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from retriever import RegulatoryRetriever
+from retriever_snapshots import ReadWriteLock
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words encoder standing in for a SentenceTransformer."""
+
+    dimension = 32
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dimension] += 1
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def make_documents(count, prefix="doc"):
+    return [{"source": f"{prefix}_{i}.txt",
+             "text": f"Article {i} own funds capital requirement row {i:03d} deduction. " * 30}
+            for i in range(count)]
+
+
+class ConcurrentUpdateTest(unittest.TestCase):
+    """Incremental add/remove must not break searches running at the same time."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="retriever_test_")
+        # Switch threads as often as possible so unsynchronised updates interleave with searches
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def run_concurrently(self, retriever, mode, updates=300, searchers=3):
+        errors = []
+        stop = threading.Event()
+
+        def search():
+            while not stop.is_set():
+                try:
+                    results = retriever.search("capital requirement deduction", k=5, mode=mode)
+                    for result in results:
+                        self.assertTrue(result["text"])
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+
+        threads = [threading.Thread(target=search) for _ in range(searchers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for i in range(updates):
+                if stop.is_set():
+                    break
+                retriever.add_documents(make_documents(1, prefix=f"update_{i}"))
+                if i % 2:
+                    retriever.remove_documents([f"update_{i - 1}_0.txt"])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+    def test_search_during_updates(self):
+        for index_type in ("numpy", "flat", "hnsw"):
+            for mode in ("dense", "hybrid"):
+                with self.subTest(index_type=index_type, mode=mode):
+                    cache_dir = tempfile.mkdtemp(dir=self.cache_dir)
+                    retriever = RegulatoryRetriever(make_documents(40), cache_dir=cache_dir,
+                                                    index_config={"index_type": index_type},
+                                                    model=HashingEncoder())
+                    self.run_concurrently(retriever, mode)
+                    # Every other update document was removed again
+                    self.assertEqual(len(retriever.documents), 40 + 150)
+
+
+class SnapshotCopyTest(unittest.TestCase):
+    """Updates applied to a copy must leave the serving retriever untouched."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="retriever_test_")
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def snapshot_state(self, retriever):
+        return (sorted(retriever.document_info), len(retriever.chunks), retriever.index.ntotal,
+                [r["source"] for r in retriever.search("own funds row 003 deduction", k=5, mode="hybrid")])
+
+    def test_copy_is_independent(self):
+        for index_type in ("numpy", "flat", "hnsw"):
+            with self.subTest(index_type=index_type):
+                live = RegulatoryRetriever(make_documents(20), cache_dir=tempfile.mkdtemp(dir=self.cache_dir),
+                                           index_config={"index_type": index_type}, model=HashingEncoder())
+                before = self.snapshot_state(live)
+
+                updated = live.copy()
+                updated.remove_documents(["doc_3.txt", "doc_4.txt"])
+                updated.add_documents(make_documents(5, prefix="new"))
+                # The update wrote to its own layers on top of the live retriever's
+                self.assertIs(updated.embeddings.base, live.embeddings.base)
+                self.assertIs(updated.index.base, live.index.base)
+                updated.save()
+
+                self.assertEqual(self.snapshot_state(live), before)
+                self.assertNotIn("doc_3.txt", updated.document_info)
+                self.assertEqual(len(updated.documents), 23)
+                self.assertEqual({r["source"] for r in updated.search("Article 2 own funds", k=30)}
+                                 & {"doc_3.txt", "doc_4.txt"}, set())
+
+    def test_failed_update_keeps_original(self):
+        live = RegulatoryRetriever(make_documents(10), cache_dir=self.cache_dir, model=HashingEncoder())
+        before = self.snapshot_state(live)
+
+        updated = live.copy()
+        updated.remove_documents(["doc_1.txt"])
+        updated.model = None  # encoding the new document fails partway through the update
+        with self.assertRaises(AttributeError):
+            updated.add_documents([{"source": "new.txt", "text": "Leverage ratio exposure measure"}])
+        self.assertEqual(self.snapshot_state(live), before)
+
+
+class ReadWriteLockTest(unittest.TestCase):
+
+    def test_writer_waits_for_readers(self):
+        lock = ReadWriteLock()
+        order = []
+
+        def write():
+            with lock.write():
+                order.append("write")
+
+        with lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.1)
+            self.assertTrue(writer.is_alive())
+            order.append("read")
+        writer.join(1)
+        self.assertEqual(order, ["read", "write"])
+
+    def test_reentrant(self):
+        lock = ReadWriteLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                pass
+            self.assertRaises(RuntimeError, lock.write().__enter__)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import hashlib
+import io
+import shutil
+import tempfile
+import unittest
+
+from reranker import CrossEncoderReranker
+from result_cutoff import apply_cutoff
+from retriever import RegulatoryRetriever
+from tests.test_retriever_concurrency import HashingEncoder, make_documents
+
+
+class KeywordCrossEncoder:
+    """Scores a pair by query words found in the passage, on a logit-like scale."""
+
+    def predict(self, pairs, **kwargs):
+        return [8.0 * sum(word in passage.lower() for word in query.lower().split()) - 12.0
+                for query, passage in pairs]
+
+
+class RerankScoreScaleTest(unittest.TestCase):
+    """Cutoff and MMR must never compare cross-encoder scores with retrieval scores."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(prefix="pipeline_test_")
+        self.reranker = CrossEncoderReranker()
+        self.reranker._model = KeywordCrossEncoder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.retriever = RegulatoryRetriever(make_documents(30), cache_dir=self.cache_dir, model=HashingEncoder(),
+                                                 search_mode="hybrid", reranker=self.reranker, rerank_top_n=3,
+                                                 rerank_budget_ms=10000)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def search(self, **options):
+        return self.retriever.search_with_diagnostics("row 007 deduction", k=5, **options)
+
+    def test_results_carry_one_score_type(self):
+        for mmr_lambda in (None, 0.5):
+            with self.subTest(mmr_lambda=mmr_lambda):
+                results, _ = self.search(mmr_lambda=mmr_lambda, cutoff={"adaptive": "gap"})
+                self.assertTrue(results)
+                self.assertEqual({r["score_type"] for r in results}, {"cross_encoder"})
+
+    def test_separate_thresholds(self):
+        # A retrieval threshold no logit could pass is not applied to re-ranked results
+        results, diagnostics = self.search(cutoff={"min_score": 100.0})
+        self.assertEqual(len(results), 5)
+        self.assertEqual(diagnostics["dropped_by"]["threshold"], 0)
+
+        results, _ = self.search(cutoff={"rerank_min_score": 0.0})
+        self.assertTrue(results)
+        self.assertTrue(all(r["score"] >= 0.0 for r in results))
+
+    def test_exhausted_budget_keeps_retrieval_scores(self):
+        self.reranker._seconds_per_pair = 3600.0
+        results, diagnostics = self.search(cutoff={"min_score": 0.0})
+        self.assertTrue(diagnostics["rerank"]["budget_exhausted"])
+        self.assertEqual({r["score_type"] for r in results}, {"rrf"})
+
+    def test_partial_budget_keeps_k_results(self):
+        # Cached pairs are scored for free before the budget runs out
+        pool = self.retriever._search_candidates(["row 007 deduction"], 5, None, None)[0]
+        self.reranker.cache.put((self.reranker.model_name, hashlib.sha1(pool[0]["text"].encode("utf-8")).hexdigest()),
+                                "row 007 deduction", 4.0)
+        self.reranker._seconds_per_pair = 3600.0
+        results, diagnostics = self.search()
+        self.assertTrue(0 < diagnostics["rerank"]["scored"] < 5)
+        self.assertFalse(diagnostics["rerank"]["applied"])
+        self.assertEqual(len(results), 5)
+        self.assertEqual({r["score_type"] for r in results}, {"rrf"})
+
+    def test_cutoff_rejects_mixed_score_types(self):
+        results = [{"score": 4.0, "score_type": "cross_encoder", "text": "a"},
+                   {"score": 0.03, "score_type": "rrf", "text": "b"}]
+        self.assertRaises(ValueError, apply_cutoff, results, {"adaptive": "gap"})
+
+
+if __name__ == "__main__":
+    unittest.main()
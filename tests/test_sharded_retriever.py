@@ -0,0 +1,52 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from data_loader import load_regulatory_docs
+from retriever import SEARCH_MODES, RegulatoryRetriever
+from sharded_retriever import ShardedRetriever
+from tests.test_retriever_concurrency import HashingEncoder
+
+DOCS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reg_docs")
+
+
+class ShardMergeTest(unittest.TestCase):
+    """Merging shards must rank candidates as one index over the whole corpus would."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp(prefix="sharded_test_")
+        docs = load_regulatory_docs(DOCS_FOLDER)
+        encoder = HashingEncoder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.single = RegulatoryRetriever(docs, cache_dir=os.path.join(cls.cache_dir, "single"), model=encoder)
+            cls.sharded = ShardedRetriever(docs, factory=lambda name, documents, model: RegulatoryRetriever(
+                documents, cache_dir=os.path.join(cls.cache_dir, name), model=encoder))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.cache_dir, ignore_errors=True)
+
+    def ranking(self, retriever, query, mode):
+        # Chunk ids are local to a shard; compare passages by position instead
+        return [(r["source"], r["start"], round(r["score"], 6)) for r in retriever.search(query, k=5, mode=mode)]
+
+    def test_matches_single_index(self):
+        self.assertGreater(len(self.sharded.shards), 1)
+        for query in ("Row 350 intangible assets deduction goodwill", "CET1 capital instruments Article 26"):
+            for mode in SEARCH_MODES:
+                with self.subTest(query=query, mode=mode):
+                    self.assertEqual(self.ranking(self.sharded, query, mode), self.ranking(self.single, query, mode))
+
+    def test_row_350_ranks_article_36_first(self):
+        for mode in ("bm25", "hybrid"):
+            with self.subTest(mode=mode):
+                results = self.sharded.search("Row 350 intangible assets deduction goodwill", k=5, mode=mode)
+                self.assertEqual(results[0]["source"], "CRR_Article_36.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -326,6 +326,14 @@ def _validate_regulatory_compliance(data: Dict[str, Any]) -> List[ValidationFlag
                             f"{tier_name}.{component_name}.justification_refs",
                             "Include regulatory source references for audit trail"
                         ))
+                    if ("governing_sections" in component and not component["governing_sections"]
+                            and component.get("amount") is not None):
+                        flags.append(ValidationFlag(
+                            "warning",
+                            f"No governing text found for row {component.get('corep_row')} in the regulatory corpus",
+                            f"{tier_name}.{component_name}.governing_sections",
+                            "Add the instructions or article that define this row to the document folder"
+                        ))
     
     return flags
 